@@ -0,0 +1,289 @@
+"""Bounded output capture and the artifact store holding full outputs.
+
+An execution returns at most ``max_captured_bytes`` of each of its streams:
+the head is passed on as it is produced, the tail once the snippet finishes,
+and what lies between is replaced by a marker. When anything was left out,
+the full stream is spilled to an ArtifactStore and can be fetched by its ID.
+"""
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class ArtifactNotFoundError(Exception):
+    """Raised when an artifact does not exist or has expired."""
+    pass
+
+
+class ArtifactWriter:
+    """Writes one artifact; it becomes visible to readers once committed."""
+
+    def __init__(self, store: "ArtifactStore", artifact_id: str):
+        self.store = store
+        self.artifact_id = artifact_id
+        self.size = 0
+        self._partial_path = store.path(artifact_id) + ".part"
+        self._file: BinaryIO = open(self._partial_path, "wb")
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self.size += len(data)
+
+    def commit(self) -> str:
+        self._file.close()
+        os.replace(self._partial_path, self.store.path(self.artifact_id))
+        self.store._add(self.artifact_id, self.size)
+        return self.artifact_id
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self._partial_path)
+        except OSError:
+            pass
+
+
+class ArtifactStore:
+    """Full execution outputs on local disk, addressed by ID.
+
+    Artifacts expire ``ttl`` seconds after they were written, and the oldest
+    are evicted once all of them take more than ``max_bytes``.
+
+    Args:
+        directory: Where artifacts are written, a temporary directory by default
+        max_bytes: Disk space the artifacts may use, 0 means unlimited
+        ttl: Seconds an artifact stays available, 0 means forever
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 1024 * 1024 * 1024, ttl: float = 3600):
+        self.directory = directory or tempfile.mkdtemp(prefix="executor-artifacts-")
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # artifact_id -> (size, created), oldest first
+        self._artifacts: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._total_bytes = 0
+        # The index lives in memory, so artifacts left by an earlier process can no longer be served
+        for name in os.listdir(self.directory):
+            if ARTIFACT_ID_RE.match(name.removesuffix(".part")):
+                self._remove_file(name)
+
+    @classmethod
+    def from_env(cls) -> "ArtifactStore":
+        """Build a store configured through EXECUTOR_ARTIFACT_* environment variables."""
+        return cls(
+            directory=os.getenv("EXECUTOR_ARTIFACT_DIR") or None,
+            max_bytes=int(os.getenv("EXECUTOR_ARTIFACT_MAX_MB", "1024")) * 1024 * 1024,
+            ttl=float(os.getenv("EXECUTOR_ARTIFACT_TTL", "3600")),
+        )
+
+    def path(self, artifact_id: str) -> str:
+        return os.path.join(self.directory, artifact_id)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def create(self) -> ArtifactWriter:
+        return ArtifactWriter(self, uuid.uuid4().hex)
+
+    def _add(self, artifact_id: str, size: int):
+        with self._lock:
+            self._artifacts[artifact_id] = (size, time.time())
+            self._total_bytes += size
+            evicted = self._evict_locked()
+        for evicted_id in evicted:
+            self._remove_file(evicted_id)
+
+    def _evict_locked(self) -> List[str]:
+        """Forget expired artifacts, then the oldest while over budget. Returns the IDs to delete."""
+        evicted = []
+        now = time.time()
+        while self._artifacts:
+            artifact_id, (size, created) = next(iter(self._artifacts.items()))
+            expired = self.ttl and now - created > self.ttl
+            # The newest artifact is kept even when it alone is over budget
+            over_budget = self.max_bytes and self._total_bytes > self.max_bytes and len(self._artifacts) > 1
+            if not expired and not over_budget:
+                break
+            self._artifacts.popitem(last=False)
+            self._total_bytes -= size
+            evicted.append(artifact_id)
+        return evicted
+
+    def _remove_file(self, artifact_id: str):
+        try:
+            os.remove(self.path(artifact_id))
+        except OSError as e:
+            logger.warning(f"Failed to delete artifact {artifact_id}: {str(e)}")
+
+    def evict_expired(self) -> int:
+        """Delete expired artifacts. Returns how many were deleted."""
+        with self._lock:
+            evicted = self._evict_locked()
+        for artifact_id in evicted:
+            self._remove_file(artifact_id)
+        return len(evicted)
+
+    def read(self, artifact_id: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the content of an artifact in chunks.
+
+        Raises:
+            ArtifactNotFoundError: If the artifact does not exist or has expired
+        """
+        if not ARTIFACT_ID_RE.match(artifact_id or ""):
+            raise ArtifactNotFoundError(f"Invalid artifact ID {artifact_id!r}")
+        with self._lock:
+            entry = self._artifacts.get(artifact_id)
+        if entry is None or (self.ttl and time.time() - entry[1] > self.ttl):
+            raise ArtifactNotFoundError(f"Artifact {artifact_id} does not exist or has expired")
+        try:
+            # An eviction while reading unlinks the file, the open handle still reads it
+            f = open(self.path(artifact_id), "rb")
+        except FileNotFoundError:
+            raise ArtifactNotFoundError(f"Artifact {artifact_id} does not exist or has expired")
+        with f:
+            while data := f.read(chunk_size):
+                yield data
+
+    def shutdown(self):
+        """Delete every artifact."""
+        with self._lock:
+            artifact_ids = list(self._artifacts)
+            self._artifacts.clear()
+            self._total_bytes = 0
+        for artifact_id in artifact_ids:
+            self._remove_file(artifact_id)
+
+
+@dataclass
+class CapturedOutput:
+    """Size of one output stream and where to find it when it was truncated."""
+    total_bytes: int = 0
+    omitted_bytes: int = 0
+    artifact_id: str = ""
+
+
+def _split_utf8(data: bytes, index: int) -> int:
+    """The closest character boundary at or before ``index``."""
+    index = min(index, len(data))
+    # Continuation bytes look like 0b10xxxxxx
+    while 0 < index < len(data) and data[index] & 0xC0 == 0x80:
+        index -= 1
+    return index
+
+
+class OutputCapture:
+    """Keeps the head and tail of one output stream, spilling all of it to an artifact once it is too long.
+
+    feed() returns the part of each chunk to pass on right away, up to half of
+    ``max_bytes``. The rest is held back and returned by finish(), preceded by
+    a marker when the middle of the output was left out. Memory use is bounded
+    by ``max_bytes`` whatever the size of the output.
+    """
+
+    def __init__(self, max_bytes: int, store: Optional[ArtifactStore], label: str = "output"):
+        self.max_bytes = max_bytes
+        self.head_bytes = max_bytes // 2
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.store = store
+        self.label = label
+        self.total_bytes = 0
+        self._head_sent = 0
+        self._holding = False
+        self._tail = bytearray()
+        self._truncated = False
+        # Everything passed on or held back so far, to spill once the output turns out too long
+        self._kept: List[bytes] = []
+        self._writer: Optional[ArtifactWriter] = None
+
+    def feed(self, text: str) -> str:
+        if not self.max_bytes:
+            return text
+        data = text.encode("utf-8")
+        self.total_bytes += len(data)
+        if self._writer is not None:
+            self._spill(data)
+        elif not self._truncated:
+            self._kept.append(data)
+
+        live = b""
+        if not self._holding:
+            cut = _split_utf8(data, self.head_bytes - self._head_sent)
+            live, data = data[:cut], data[cut:]
+            self._head_sent += len(live)
+            # Never go back to streaming once part of a chunk was held back
+            self._holding = bool(data) or self._head_sent >= self.head_bytes
+        self._tail += data
+        if len(self._tail) > self.tail_bytes:
+            self._truncate()
+        return live.decode("utf-8")
+
+    def _spill(self, data: bytes):
+        try:
+            self._writer.write(data)
+        except OSError as e:
+            logger.error(f"Failed to spill {self.label} to the artifact store: {str(e)}")
+            self._writer.discard()
+            self._writer = None
+
+    def _truncate(self):
+        if not self._truncated:
+            self._truncated = True
+            if self.store is not None:
+                try:
+                    self._writer = self.store.create()
+                except OSError as e:
+                    logger.error(f"Failed to create an artifact for {self.label}: {str(e)}")
+                for data in self._kept:
+                    if self._writer is not None:
+                        self._spill(data)
+            self._kept = []
+        # Keep at most tail_bytes, starting on a character boundary
+        start = len(self._tail) - self.tail_bytes
+        while start < len(self._tail) and self._tail[start] & 0xC0 == 0x80:
+            start += 1
+        del self._tail[:start]
+
+    def finish(self, keep_artifact: bool = True) -> Tuple[str, CapturedOutput]:
+        """The held back output, and the size of the stream and its artifact."""
+        captured = CapturedOutput(total_bytes=self.total_bytes)
+        if not self.max_bytes:
+            return "", captured
+        tail = self._tail.decode("utf-8")
+        if not self._truncated:
+            return tail, captured
+
+        captured.omitted_bytes = self.total_bytes - self._head_sent - len(self._tail)
+        if self._writer is not None:
+            try:
+                if keep_artifact:
+                    captured.artifact_id = self._writer.commit()
+                else:
+                    self._writer.discard()
+            except OSError as e:
+                logger.error(f"Failed to store the full {self.label}: {str(e)}")
+                self._writer.discard()
+            self._writer = None
+        where = f", full {self.label} in artifact {captured.artifact_id}" if captured.artifact_id else ""
+        marker = f"\n... [{captured.omitted_bytes} of {captured.total_bytes} bytes omitted{where}] ...\n"
+        return marker + tail, captured
+
+    def close(self):
+        """Drop a partial artifact, for executions abandoned before finish()."""
+        if self._writer is not None:
+            self._writer.discard()
+            self._writer = None
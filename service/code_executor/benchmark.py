@@ -0,0 +1,251 @@
+"""Microbenchmark of the code executor's RPCs over a local channel.
+
+Starts CodeExecutorServicer on a local port in this process, with the engine
+configured by the usual EXECUTOR_* variables, and measures each scenario with
+closed-loop clients at every concurrency of the sweep:
+
+    python benchmark.py --concurrency 1,2,4,8,16,32,64 --label processes --json processes.json
+
+Scenarios are a trivial snippet, a CPU-bound loop, a snippet printing a large
+stdout and GetToolList. Snippets run through ExecuteCode, ExecuteCodeStream or
+both (--methods). Results are printed as a table and, with --json, written as
+JSON so runs against different engines or settings can be compared.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent import futures
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import grpc
+from google.protobuf.empty_pb2 import Empty
+
+from engine import EXIT_OK, ProcessPoolEngine
+from server import KEEPALIVE_OPTIONS, CodeExecutorServicer
+
+import code_executor_pb2
+import code_executor_pb2_grpc
+
+logger = logging.getLogger("benchmark")
+
+DEFAULT_CONCURRENCY = "1,2,4,8,16,32,64"
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+def scenario_code(scenario: str, args) -> str:
+    if scenario == "trivial":
+        return "x = 1 + 1"
+    if scenario == "cpu":
+        return f"total = 0\nfor i in range({args.cpu_iterations}):\n    total += i * i\nprint(total)"
+    if scenario == "large_stdout":
+        # Lines of 100 bytes, newline included
+        return f"for i in range({max(1, args.stdout_bytes // 100)}):\n    print('x' * 99)"
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def execute_unary(stub, code: str) -> int:
+    """Bytes of output received, raises unless the snippet succeeded."""
+    response = stub.ExecuteCode(code_executor_pb2.CodeExecutionRequest(code=code))
+    if response.exit_code != EXIT_OK:
+        raise RuntimeError(f"exit code {response.exit_code}: {response.error[:200]}")
+    return len(response.output) + len(response.error)
+
+
+def execute_stream(stub, code: str) -> int:
+    """Bytes of output received, raises unless the snippet succeeded."""
+    received = 0
+    exit_code = None
+    for chunk in stub.ExecuteCodeStream(code_executor_pb2.CodeExecutionRequest(code=code)):
+        kind = chunk.WhichOneof("payload")
+        if kind == "status":
+            exit_code = chunk.status.exit_code
+            if exit_code != EXIT_OK:
+                raise RuntimeError(f"exit code {exit_code}: {chunk.status.error[:200]}")
+        else:
+            received += len(getattr(chunk, kind))
+    if exit_code is None:
+        raise RuntimeError("stream ended without a status")
+    return received
+
+
+def get_tool_list(stub) -> int:
+    return stub.GetToolList(Empty()).ByteSize()
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def run_point(call: Callable[[], int], requests: int, concurrency: int) -> Dict:
+    """Run ``requests`` calls with ``concurrency`` closed-loop client threads."""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    received = 0
+    remaining = requests
+    lock = threading.Lock()
+
+    def client():
+        nonlocal remaining, received
+        while True:
+            with lock:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+            start = time.perf_counter()
+            try:
+                size = call()
+            except Exception as e:
+                key = e.code().name if isinstance(e, grpc.RpcError) else type(e).__name__
+                with lock:
+                    errors[key] = errors.get(key, 0) + 1
+                continue
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                received += size
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "completed": len(latencies),
+        "errors": errors,
+        "elapsed_seconds": elapsed,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_seconds": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "max": max(latencies) if latencies else None,
+        },
+        "received_bytes_per_request": received / len(latencies) if latencies else 0,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def print_row(scenario: str, method: str, point: Dict):
+    latency = point["latency_seconds"]
+    errors = sum(point["errors"].values())
+    print(f"{scenario:14}{method:19}{point['concurrency']:>5}{point['rps']:>10.1f}"
+          + "".join(f"{format_ms(latency[key]):>10}" for key in ("p50", "p95", "p99", "max"))
+          + f"{errors:>8}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="trivial,cpu,large_stdout,tool_list",
+                        help="comma-separated subset of trivial, cpu, large_stdout and tool_list")
+    parser.add_argument("--methods", default="ExecuteCode,ExecuteCodeStream",
+                        help="RPCs running the snippets, ExecuteCode and/or ExecuteCodeStream")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=50,
+                        help="calls per point, at least 2 per client")
+    parser.add_argument("--warmup", type=int, default=1, help="calls per worker before each scenario")
+    parser.add_argument("--cpu-iterations", type=int, default=1_000_000, help="loop size of the cpu scenario")
+    parser.add_argument("--stdout-bytes", type=int, default=1024 * 1024, help="output of the large_stdout scenario")
+    parser.add_argument("--server-threads", type=int, default=0,
+                        help="gRPC server threads, by default enough for the largest concurrency")
+    parser.add_argument("--label", default="", help="name of this run in the JSON, e.g. the engine under test")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    methods = [m.strip() for m in args.methods.split(",") if m.strip()]
+    concurrencies = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    # Per-request server logs would dominate the cheap scenarios
+    logging.getLogger().setLevel(logging.WARNING)
+
+    engine = ProcessPoolEngine.from_env()
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=args.server_threads or max(10, max(concurrencies) * 2)),
+        options=KEEPALIVE_OPTIONS + [("grpc.max_send_message_length", MAX_MESSAGE_BYTES)],
+    )
+    code_executor_pb2_grpc.add_CodeExecutorServicer_to_server(CodeExecutorServicer(engine), server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    channel = grpc.insecure_channel(
+        f"127.0.0.1:{port}", options=[("grpc.max_receive_message_length", MAX_MESSAGE_BYTES)]
+    )
+    stub = code_executor_pb2_grpc.CodeExecutorStub(channel)
+
+    results = []
+    print(f"{'scenario':14}{'method':19}{'conc':>5}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    try:
+        for scenario in scenarios:
+            if scenario == "tool_list":
+                calls = {"GetToolList": lambda: get_tool_list(stub)}
+            else:
+                code = scenario_code(scenario, args)
+                execute = {"ExecuteCode": execute_unary, "ExecuteCodeStream": execute_stream}
+                calls = {method: (lambda run=execute[method]: run(stub, code)) for method in methods}
+            for method, call in calls.items():
+                # Every worker has imported its tools and run the snippet once
+                run_point(call, args.warmup * engine.num_workers, engine.num_workers)
+                for concurrency in concurrencies:
+                    point = run_point(call, max(args.requests, 2 * concurrency), concurrency)
+                    print_row(scenario, method, point)
+                    results.append({"scenario": scenario, "method": method, **point})
+    finally:
+        channel.close()
+        server.stop(grace=1)
+        engine.shutdown()
+
+    report = {
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "engine": {
+            "class": type(engine).__name__,
+            "num_workers": engine.num_workers,
+            "max_runs_per_worker": engine.max_runs_per_worker,
+            "default_limits": vars(engine.default_limits),
+        },
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
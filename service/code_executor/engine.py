@@ -0,0 +1,781 @@
+"""Process-pool execution engine for the code executor service.
+
+Every snippet runs in one of a fixed set of pre-spawned worker processes, so
+stdout/stderr redirection is private to the worker and CPU-bound snippets can
+use every core of the container. Workers are recycled after a number of runs
+or once their peak memory crosses a threshold.
+
+Sessions keep a namespace alive between executions. A session is pinned to
+one worker, which holds its namespace, and is evicted after an idle TTL.
+
+Each execution is bounded by ExecutionLimits. CPU time, address space and
+output size are enforced inside the worker; wall time and cancellation are
+enforced by the parent, which interrupts the snippet with SIGINT and kills the
+worker if it does not stop within a grace period.
+
+Only the head and tail of a long output are returned, see artifacts.py; the
+full output is kept in the engine's ArtifactStore.
+"""
+import contextlib
+import io
+import logging
+import math
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from artifacts import ArtifactStore, CapturedOutput, OutputCapture
+# tool imports
+from tool import tool_registry
+
+logger = logging.getLogger(__name__)
+
+# Exit codes reported for executions that did not complete normally
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_TIMEOUT = 124
+EXIT_CANCELLED = 130
+EXIT_MEMORY_LIMIT = 137
+EXIT_CPU_LIMIT = 152
+EXIT_OUTPUT_LIMIT = 153
+
+# How long an interrupted snippet gets to unwind before its worker is killed
+INTERRUPT_GRACE = 2.0
+# How often the parent checks deadlines and cancellation while waiting
+POLL_INTERVAL = 0.1
+
+
+@dataclass
+class ExecutionLimits:
+    """Resource limits for one execution. A value of 0 means "unlimited"."""
+    wall_time_seconds: float = 60
+    cpu_seconds: int = 30
+    # Address space the snippet may allocate on top of what the worker already uses
+    memory_bytes: int = 1024 * 1024 * 1024
+    max_output_bytes: int = 10 * 1024 * 1024
+    # Output returned per stream, the head and tail of anything longer
+    max_captured_bytes: int = 64 * 1024
+
+    @classmethod
+    def from_env(cls) -> "ExecutionLimits":
+        """Server-wide defaults configured through EXECUTOR_* environment variables."""
+        return cls(
+            wall_time_seconds=float(os.getenv("EXECUTOR_WALL_TIME_SECONDS", "60")),
+            cpu_seconds=int(os.getenv("EXECUTOR_CPU_SECONDS", "30")),
+            memory_bytes=int(os.getenv("EXECUTOR_MEMORY_MB", "1024")) * 1024 * 1024,
+            max_output_bytes=int(os.getenv("EXECUTOR_MAX_OUTPUT_BYTES", str(10 * 1024 * 1024))),
+            max_captured_bytes=int(os.getenv("EXECUTOR_MAX_CAPTURED_BYTES", str(64 * 1024))),
+        )
+
+    def tightened(self, **requested) -> "ExecutionLimits":
+        """Apply limits requested by a client. Requests can lower the defaults, never raise them."""
+        values = {}
+        for name, default in vars(self).items():
+            value = requested.get(name) or 0
+            if value <= 0:
+                values[name] = default
+            elif default <= 0:
+                values[name] = value
+            else:
+                values[name] = min(value, default)
+        return ExecutionLimits(**values)
+
+
+class ExecutionInterrupted(BaseException):
+    """Raised inside a snippet when the parent interrupts it (timeout or cancellation)."""
+    pass
+
+
+class CPUTimeExceeded(BaseException):
+    """Raised inside a snippet when it uses up its CPU time."""
+    pass
+
+
+class OutputLimitExceeded(BaseException):
+    """Raised inside a snippet when it writes more than its output limit."""
+    pass
+
+
+def final_answer(answer):
+    print(f"<SYSTEM>Final answer is {answer}<SYSTEM>")
+
+
+def _build_namespace() -> Dict[str, Any]:
+    """Create a fresh namespace with builtins and tools for a snippet."""
+    namespace: Dict[str, Any] = {
+        "__builtins__": __builtins__,
+        "final_answer": final_answer,
+    }
+    # Every registered tool, batch variants such as search_many included
+    namespace.update(tool_registry.get_functions())
+    return namespace
+
+
+# Output is forwarded to the parent once this much is buffered, or by the
+# flusher thread every FLUSH_INTERVAL seconds
+CHUNK_SIZE = 4096
+FLUSH_INTERVAL = 0.1
+
+
+class _PipeWriter(io.TextIOBase):
+    """File-like object that forwards what a snippet writes to the parent in chunks.
+
+    A signal handler raising in the middle of ``conn.send()`` would leave half
+    a message in the pipe, so while the main thread sends, the worker's
+    handlers only record their exception in ``state["pending"]``; it is
+    raised here once the message is out.
+    """
+
+    def __init__(self, conn, kind: str, lock: threading.Lock, state: Dict[str, Any]):
+        self.conn = conn
+        self.kind = kind
+        self.lock = lock
+        self.state = state
+        self.run_id = 0
+        self.max_output_bytes = 0
+        self.written = 0
+        self._buffer: List[str] = []
+        self._size = 0
+
+    def start_run(self, run_id: int, max_output_bytes: int):
+        self.run_id = run_id
+        self.max_output_bytes = max_output_bytes
+        self.written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self.written += len(s)
+        if self.max_output_bytes and self.written > self.max_output_bytes:
+            raise OutputLimitExceeded(f"Output exceeded the limit of {self.max_output_bytes} bytes")
+        with self.lock:
+            self._buffer.append(s)
+            self._size += len(s)
+            if self._size >= CHUNK_SIZE:
+                self._flush_locked()
+        return len(s)
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        message = (self.run_id, self.kind, "".join(self._buffer))
+        self._buffer = []
+        self._size = 0
+        # Signal handlers run in the main thread, sends of the flusher thread are never interrupted
+        if threading.current_thread() is not threading.main_thread():
+            self.conn.send(message)
+            return
+        self.state["sending"] = True
+        try:
+            self.conn.send(message)
+        finally:
+            self.state["sending"] = False
+        pending, self.state["pending"] = self.state["pending"], None
+        if pending is not None and self.state["running"]:
+            raise pending()
+
+
+def _address_space_in_use() -> int:
+    """Current virtual memory size of this process in bytes."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[0]) * resource.getpagesize()
+
+
+@contextlib.contextmanager
+def _resource_limits(limits: ExecutionLimits):
+    """Apply CPU and address space limits for the duration of one snippet."""
+    saved = {
+        resource.RLIMIT_CPU: resource.getrlimit(resource.RLIMIT_CPU),
+        resource.RLIMIT_AS: resource.getrlimit(resource.RLIMIT_AS),
+    }
+    try:
+        if limits.cpu_seconds:
+            # The profiling timer counts the CPU time of this snippet precisely
+            signal.setitimer(signal.ITIMER_PROF, limits.cpu_seconds)
+            # RLIMIT_CPU, whole seconds over the whole life of the worker, backs it up
+            # should the snippet block SIGPROF
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = math.ceil(usage.ru_utime + usage.ru_stime)
+            hard = saved[resource.RLIMIT_CPU][1]
+            resource.setrlimit(resource.RLIMIT_CPU, (used + limits.cpu_seconds, hard))
+        if limits.memory_bytes:
+            hard = saved[resource.RLIMIT_AS][1]
+            soft = _address_space_in_use() + limits.memory_bytes
+            if hard != resource.RLIM_INFINITY:
+                soft = min(soft, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        for limit, value in saved.items():
+            resource.setrlimit(limit, value)
+
+
+def _run_code(
+    code: str,
+    namespace: Dict[str, Any],
+    stdout: _PipeWriter,
+    stderr: _PipeWriter,
+    limits: ExecutionLimits,
+    state: Dict[str, bool],
+) -> Dict[str, Any]:
+    """Execute ``code`` in this process, streaming its output to the parent."""
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            with _resource_limits(limits):
+                state["pending"] = None
+                state["running"] = True
+                try:
+                    exec(code, namespace)
+                finally:
+                    state["running"] = False
+            return {"error": "", "exit_code": EXIT_OK}
+        except ExecutionInterrupted:
+            # The parent knows why it interrupted and reports the reason itself
+            return {"error": "Execution interrupted", "exit_code": EXIT_CANCELLED}
+        except CPUTimeExceeded:
+            return {
+                "error": f"CPUTimeExceeded: execution exceeded the CPU limit of {limits.cpu_seconds}s",
+                "exit_code": EXIT_CPU_LIMIT,
+            }
+        except OutputLimitExceeded as e:
+            return {"error": f"OutputLimitExceeded: {str(e)}", "exit_code": EXIT_OUTPUT_LIMIT}
+        except MemoryError as e:
+            return {
+                "error": f"MemoryError: execution exceeded the memory limit of {limits.memory_bytes} bytes {str(e)}".strip(),
+                "exit_code": EXIT_MEMORY_LIMIT,
+            }
+        except Exception as e:
+            return {
+                "error": f"{type(e).__name__}: {str(e)}",
+                "exit_code": EXIT_ERROR,
+            }
+
+
+def _worker_main(conn):
+    """Worker process loop: receive a request, run it, stream back output and the result."""
+    # Namespaces of the sessions pinned to this worker
+    namespaces: Dict[str, Dict[str, Any]] = {}
+    # Signals only interrupt user code, never the worker's own bookkeeping,
+    # and are held back while the main thread writes to the pipe
+    state: Dict[str, Any] = {"running": False, "sending": False, "pending": None}
+    send_lock = threading.Lock()
+    stdout = _PipeWriter(conn, "stdout", send_lock, state)
+    stderr = _PipeWriter(conn, "stderr", send_lock, state)
+
+    def raise_in_snippet(exception: type):
+        if not state["running"]:
+            return
+        if state["sending"]:
+            state["pending"] = exception
+        else:
+            raise exception()
+
+    def on_interrupt(signum, frame):
+        raise_in_snippet(ExecutionInterrupted)
+
+    def on_cpu_limit(signum, frame):
+        raise_in_snippet(CPUTimeExceeded)
+
+    signal.signal(signal.SIGINT, on_interrupt)
+    signal.signal(signal.SIGXCPU, on_cpu_limit)
+    signal.signal(signal.SIGPROF, on_cpu_limit)
+
+    # Periodically push buffered output so slow snippets still show progress
+    stop_flusher = threading.Event()
+
+    def flush_loop():
+        while not stop_flusher.wait(FLUSH_INTERVAL):
+            stdout.flush()
+            stderr.flush()
+
+    threading.Thread(target=flush_loop, daemon=True).start()
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            # The parent went away
+            break
+        if request is None:
+            break
+
+        for session_id in request.get("drop_sessions", ()):
+            namespaces.pop(session_id, None)
+
+        session_id = request.get("session_id")
+        if session_id:
+            namespace = namespaces.setdefault(session_id, _build_namespace())
+        else:
+            namespace = _build_namespace()
+
+        # Tag chunks with the run they belong to, so output written late by a
+        # stray thread of an earlier snippet is not attributed to this one
+        limits = request["limits"]
+        stdout.start_run(request["run_id"], limits.max_output_bytes)
+        stderr.start_run(request["run_id"], limits.max_output_bytes)
+        result = _run_code(request["code"], namespace, stdout, stderr, limits, state)
+        # ru_maxrss is reported in kilobytes on Linux
+        result["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with send_lock:
+            stdout._flush_locked()
+            stderr._flush_locked()
+            conn.send((request["run_id"], "result", result))
+    stop_flusher.set()
+    conn.close()
+
+
+class WorkerDiedError(Exception):
+    """Raised when a worker process exits while running a snippet."""
+    pass
+
+
+class SessionNotFoundError(Exception):
+    """Raised when a session does not exist, was closed or has expired."""
+    pass
+
+
+class TooManySessionsError(Exception):
+    """Raised when the engine already holds the maximum number of sessions."""
+    pass
+
+
+class _Worker:
+    """Handle on a single worker process and its pipe."""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,))
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+        self.max_rss_kb = 0
+        self.busy = False
+        # Sessions pinned to this worker, the one whose code is running, and
+        # closed ones whose namespace is dropped along with the next request
+        self.sessions: set = set()
+        self.running_session: Optional[str] = None
+        self.pending_drops: List[str] = []
+
+    def run_stream(
+        self,
+        code: str,
+        limits: ExecutionLimits,
+        session_id: Optional[str] = None,
+        cancel_event: Optional[threading.Event] = None,
+        drop_sessions: Optional[List[str]] = None,
+    ) -> Iterator[Tuple[str, Any]]:
+        """Run ``code`` and yield ("stdout"|"stderr", text) chunks, then ("result", dict).
+
+        Enforces the wall time limit and ``cancel_event`` by interrupting the
+        snippet, and kills the worker if it does not stop within INTERRUPT_GRACE.
+        The namespaces of ``drop_sessions`` are dropped first.
+        """
+        self.runs += 1
+        run_id = self.runs
+        request = {
+            "run_id": run_id,
+            "code": code,
+            "session_id": session_id,
+            "drop_sessions": drop_sessions or [],
+            "limits": limits,
+        }
+        deadline = time.monotonic() + limits.wall_time_seconds if limits.wall_time_seconds else None
+        interrupted: Optional[Dict[str, Any]] = None
+        interrupted_at = 0.0
+        try:
+            self.conn.send(request)
+            while True:
+                now = time.monotonic()
+                if interrupted is None:
+                    if cancel_event is not None and cancel_event.is_set():
+                        interrupted = {"error": "Execution cancelled by client", "exit_code": EXIT_CANCELLED}
+                    elif deadline is not None and now >= deadline:
+                        interrupted = {
+                            "error": f"TimeoutError: execution exceeded the wall time limit of {limits.wall_time_seconds}s",
+                            "exit_code": EXIT_TIMEOUT,
+                        }
+                    if interrupted is not None:
+                        interrupted_at = now
+                        os.kill(self.process.pid, signal.SIGINT)
+                elif now - interrupted_at > INTERRUPT_GRACE:
+                    logger.warning(f"Worker {self.process.pid} ignored the interrupt, killing it")
+                    self.kill()
+                    yield "result", interrupted
+                    return
+
+                if not self.conn.poll(POLL_INTERVAL):
+                    continue
+                try:
+                    message_run_id, kind, payload = self.conn.recv()
+                except Exception as e:
+                    # A truncated or corrupt message leaves the pipe unusable, as if the worker died
+                    logger.warning(f"Lost the pipe of worker {self.process.pid}: {type(e).__name__}: {str(e)}")
+                    self.kill()
+                    if interrupted is not None:
+                        yield "result", interrupted
+                        return
+                    raise WorkerDiedError(f"Worker {self.process.pid} sent a corrupt message") from e
+                if message_run_id != run_id:
+                    continue
+                if kind == "result":
+                    self.max_rss_kb = payload.pop("max_rss_kb", 0)
+                    yield kind, interrupted or payload
+                    return
+                yield kind, payload
+        except (EOFError, OSError) as e:
+            raise WorkerDiedError(f"Worker {self.process.pid} exited with code {self.process.exitcode}") from e
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self):
+        """Kill the worker immediately, e.g. when nobody waits for its output anymore."""
+        self.process.kill()
+        self.process.join()
+
+    def stop(self, timeout: float = 1.0):
+        """Ask the worker to exit and kill it if it does not."""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ProcessPoolEngine:
+    """Dispatch code executions to a pool of pre-spawned worker processes.
+
+    Args:
+        num_workers: Number of worker processes, defaults to the CPU count
+        max_runs_per_worker: Recycle a worker after this many executions
+        max_worker_memory_mb: Recycle a worker once its peak RSS exceeds this
+        session_ttl: Seconds a session may stay idle before it is evicted
+        max_sessions: Maximum number of concurrently open sessions
+        default_limits: Limits applied to every execution, requests may only tighten them
+        artifact_store: Keeps the full output of executions whose output was truncated,
+            None to only keep its head and tail
+    """
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        max_runs_per_worker: int = 100,
+        max_worker_memory_mb: int = 512,
+        session_ttl: float = 600,
+        max_sessions: int = 1000,
+        default_limits: Optional[ExecutionLimits] = None,
+        artifact_store: Optional[ArtifactStore] = None,
+    ):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.max_runs_per_worker = max_runs_per_worker
+        self.max_worker_memory_mb = max_worker_memory_mb
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        self.default_limits = default_limits or ExecutionLimits()
+        self.artifact_store = artifact_store
+        # session_id -> (worker, last used timestamp)
+        self._sessions: Dict[str, Tuple[_Worker, float]] = {}
+
+        # forkserver avoids forking the multi-threaded gRPC server process
+        self._ctx = multiprocessing.get_context("forkserver")
+        self._cond = threading.Condition()
+        self._workers: List[_Worker] = [_Worker(self._ctx) for _ in range(self.num_workers)]
+        # Executions waiting for a free worker, or for the worker of their session
+        self._waiting = 0
+        self._closed = False
+        self._stop_sweeper = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+        logger.info(f"Started {self.num_workers} execution workers")
+
+    @classmethod
+    def from_env(cls) -> "ProcessPoolEngine":
+        """Build an engine configured through EXECUTOR_* environment variables."""
+        num_workers = os.getenv("EXECUTOR_WORKERS")
+        return cls(
+            num_workers=int(num_workers) if num_workers else None,
+            max_runs_per_worker=int(os.getenv("EXECUTOR_MAX_RUNS_PER_WORKER", "100")),
+            max_worker_memory_mb=int(os.getenv("EXECUTOR_MAX_WORKER_MEMORY_MB", "512")),
+            session_ttl=float(os.getenv("EXECUTOR_SESSION_TTL", "600")),
+            max_sessions=int(os.getenv("EXECUTOR_MAX_SESSIONS", "1000")),
+            default_limits=ExecutionLimits.from_env(),
+            artifact_store=ArtifactStore.from_env(),
+        )
+
+    def _acquire(self, session_id: Optional[str] = None) -> _Worker:
+        """Wait for a free worker, or for the worker a session is pinned to."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Execution engine is shut down")
+                if session_id:
+                    if session_id not in self._sessions:
+                        raise SessionNotFoundError(f"Session {session_id} does not exist or has expired")
+                    # A session with a request waiting for its worker is not idle
+                    worker, _ = self._sessions[session_id]
+                    self._sessions[session_id] = (worker, time.monotonic())
+                    if not worker.busy:
+                        worker.busy = True
+                        worker.running_session = session_id
+                        return worker
+                else:
+                    for worker in self._workers:
+                        if not worker.busy:
+                            worker.busy = True
+                            return worker
+                self._waiting += 1
+                try:
+                    self._cond.wait()
+                finally:
+                    self._waiting -= 1
+
+    @property
+    def queue_depth(self) -> int:
+        """Executions waiting for a worker."""
+        return self._waiting
+
+    @property
+    def busy_workers(self) -> int:
+        return sum(worker.busy for worker in self._workers)
+
+    def _release(self, worker: _Worker):
+        if not worker.alive and worker.sessions:
+            logger.warning(f"Worker {worker.process.pid} died, dropping {len(worker.sessions)} sessions")
+            with self._cond:
+                for session_id in worker.sessions:
+                    self._sessions.pop(session_id, None)
+                worker.sessions.clear()
+
+        if self._should_recycle(worker):
+            logger.info(
+                f"Recycling worker {worker.process.pid} after {worker.runs} runs "
+                f"(peak RSS {worker.max_rss_kb // 1024} MB)"
+            )
+            worker.stop()
+            replacement = _Worker(self._ctx)
+        else:
+            replacement = worker
+
+        with self._cond:
+            index = self._workers.index(worker)
+            self._workers[index] = replacement
+            worker.running_session = None
+            replacement.busy = False
+            # Session executions wait for one specific worker
+            self._cond.notify_all()
+
+    def _worn_out(self, worker: _Worker) -> bool:
+        return (
+            worker.runs >= self.max_runs_per_worker
+            or worker.max_rss_kb > self.max_worker_memory_mb * 1024
+        )
+
+    def _should_recycle(self, worker: _Worker) -> bool:
+        if not worker.alive:
+            return True
+        # Recycling would lose the namespaces of pinned sessions, wait for them to close
+        if worker.sessions:
+            return False
+        return self._worn_out(worker)
+
+    def _recycle_drained(self):
+        """Recycle idle workers that are worn out and have no sessions left."""
+        with self._cond:
+            drained = [
+                worker for worker in self._workers
+                if not worker.busy and not worker.sessions and self._should_recycle(worker)
+            ]
+            for worker in drained:
+                worker.busy = True
+        for worker in drained:
+            self._release(worker)
+
+    def create_session(self) -> str:
+        """Open a session pinned to the least loaded worker and return its ID.
+
+        Worn out workers get no new sessions, so they drain and are recycled
+        once their last session closes; only when every worker is worn out
+        does the least loaded one still take the session.
+        """
+        self.evict_expired_sessions()
+        with self._cond:
+            if len(self._sessions) >= self.max_sessions:
+                raise TooManySessionsError(f"Maximum of {self.max_sessions} sessions reached")
+            fresh = [worker for worker in self._workers if not self._worn_out(worker)]
+            worker = min(fresh or self._workers, key=lambda w: len(w.sessions))
+            session_id = uuid.uuid4().hex
+            worker.sessions.add(session_id)
+            self._sessions[session_id] = (worker, time.monotonic())
+        logger.info(f"Created session {session_id} on worker {worker.process.pid}")
+        return session_id
+
+    def close_session(self, session_id: str):
+        """Close a session; its namespace is dropped by the worker on its next request."""
+        with self._cond:
+            if session_id not in self._sessions:
+                raise SessionNotFoundError(f"Session {session_id} does not exist or has expired")
+            self._drop_session(session_id)
+            self._cond.notify_all()
+        logger.info(f"Closed session {session_id}")
+        self._recycle_drained()
+
+    def _drop_session(self, session_id: str):
+        # Caller holds self._cond
+        worker, _ = self._sessions.pop(session_id)
+        worker.sessions.discard(session_id)
+        worker.pending_drops.append(session_id)
+
+    def evict_expired_sessions(self) -> int:
+        """Close sessions idle for longer than ``session_ttl``. Returns how many were evicted.
+
+        Only the session whose code is running is kept; the others expire even
+        while their worker is busy with another session or a one-off execution.
+        """
+        now = time.monotonic()
+        with self._cond:
+            expired = [
+                session_id for session_id, (worker, last_used) in self._sessions.items()
+                if session_id != worker.running_session and now - last_used > self.session_ttl
+            ]
+            for session_id in expired:
+                self._drop_session(session_id)
+            if expired:
+                self._cond.notify_all()
+        if expired:
+            logger.info(f"Evicted {len(expired)} idle sessions")
+            self._recycle_drained()
+        return len(expired)
+
+    def _sweep_loop(self):
+        interval = max(1.0, self.session_ttl / 4)
+        while not self._stop_sweeper.wait(interval):
+            self.evict_expired_sessions()
+            if self.artifact_store is not None:
+                self.artifact_store.evict_expired()
+
+    def execute_stream(
+        self,
+        code: str,
+        session_id: Optional[str] = None,
+        limits: Optional[ExecutionLimits] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Iterator[Tuple[str, Any]]:
+        """Run ``code`` and yield its output while it runs.
+
+        Runs on a free worker, or in a session's namespace on its worker.
+        Yields ("stdout", text) and ("stderr", text) chunks followed by one
+        ("status", {"exit_code": int, "error": str, "captured": {"stdout":
+        CapturedOutput, "stderr": CapturedOutput}}). Past half of
+        ``limits.max_captured_bytes``, output is held back until the snippet
+        finishes and only its tail is sent, see OutputCapture. Setting
+        ``cancel_event`` interrupts the snippet; closing the generator before
+        the status arrives kills it.
+
+        Args:
+            code: The Python code to execute
+            session_id: Optional session to run the code in
+            limits: Limits for this execution, defaults to ``default_limits``
+            cancel_event: Event signalling that the caller gave up on the result
+
+        Raises:
+            SessionNotFoundError: If ``session_id`` is unknown or expired
+        """
+        limits = limits or self.default_limits
+        worker = self._acquire(session_id)
+        with self._cond:
+            # Sessions closed while the worker was busy are dropped with this request
+            drop_sessions, worker.pending_drops = worker.pending_drops, []
+        captures = {
+            kind: OutputCapture(limits.max_captured_bytes, self.artifact_store, label=kind)
+            for kind in ("stdout", "stderr")
+        }
+        finished = False
+        try:
+            try:
+                for kind, payload in worker.run_stream(code, limits, session_id, cancel_event, drop_sessions):
+                    if kind == "result":
+                        break
+                    live = captures[kind].feed(payload)
+                    if live:
+                        yield kind, live
+                status = payload
+            except WorkerDiedError as e:
+                logger.error(str(e))
+                status = {"error": str(e), "exit_code": EXIT_ERROR}
+            finished = True
+            captured: Dict[str, CapturedOutput] = {}
+            for kind, capture in captures.items():
+                tail, captured[kind] = capture.finish()
+                if tail:
+                    yield kind, tail
+            yield "status", {**status, "captured": captured}
+        finally:
+            for capture in captures.values():
+                capture.close()
+            if not finished:
+                # The consumer went away mid-run, stop the snippet instead of draining it
+                logger.info(f"Killing worker {worker.process.pid} running an abandoned execution")
+                worker.kill()
+            if session_id:
+                with self._cond:
+                    if session_id in self._sessions:
+                        self._sessions[session_id] = (worker, time.monotonic())
+            self._release(worker)
+
+    def execute(
+        self,
+        code: str,
+        session_id: Optional[str] = None,
+        limits: Optional[ExecutionLimits] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Tuple[str, str, int, Dict[str, CapturedOutput]]:
+        """Run ``code`` to completion, see execute_stream().
+
+        Returns:
+            tuple: (output, error, exit_code, captured), captured describes the
+            stdout and stderr streams as in execute_stream(). A failed execution
+            returns the output it printed before it stopped with its error.
+        """
+        output: List[str] = []
+        errors: List[str] = []
+        status: Dict[str, Any] = {}
+        for kind, payload in self.execute_stream(code, session_id, limits, cancel_event):
+            if kind == "stdout":
+                output.append(payload)
+            elif kind == "stderr":
+                errors.append(payload)
+            else:
+                status = payload
+        if status["exit_code"] != EXIT_OK:
+            return "".join(output), status["error"], status["exit_code"], status["captured"]
+        return "".join(output), "".join(errors), EXIT_OK, status["captured"]
+
+    def shutdown(self):
+        """Stop all workers."""
+        self._stop_sweeper.set()
+        with self._cond:
+            self._closed = True
+            workers = list(self._workers)
+            self._cond.notify_all()
+        for worker in workers:
+            worker.stop()
+        if self.artifact_store is not None:
+            self.artifact_store.shutdown()
+        logger.info("Execution workers stopped")
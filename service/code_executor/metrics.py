@@ -0,0 +1,69 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# Latency buckets in seconds, from a trivial snippet to the wall time limit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+RPC_SECONDS = Histogram(
+    "executor_rpc_seconds",
+    "Duration of code executor RPCs, until the last chunk for ExecuteCodeStream",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+RPCS_IN_FLIGHT = Gauge(
+    "executor_rpcs_in_flight",
+    "Code executor RPCs being handled",
+    ["method"],
+)
+EXECUTIONS = Counter(
+    "executor_executions_total",
+    "Finished code executions by exit code",
+    ["exit_code"],
+)
+QUEUE_DEPTH = Gauge(
+    "executor_queue_depth",
+    "Executions waiting for a free worker",
+)
+BUSY_WORKERS = Gauge(
+    "executor_busy_workers",
+    "Workers running an execution",
+)
+TRUNCATED_OUTPUTS = Counter(
+    "executor_truncated_outputs_total",
+    "Output streams returned as head and tail, by stream",
+    ["stream"],
+)
+ARTIFACT_BYTES = Gauge(
+    "executor_artifact_bytes",
+    "Disk space used by the artifacts holding full outputs",
+)
+
+
+@contextmanager
+def track_rpc(method: str) -> Iterator[None]:
+    """Count the RPC as in flight and observe its duration for the ``with`` block."""
+    in_flight = RPCS_IN_FLIGHT.labels(method=method)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        RPC_SECONDS.labels(method=method).observe(time.perf_counter() - start)
+        in_flight.dec()
+
+
+def start_metrics_server(engine) -> None:
+    """Serve /metrics on EXECUTOR_METRICS_PORT (default 9100), 0 disables it."""
+    port = int(os.getenv("EXECUTOR_METRICS_PORT", "9100"))
+    if not port:
+        return
+    # Read at scrape time, the engine keeps the counts
+    QUEUE_DEPTH.set_function(lambda: engine.queue_depth)
+    BUSY_WORKERS.set_function(lambda: engine.busy_workers)
+    if engine.artifact_store is not None:
+        ARTIFACT_BYTES.set_function(lambda: engine.artifact_store.total_bytes)
+    start_http_server(port)
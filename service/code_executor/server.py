@@ -1,31 +1,106 @@
 from concurrent import futures
-import io
-import contextlib
-from typing import Dict, Any
+from functools import wraps
+from typing import Any, Dict
+import inspect
 import logging
+import os
+import threading
 
 import grpc
 from google.protobuf.empty_pb2 import Empty
 
 from tool import tool_registry
+from artifacts import ArtifactNotFoundError, CapturedOutput
+from engine import ExecutionLimits, ProcessPoolEngine, SessionNotFoundError, TooManySessionsError
+from metrics import EXECUTIONS, TRUNCATED_OUTPUTS, start_metrics_server, track_rpc
+import tracing
+from tracing import current_span, span
 
 import code_executor_pb2
 import code_executor_pb2_grpc
 
-# tool imports
-from tool import search
-
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(name)s - %(levelname)s%(trace)s - %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
+for handler in logging.getLogger().handlers:
+    handler.addFilter(tracing.TraceLogFilter())
 logger = logging.getLogger(__name__)
 
-def final_answer(answer):
-    print(f"<SYSTEM>Final answer is {answer}<SYSTEM>")
+# Let webapp clients keep idle connections alive with pings
+KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_recv_ping_interval_without_data_ms", 10_000),
+    ("grpc.http2.max_ping_strikes", 0),
+]
+
+# Seconds kept between the end of an execution and the client's deadline to send the reply
+DEADLINE_MARGIN = 0.5
+# Wall time left to a snippet whose deadline is closer than DEADLINE_MARGIN
+MIN_WALL_TIME = 0.1
+
+def traced(handler):
+    """Record an RPC handler as a span, continuing the trace in the ``traceparent`` metadata."""
+    name = handler.__name__
+
+    def start_span(context):
+        return span(name, traceparent=dict(context.invocation_metadata()).get("traceparent"), kind="SERVER")
+
+    if inspect.isgeneratorfunction(handler):
+        @wraps(handler)
+        def stream_wrapper(self, request, context):
+            with start_span(context):
+                yield from handler(self, request, context)
+        return stream_wrapper
+
+    @wraps(handler)
+    def wrapper(self, request, context):
+        with start_span(context):
+            return handler(self, request, context)
+    return wrapper
+
+def captured_fields(captured: Dict[str, CapturedOutput]) -> Dict[str, code_executor_pb2.CapturedOutput]:
+    """stdout_capture and stderr_capture of a response or status, from the engine's captured dict."""
+    fields = {}
+    for stream, info in captured.items():
+        if info.omitted_bytes:
+            TRUNCATED_OUTPUTS.labels(stream=stream).inc()
+        fields[f"{stream}_capture"] = code_executor_pb2.CapturedOutput(
+            total_bytes=info.total_bytes,
+            omitted_bytes=info.omitted_bytes,
+            artifact_id=info.artifact_id,
+        )
+    return fields
 
 class CodeExecutorServicer(code_executor_pb2_grpc.CodeExecutorServicer):
+    def __init__(self, engine: ProcessPoolEngine):
+        self.engine = engine
+
+    def _execution_args(self, request: code_executor_pb2.CodeExecutionRequest, context) -> dict:
+        """Limits and cancellation for one execution, from the request and the RPC context."""
+        requested = request.limits
+        wall_time_seconds = requested.wall_time_seconds
+        # Stop the snippet ahead of the client's gRPC deadline, so the client gets
+        # the timeout exit code and the output so far instead of DEADLINE_EXCEEDED
+        time_remaining = context.time_remaining()
+        if time_remaining is not None:
+            time_remaining = max(time_remaining - DEADLINE_MARGIN, MIN_WALL_TIME)
+            wall_time_seconds = min(wall_time_seconds or time_remaining, time_remaining)
+        limits = self.engine.default_limits.tightened(
+            wall_time_seconds=wall_time_seconds,
+            cpu_seconds=requested.cpu_seconds,
+            memory_bytes=requested.memory_bytes,
+            max_output_bytes=requested.max_output_bytes,
+            max_captured_bytes=requested.max_captured_bytes,
+        )
+
+        # Fires when the RPC terminates for any reason, including client cancellation
+        cancel_event = threading.Event()
+        context.add_callback(cancel_event.set)
+        return {"limits": limits, "cancel_event": cancel_event}
+
+    @traced
     def GetToolList(self, request, context) -> code_executor_pb2.GetToolListResponse:
         logger.info(f"Received get code execution tools request")
         try:
@@ -53,7 +128,10 @@ class CodeExecutorServicer(code_executor_pb2_grpc.CodeExecutorServicer):
                 tool_messages.append(tool_message)
             
             # Return GetToolListResponse
-            return code_executor_pb2.GetToolListResponse(tools=tool_messages)
+            return code_executor_pb2.GetToolListResponse(
+                tools=tool_messages,
+                version=tool_registry.catalog_version()
+            )
             
         except Exception as e:
             logger.error(f"Error getting tool list: {str(e)}")
@@ -62,41 +140,24 @@ class CodeExecutorServicer(code_executor_pb2_grpc.CodeExecutorServicer):
             raise
         
 
+    @traced
     def ExecuteCode(self, request: code_executor_pb2.CodeExecutionRequest, context) -> code_executor_pb2.CodeExecutionResponse:
         """Execute Python code in a safe environment."""
         logger.info(f"Received code execution request. Code: {request.code[:50]}")
         try:
-            # Capture stdout and stderr
-            stdout = io.StringIO()
-            stderr = io.StringIO()
-            
-            # Execute code with captured output
-            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
-                # Create a new namespace for execution
-                namespace: Dict[str, Any] = {
-                    "__builtins__": __builtins__,
-                    "final_answer": final_answer,
-                }
-                tool_namespace = {"search": search}
-                namespace.update(tool_namespace)
-                
-                # Execute the code
-                try:
-                    exec(request.code, namespace)
-                    output = stdout.getvalue()
-                    error = stderr.getvalue()
-                    return code_executor_pb2.CodeExecutionResponse(
-                        output=output,
-                        error=error,
-                        exit_code=0
-                    )
-                except Exception as e:
-                    error = f"{type(e).__name__}: {str(e)}"
-                    return code_executor_pb2.CodeExecutionResponse(
-                        output="",
-                        error=error,
-                        exit_code=1
-                    )
+            # Runs in a worker process, which captures its own stdout and stderr
+            with track_rpc("ExecuteCode"):
+                output, error, exit_code, captured = self.engine.execute(
+                    request.code, **self._execution_args(request, context)
+                )
+            EXECUTIONS.labels(exit_code=str(exit_code)).inc()
+            current_span().set_tag("exit_code", exit_code)
+            return code_executor_pb2.CodeExecutionResponse(
+                output=output,
+                error=error,
+                exit_code=exit_code,
+                **captured_fields(captured)
+            )
             
         except Exception as e:
             logger.error(f"Error executing code: {str(e)}")
@@ -104,17 +165,117 @@ class CodeExecutorServicer(code_executor_pb2_grpc.CodeExecutorServicer):
             context.set_details(str(e))
             raise
 
+    @traced
+    def ExecuteCodeStream(self, request: code_executor_pb2.CodeExecutionRequest, context):
+        """Execute Python code and stream its output while it runs."""
+        logger.info(f"Received streaming code execution request. Code: {request.code[:50]}")
+        executions = self.engine.execute_stream(
+            request.code,
+            session_id=request.session_id or None,
+            **self._execution_args(request, context)
+        )
+        try:
+            with track_rpc("ExecuteCodeStream"):
+                for kind, payload in executions:
+                    if not context.is_active():
+                        # Client cancelled, closing the generator kills the snippet
+                        logger.info("Client cancelled streaming execution")
+                        break
+                    if kind == "status":
+                        EXECUTIONS.labels(exit_code=str(payload["exit_code"])).inc()
+                        current_span().set_tag("exit_code", payload["exit_code"])
+                        yield code_executor_pb2.CodeExecutionChunk(
+                            status=code_executor_pb2.CodeExecutionStatus(
+                                exit_code=payload["exit_code"],
+                                error=payload["error"],
+                                **captured_fields(payload["captured"])
+                            )
+                        )
+                    else:
+                        yield code_executor_pb2.CodeExecutionChunk(**{kind: payload})
+        except SessionNotFoundError as e:
+            context.abort(grpc.StatusCode.NOT_FOUND, str(e))
+        finally:
+            executions.close()
+
+    @traced
+    def CreateSession(self, request, context) -> code_executor_pb2.CreateSessionResponse:
+        """Open a session whose namespace persists between executions."""
+        try:
+            session_id = self.engine.create_session()
+            return code_executor_pb2.CreateSessionResponse(session_id=session_id)
+        except TooManySessionsError as e:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+
+    @traced
+    def ExecuteInSession(self, request: code_executor_pb2.CodeExecutionRequest, context) -> code_executor_pb2.CodeExecutionResponse:
+        """Execute Python code in the namespace of an existing session."""
+        logger.info(f"Received code execution request for session {request.session_id}. Code: {request.code[:50]}")
+        if not request.session_id:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "session_id is required")
+        try:
+            with track_rpc("ExecuteInSession"):
+                output, error, exit_code, captured = self.engine.execute(
+                    request.code,
+                    session_id=request.session_id,
+                    **self._execution_args(request, context)
+                )
+            EXECUTIONS.labels(exit_code=str(exit_code)).inc()
+            current_span().set_tag("exit_code", exit_code)
+            return code_executor_pb2.CodeExecutionResponse(
+                output=output,
+                error=error,
+                exit_code=exit_code,
+                **captured_fields(captured)
+            )
+        except SessionNotFoundError as e:
+            context.abort(grpc.StatusCode.NOT_FOUND, str(e))
+
+    @traced
+    def CloseSession(self, request: code_executor_pb2.SessionRequest, context) -> Empty:
+        """Close a session and free its namespace."""
+        try:
+            self.engine.close_session(request.session_id)
+            return Empty()
+        except SessionNotFoundError as e:
+            context.abort(grpc.StatusCode.NOT_FOUND, str(e))
+
+    @traced
+    def FetchArtifact(self, request: code_executor_pb2.ArtifactRequest, context):
+        """Stream the full output kept for an execution whose output was truncated."""
+        if self.engine.artifact_store is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, "This executor keeps no artifacts")
+        try:
+            for data in self.engine.artifact_store.read(request.artifact_id):
+                if not context.is_active():
+                    break
+                yield code_executor_pb2.ArtifactChunk(data=data)
+        except ArtifactNotFoundError as e:
+            context.abort(grpc.StatusCode.NOT_FOUND, str(e))
+
 def serve():
     """Start the gRPC server."""
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    engine = ProcessPoolEngine.from_env()
+    # Leave room for requests queueing on busy workers and for GetToolList calls
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=max(10, engine.num_workers * 2)),
+        options=KEEPALIVE_OPTIONS
+    )
     code_executor_pb2_grpc.add_CodeExecutorServicer_to_server(
-        CodeExecutorServicer(), server
+        CodeExecutorServicer(engine), server
     )
-    port = 50051
+    port = int(os.getenv("EXECUTOR_PORT", "50051"))
     server.add_insecure_port(f'[::]:{port}')
     server.start()
+    start_metrics_server(engine)
+    tracing.configure("code_executor")
     logger.info(f"Code executor server started on port {port}")
-    server.wait_for_termination()
+    try:
+        server.wait_for_termination()
+    finally:
+        server.stop(grace=5)
+        engine.shutdown()
+        tracing.shutdown()
 
 if __name__ == "__main__":
     serve()
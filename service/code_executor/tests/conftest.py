@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The service runs with its own directory on the path, and offline in tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TOOL_SEARCH_BACKEND", "local")
@@ -0,0 +1,84 @@
+import os
+import types
+
+import pytest
+
+import artifacts
+from artifacts import ArtifactNotFoundError, ArtifactStore, OutputCapture
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    yield store
+    store.shutdown()
+
+
+def write_artifact(store: ArtifactStore, data: bytes) -> str:
+    writer = store.create()
+    writer.write(data)
+    return writer.commit()
+
+
+def test_cuts_land_on_character_boundaries():
+    # Byte 5, the end of the head, falls inside the euro sign and the start
+    # of the 5 byte tail inside the e acute
+    text = "aaaa€bbbécccc"
+    capture = OutputCapture(10, store=None)
+    live = capture.feed(text)
+    tail, captured = capture.finish()
+    assert live == "aaaa"
+    assert tail == "\n... [8 of 16 bytes omitted] ...\ncccc"
+    assert (captured.total_bytes, captured.omitted_bytes, captured.artifact_id) == (16, 8, "")
+
+
+def test_short_output_is_passed_on_whole_without_an_artifact(store):
+    capture = OutputCapture(10, store)
+    live = capture.feed("abcdefg")
+    tail, captured = capture.finish()
+    assert live + tail == "abcdefg"
+    assert (captured.total_bytes, captured.omitted_bytes, captured.artifact_id) == (7, 0, "")
+    assert store.total_bytes == 0
+
+
+def test_truncated_output_is_spilled_whole_to_the_store(store):
+    chunks = [f"line {i}\n" for i in range(100)]
+    capture = OutputCapture(20, store, label="stdout")
+    live = "".join(capture.feed(chunk) for chunk in chunks)
+    tail, captured = capture.finish()
+    full = "".join(chunks).encode()
+
+    # Half of the 20 bytes as the snippet runs, the other half once it finished
+    assert live == "line 0\nlin"
+    assert tail.endswith("\nline 99\n")
+    assert captured.total_bytes == len(full)
+    assert captured.omitted_bytes == len(full) - 20
+    assert f"[{captured.omitted_bytes} of {len(full)} bytes omitted, full stdout in artifact {captured.artifact_id}]" in tail
+    assert b"".join(store.read(captured.artifact_id)) == full
+
+
+def test_oldest_artifacts_are_evicted_once_over_the_size_limit(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=10)
+    oldest = write_artifact(store, b"123456")
+    newest = write_artifact(store, b"abcdef")
+    with pytest.raises(ArtifactNotFoundError):
+        list(store.read(oldest))
+    assert not (tmp_path / oldest).exists()
+    assert b"".join(store.read(newest)) == b"abcdef"
+    assert store.total_bytes == 6
+
+
+def test_artifacts_expire_after_the_ttl(store, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(artifacts, "time", types.SimpleNamespace(time=lambda: clock[0]))
+    store.ttl = 60
+    artifact_id = write_artifact(store, b"data")
+
+    clock[0] += 59
+    assert b"".join(store.read(artifact_id)) == b"data"
+    clock[0] += 2
+    with pytest.raises(ArtifactNotFoundError):
+        list(store.read(artifact_id))
+    assert store.evict_expired() == 1
+    assert store.total_bytes == 0
+    assert not os.path.exists(store.path(artifact_id))
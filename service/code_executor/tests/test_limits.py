@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from engine import EXIT_CPU_LIMIT, EXIT_TIMEOUT, ExecutionLimits, ProcessPoolEngine
+
+BUSY_LOOP = "while True:\n    pass"
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = ProcessPoolEngine(num_workers=1, max_runs_per_worker=1000)
+    yield engine
+    engine.shutdown()
+
+
+@pytest.mark.parametrize("warm_up", [False, True], ids=["fresh worker", "reused worker"])
+def test_cpu_limit_fires_before_a_slightly_larger_wall_limit(engine, warm_up):
+    if warm_up:
+        # Leave CPU time on the worker's clock, as an earlier snippet of a session would
+        engine.execute("sum(i * i for i in range(3_000_000))")
+    start = time.monotonic()
+    output, error, exit_code, _ = engine.execute(
+        BUSY_LOOP, limits=ExecutionLimits(wall_time_seconds=3, cpu_seconds=2)
+    )
+    assert exit_code == EXIT_CPU_LIMIT, error
+    assert time.monotonic() - start < 2.8
+
+
+def test_wall_limit_fires_for_a_sleeping_snippet(engine):
+    output, error, exit_code, _ = engine.execute(
+        "import time\nprint('started', flush=True)\ntime.sleep(30)",
+        limits=ExecutionLimits(wall_time_seconds=1, cpu_seconds=2),
+    )
+    assert exit_code == EXIT_TIMEOUT, error
+    assert output == "started\n"
+
+
+def test_interrupting_a_snippet_mid_write_keeps_the_worker(engine):
+    # Large writes keep the worker inside conn.send() most of the time the interrupt may land
+    pid = engine._workers[0].process.pid
+    for _ in range(30):
+        output, error, exit_code, _ = engine.execute(
+            "while True:\n    print('x' * 20000)",
+            limits=ExecutionLimits(wall_time_seconds=0.3, max_output_bytes=0, max_captured_bytes=4096),
+        )
+        assert exit_code == EXIT_TIMEOUT, error
+    assert engine._workers[0].process.pid == pid
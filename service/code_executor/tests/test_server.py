@@ -0,0 +1,55 @@
+from concurrent import futures
+
+import pytest
+
+grpc = pytest.importorskip("grpc")
+# Generated at image build time, see the Dockerfile
+code_executor_pb2 = pytest.importorskip("code_executor_pb2")
+code_executor_pb2_grpc = pytest.importorskip("code_executor_pb2_grpc")
+
+from artifacts import ArtifactStore  # noqa: E402
+from engine import EXIT_OK, EXIT_TIMEOUT, ProcessPoolEngine  # noqa: E402
+from server import CodeExecutorServicer  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def stub(tmp_path_factory):
+    engine = ProcessPoolEngine(num_workers=1, artifact_store=ArtifactStore(str(tmp_path_factory.mktemp("artifacts"))))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    code_executor_pb2_grpc.add_CodeExecutorServicer_to_server(CodeExecutorServicer(engine), server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    channel = grpc.insecure_channel(f"127.0.0.1:{port}")
+    yield code_executor_pb2_grpc.CodeExecutorStub(channel)
+    channel.close()
+    server.stop(grace=None)
+    engine.shutdown()
+
+
+def test_snippet_is_stopped_before_the_client_deadline(stub):
+    request = code_executor_pb2.CodeExecutionRequest(code="print('started', flush=True)\nwhile True:\n    pass")
+    chunks = list(stub.ExecuteCodeStream(request, timeout=2))
+    assert chunks[-1].status.exit_code == EXIT_TIMEOUT
+    assert "".join(chunk.stdout for chunk in chunks) == "started\n"
+
+
+def test_truncated_output_can_be_fetched_whole(stub):
+    request = code_executor_pb2.CodeExecutionRequest(
+        code="for i in range(1000):\n    print(i, '€' * 10)",
+        limits=code_executor_pb2.ExecutionLimits(max_captured_bytes=1000),
+    )
+    response = stub.ExecuteCode(request)
+    full = "".join(f"{i} {'€' * 10}\n" for i in range(1000)).encode()
+    assert response.exit_code == EXIT_OK, response.error
+    assert response.stdout_capture.total_bytes == len(full)
+    assert response.stdout_capture.omitted_bytes > 0
+    assert len(response.output.encode()) < 1100
+
+    chunks = stub.FetchArtifact(code_executor_pb2.ArtifactRequest(artifact_id=response.stdout_capture.artifact_id))
+    assert b"".join(chunk.data for chunk in chunks) == full
+
+
+def test_unknown_artifact_is_not_found(stub):
+    with pytest.raises(grpc.RpcError) as error:
+        list(stub.FetchArtifact(code_executor_pb2.ArtifactRequest(artifact_id="0" * 32)))
+    assert error.value.code() == grpc.StatusCode.NOT_FOUND
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from engine import EXIT_OK, ProcessPoolEngine, SessionNotFoundError
+
+
+@pytest.fixture
+def engine():
+    engine = ProcessPoolEngine(num_workers=1, max_runs_per_worker=1000, session_ttl=1)
+    yield engine
+    engine.shutdown()
+
+
+def test_idle_session_expires_while_its_worker_runs_another_session(engine):
+    idle = engine.create_session()
+    engine.execute("x = 1", session_id=idle)
+    busy = engine.create_session()
+    running = threading.Thread(target=engine.execute, args=("import time\ntime.sleep(3)",), kwargs={"session_id": busy})
+    running.start()
+    try:
+        time.sleep(1.5)
+        engine.evict_expired_sessions()
+        assert engine._workers[0].busy
+        assert idle not in engine._sessions
+        # The running session is never evicted, however long it runs
+        assert busy in engine._sessions
+    finally:
+        running.join()
+    with pytest.raises(SessionNotFoundError):
+        engine.execute("x", session_id=idle)
+    output, error, exit_code, _ = engine.execute("print('alive')", session_id=busy)
+    assert (output, exit_code) == ("alive\n", EXIT_OK), error
+
+
+def test_worn_out_worker_takes_no_new_sessions_and_is_recycled_once_drained():
+    engine = ProcessPoolEngine(num_workers=2, max_runs_per_worker=2)
+    try:
+        first = engine.create_session()
+        worn_out, _ = engine._sessions[first]
+        # Both workers hold a session, so only wear tells them apart
+        engine.create_session()
+        for _ in range(2):
+            engine.execute("x = 1", session_id=first)
+        # Kept alive for the session's namespace, but no longer chosen
+        assert worn_out in engine._workers
+        second = engine.create_session()
+        assert engine._sessions[second][0] is not worn_out
+
+        engine.close_session(first)
+        assert worn_out not in engine._workers
+        assert not worn_out.alive
+        assert all(worker.alive and worker.runs == 0 for worker in engine._workers)
+    finally:
+        engine.shutdown()
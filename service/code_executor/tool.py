@@ -1,15 +1,87 @@
+import copy
+import hashlib
 import inspect
-from typing import Any, Callable, Dict, Optional, get_type_hints
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, get_type_hints
 from functools import wraps
 import logging
 
-from duckduckgo_search import DDGS
-
 
 logger = logging.getLogger(__name__)
 
+class ToolResultCache:
+    """LRU cache of tool results with a TTL per entry, private to the current process.
+
+    Nothing is shared between processes: every executor worker and Jupyter
+    kernel fills its own cache, and loses it when the worker is recycled or
+    the kernel restarts.
+
+    Keys are the tool name and its normalized arguments, see Tool._cache_key().
+    Values are deep-copied in and out so code mutating a result cannot change
+    what later calls get.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        # key -> (expires_at, result)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(found, result) for ``key``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, copy.deepcopy(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: str, result: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+def _normalize(value: Any) -> Any:
+    """Make equivalent arguments compare equal, e.g. queries differing only in case or spacing."""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    return value
+
+
 class Tool:
-    """A decorator that converts a function into a tool with metadata."""
+    """A decorator that converts a function into a tool with metadata.
+
+    Use it bare (``@tool_registry``) or with options; ``cache_ttl`` opts the tool
+    into the result cache of this process, calls with the same normalized
+    arguments within ``cache_ttl`` seconds then return the stored result. ``batch`` also
+    registers a ``<name>_many`` tool taking a list under that parameter name,
+    see _register_batch():
+
+        @tool_registry(cache_ttl=3600, batch="queries")
+        def search(query: str) -> list: ...
+    """
     
     def __init__(
         self,
@@ -19,8 +91,24 @@ class Tool:
         self.description = description
         self.output_type = output_type
         self._tools: Dict[str, Dict[str, Any]] = {}
+        self._functions: Dict[str, Callable] = {}
+        self.cache = ToolResultCache(max_entries=int(os.getenv("TOOL_CACHE_SIZE", "1024")))
+        self.batch_workers = int(os.getenv("TOOL_BATCH_WORKERS", "8"))
+        self._batch_pool: Optional[ThreadPoolExecutor] = None
+        self._batch_pool_lock = threading.Lock()
+
+    def __call__(
+        self,
+        func: Optional[Callable] = None,
+        *,
+        cache_ttl: Optional[float] = None,
+        batch: Optional[str] = None
+    ) -> Callable:
+        if func is None:
+            return lambda func: self._register(func, cache_ttl, batch)
+        return self._register(func, cache_ttl, batch)
 
-    def __call__(self, func: Callable) -> Callable:
+    def _register(self, func: Callable, cache_ttl: Optional[float], batch: Optional[str]) -> Callable:
         # Get function metadata
         sig = inspect.signature(func)
         type_hints = get_type_hints(func)
@@ -29,13 +117,13 @@ class Tool:
         name = func.__name__
         
         # Get docstring for description if not provided
-        if not self.description:
-            self.description = inspect.getdoc(func) or f"Tool {name}"
+        description = self.description or inspect.getdoc(func) or f"Tool {name}"
             
         # Get return type if not provided
-        if not self.output_type:
+        output_type = self.output_type
+        if not output_type:
             return_type = type_hints.get('return', Any)
-            self.output_type = return_type.__name__ if hasattr(return_type, '__name__') else str(return_type)
+            output_type = return_type.__name__ if hasattr(return_type, '__name__') else str(return_type)
         
         # Extract parameter information
         inputs = {}
@@ -47,7 +135,6 @@ class Tool:
             param_type = type_hints.get(param_name, Any)
             param_type_name = param_type.__name__ if hasattr(param_type, '__name__') else str(param_type)
             
-            
             inputs[param_name] = {
                 "type": param_type_name
             }
@@ -55,32 +142,139 @@ class Tool:
         # Store tool metadata
         self._tools[name] = {
             "name": name,
-            "description": self.description,
-            "output_type": self.output_type,
+            "description": description,
+            "output_type": output_type,
             "inputs": inputs
         }
         
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
-            
+        if not cache_ttl:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                return func(*args, **kwargs)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key = self._cache_key(name, sig, args, kwargs)
+                found, result = self.cache.get(key)
+                if found:
+                    logger.info(f"Tool {name} served from cache")
+                    return result
+                result = func(*args, **kwargs)
+                self.cache.put(key, result, cache_ttl)
+                return result
+
+        self._functions[name] = wrapper
+        if batch:
+            self._register_batch(name, wrapper, inputs, output_type, batch)
         return wrapper
+
+    def _register_batch(
+        self,
+        name: str,
+        tool: Callable,
+        inputs: Dict[str, Dict[str, Any]],
+        output_type: str,
+        batch_param: str
+    ):
+        """Register ``<name>_many``, which calls ``tool`` for every item of a list concurrently.
+
+        The first parameter of ``tool`` becomes a list named ``batch_param``; the
+        other parameters are passed unchanged to every call. Results keep the
+        order of the list. A failing call yields ``{"error": "..."}`` in its place
+        instead of failing the whole batch.
+        """
+        item_param, *shared_params = inputs
+        batch_name = f"{name}_many"
+
+        def batch_wrapper(items: list, *args, **kwargs) -> list:
+            pool = self._get_batch_pool()
+            futures = [pool.submit(tool, item, *args, **kwargs) for item in items]
+            results = []
+            for item, future in zip(items, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.warning(f"Tool {name} failed for {item!r} in {batch_name}: {str(e)}")
+                    results.append({"error": f"{type(e).__name__}: {str(e)}"})
+            return results
+
+        batch_wrapper.__name__ = batch_name
+        self._tools[batch_name] = {
+            "name": batch_name,
+            "description": (
+                f"Call `{name}` for every item of `{batch_param}` concurrently, much faster than a loop.\n"
+                f"Returns the results in the same order as `{batch_param}`. If a call fails, its result is "
+                f"{{'error': '<message>'}} instead, the other results are unaffected.\n\n"
+                f":param {batch_param}: List of `{item_param}` values, one `{name}` call each\n"
+                + "".join(f":param {param}: Passed to every `{name}` call\n" for param in shared_params)
+            ),
+            "output_type": "list",
+            "inputs": {batch_param: {"type": "list"}, **{param: inputs[param] for param in shared_params}},
+        }
+        self._functions[batch_name] = batch_wrapper
+
+    def _get_batch_pool(self) -> ThreadPoolExecutor:
+        # Created on first use, so forked worker processes each start their own threads
+        with self._batch_pool_lock:
+            if self._batch_pool is None:
+                self._batch_pool = ThreadPoolExecutor(
+                    max_workers=self.batch_workers, thread_name_prefix="tool-batch"
+                )
+            return self._batch_pool
+
+    @staticmethod
+    def _cache_key(name: str, sig: inspect.Signature, args: tuple, kwargs: dict) -> str:
+        # Binding makes positional, keyword and defaulted arguments produce the same key
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        normalized = {param: _normalize(value) for param, value in bound.arguments.items()}
+        return name + ":" + json.dumps(normalized, sort_keys=True, default=repr)
     
     def get_tools(self) -> Dict[str, Dict[str, Any]]:
         """Get all registered tools."""
         return self._tools
 
+    def catalog_version(self) -> str:
+        """Short hash of the tool metadata, changes whenever a tool is added, removed or changed."""
+        blob = json.dumps(self._tools, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+    def get_catalog(self) -> Dict[str, Any]:
+        """The tool metadata together with its version."""
+        return {"version": self.catalog_version(), "tools": self._tools}
+
+    def get_functions(self) -> Dict[str, Callable]:
+        """Callables of all registered tools by name, to put in a code namespace."""
+        return self._functions
+
 # Create a global tool registry
 tool_registry = Tool()
 
 
-@tool_registry
+def _local_search(query: str, max_results: int) -> list:
+    """Deterministic stand-in for DuckDuckGo, for tests and offline runs."""
+    return [
+        {
+            "title": f"Result {i + 1} for {query}",
+            "href": f"https://example.com/search?q={query.replace(' ', '+')}&result={i + 1}",
+            "body": f"Local search backend result {i + 1} for the query '{query}'.",
+        }
+        for i in range(max_results)
+    ]
+
+@tool_registry(cache_ttl=float(os.getenv("SEARCH_CACHE_TTL", "3600")), batch="queries")
 def search(query: str, max_results: int = 5) -> list:
     """Search DuckDuckGo for a query and return results.
     
     :param query: The search query to look up
     :param max_results: Number of results to return
     """
+    if os.getenv("TOOL_SEARCH_BACKEND", "duckduckgo") == "local":
+        return _local_search(query, max_results)
+    from duckduckgo_search import DDGS
     ddgs = DDGS()
     results = list(ddgs.text(query, max_results=max_results))
     return results
+
+# Registered alongside search, see Tool._register_batch()
+search_many = tool_registry.get_functions()["search_many"]
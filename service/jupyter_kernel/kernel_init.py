@@ -1,10 +1,18 @@
-from tools import final_answer, search, tool
+import builtins
+
+from tools import tool_registry
+
+# Every registered tool, batch variants such as search_many included
+globals().update(tool_registry.get_functions())
+
+# Names picked up by `from kernel_init import *` in the kernel
+__all__ = list(tool_registry.get_functions())
 
 # Make tools available in the kernel's global namespace
-__builtins__['final_answer'] = final_answer
-__builtins__['search'] = search
+for tool_name, tool_function in tool_registry.get_functions().items():
+    setattr(builtins, tool_name, tool_function)
 
 # Print available tools
 print("Available tools:")
-for tool_name, tool_info in tool.get_tools().items():
-    print(f"- {tool_name}: {tool_info['description']}") 
\ No newline at end of file
+for tool_name, tool_info in tool_registry.get_tools().items():
+    print(f"- {tool_name}: {tool_info['description']}")
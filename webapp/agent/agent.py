@@ -6,9 +6,15 @@ import re
 from typing import List, Dict, Optional
 from pydantic import BaseModel, Field, field_validator
 
-from llm.openrouter import OpenRouter
+from llm.registry import llm_registry
 from utils.logging import setup_logger
-from agent.grpc_client import CodeExecutorClient
+from agent.grpc_aio_client import AsyncCodeExecutorClient
+from agent.session import AgentSession
+from agent.step_parser import code_section, generate_step
+from agent.history import HistoryCompactor
+from agent.tool_catalog import ToolCatalog
+from utils.tracing import span
+from utils.metrics import EXECUTE_CODE_SECONDS, ITERATIONS, PARSE_FAILURES, PARSE_SECONDS, timed
 
 
 # Set up logger
@@ -41,97 +47,74 @@ class CodeAgent:
                         Default is prompt.yaml.
     """
 
-    def __init__(self, system_prompt_yaml='utils/prompt.txt', max_iter=5):
+    def __init__(self, system_prompt_yaml='utils/prompt.txt', max_iter=5, catalog: Optional[ToolCatalog] = None):
         assert max_iter > 0, "Assistant needs at least 1 step to give the final answer!"
         self.max_iter = max_iter
 
         self.system_prompt_yaml = system_prompt_yaml
-        self.code_executor = CodeExecutorClient(
+        self.code_executor = AsyncCodeExecutorClient(
             host=os.getenv("CODE_EXECUTOR_HOST", "localhost"),
             port=int(os.getenv("CODE_EXECUTOR_PORT", "50051"))
         )
-        self.system_prompt = self._load_system_prompt()
-        self.messages: List[Dict[str, str]] = []
+        # Shared catalog of the app, or one of its own when used standalone
+        self.catalog = catalog or ToolCatalog(
+            self.code_executor.get_tool_catalog, system_prompt_yaml=system_prompt_yaml, name="code executor"
+        )
+        # Keeps the prompt within the token budget however long the task runs
+        self.history = HistoryCompactor.from_env()
 
+        # Shared with every other agent, closed on app shutdown
+        self.llm = llm_registry.get(api_key=os.getenv("API_KEY"))
 
-        self.llm = OpenRouter(api_key=os.getenv("API_KEY"))
-    
-    def _generate_tools_string(self, tools) -> str:
-        """Generate a string representation of the tools for the prompt."""
-        tools_str = []
-        for tool in tools:
-            # Function signature
-            params = [f"{name}: {info.type}" for name, info in tool.inputs.items()]
-            signature = f"def {tool.name}({', '.join(params)}) -> {tool.output_type}"
-            
-            # Docstring
-            docstring = [
-                f'    """\n{tool.description}',
-                '    """'
-            ]
-            
-            # Combine everything
-            tools_str.append(f"{signature}:\n" + "\n".join(docstring))
+    @classmethod
+    async def create(cls, **kwargs) -> "CodeAgent":
+        """Build an agent and load its system prompt from the code executor."""
+        agent = cls(**kwargs)
+        await agent.initialize()
+        return agent
+
+    async def initialize(self):
+        """Load the system prompt, which needs the tool list from the code executor."""
+        await self.catalog.get_system_prompt()
+
+    @property
+    def system_prompt(self) -> Optional[str]:
+        """Prompt of the current tool catalog version."""
+        return self.catalog.system_prompt
         
-        return "\n\n".join(tools_str)
+    def add_message(self, session: AgentSession, role: str, content: str):
+        """Add a message to the session's conversation history."""
+        session.add_message(role, content)
+        logger.info(f"Added {role} message to history of session {session.session_id}")
+    
+    async def answer_question(self, question: str, session: Optional[AgentSession] = None) -> List[Dict[str, str]]:
+        # Rendered once per catalog version, kept current in the background
+        system_prompt = await self.catalog.get_system_prompt()
 
-    def _load_system_prompt(self):
+        # Every question gets its own session so concurrent requests never share history
+        session = session or AgentSession()
+        self.add_message(session, 'system', system_prompt)
+        self.add_message(session, "user", question)
+
+        # One executor session per question, so variables persist between steps
+        session.executor_session_id = await self.code_executor.create_session()
         try:
-            # Read the prompt template
-            with open(self.system_prompt_yaml, 'r') as f:
-                prompt_template = f.read()
-            
-            # Get tools and format them
-            tools = self.code_executor.list_tools()
-            tools_str = self._generate_tools_string(tools)
-            
-            # Format the prompt
-            return prompt_template.format(
-                tools=tools_str,
-                authorized_imports='any import is allowed'  # or your list of authorized imports
-            )
-                
-        except Exception as e:
-            raise Exception(f"Error loading code agent system prompt: {str(e)}")
-        
-    def add_message(self, role: str, content: str):
-        """Add a message to the conversation history."""
-        self.messages.append({"role": role, "content": content})
-
-        print(f"{role.upper()}:")
-        if "Thought:" in content and "Code:" in content:
-            thought, code = content.split("Code:", 1)
-            thought = thought.replace("Thought:", "").strip()
-            code = code.strip()
-            
-            # Print thought
-            print("Thought:")
-            for line in thought.split('\n'):
-                print(f"  {line}")
-            
-            # Print code
-            print("\nCode:")
-            for line in code.split('\n'):
-                print(f"  {line}")
-        else:
-            print(content)
-    
-    async def answer_question(self, question: str) -> List[Dict[str, str]]:
-        # Add user message to history
-        self.add_message('system', self.system_prompt)
-        self.add_message("user", question)
-        logger.info("User message added to history")
-        await self._process_message()
-        messages = self.messages.copy()
-        self.messages = []
-        return messages
+            with span("code_agent.answer_question", session_id=session.session_id):
+                await self._process_message(session)
+        finally:
+            try:
+                await self.code_executor.close_session(session.executor_session_id)
+            except Exception as e:
+                # The executor evicts idle sessions on its own
+                logger.warning(f"Failed to close executor session {session.executor_session_id}: {str(e)}")
+        return session.messages.copy()
 
     
-    async def _process_message(self) -> List[Dict[str, str]]:
+    async def _process_message(self, session: AgentSession) -> List[Dict[str, str]]:
         """Process a user message and return the agent's response.
         
         Args:
-            message: The user's message
+            session: The session holding the conversation history
             
         Returns:
             CodeAgentResponse containing thought and code
@@ -141,42 +124,61 @@ class CodeAgent:
         """
 
 
-        for _ in range(self.max_iter):
+        for iteration in range(1, self.max_iter + 1):
             try:
-                # Get completion from OpenRouter
-                response = await self.llm.chat_completion(
-                    messages=self.messages,
-                    model="deepseek/deepseek-r1-0528-qwen3-8b:free",
-                    temperature=0.7,
-                    top_p=0.95,
-                )
-                logger.info("Received response from LLM")
+                with span("agent.step", agent="code", step=iteration):
+                    # Get completion from OpenRouter
+                    # Stops as soon as a full thought/code step arrived
+                    response = await generate_step(
+                        self.llm,
+                        messages=self.history.compact(session.messages),
+                        model="deepseek/deepseek-r1-0528-qwen3-8b:free",
+                        temperature=0.7,
+                        top_p=0.95,
+                    )
+                    logger.info("Received response from LLM")
                 
-                agent_response = self._parse_llm_response(response)
-                # Add assistant's response to history
-                self.add_message("assistant", f"Thought: {agent_response.thought}\nCode: {agent_response.code}")
-                logger.info("Assistant response added to history")
-                # logger.info(format_chat_history(self.messages))
-                # logger.debug(self.messages)
-
-                # Send code to code executor and add result as "Observation"
-                output, error, exit_code = self.code_executor(agent_response.code)
-                final_answer = self._parse_final_answer_str(output)
-
-                if error:
-                    agent_response.observation = f"Error: {error}. Exit code: {exit_code}"
-                    # self.add_message("system", f"Observation: {agent_response.observation}")
-                    self.add_message("system", f"{agent_response.observation}")
-                elif final_answer:
-                    agent_response.final_answer = final_answer
-                    self.add_message("system", f"Final Answer: {agent_response.final_answer}")
-                else:
-                    agent_response.observation = output
-                    # self.add_message("system", f"Observation: {agent_response.observation}")
-                    self.add_message("system", f"{agent_response.observation}")
-
-                if final_answer:
-                    return self.return_complete_solution()
+                    try:
+                        with span("agent.parse"), timed(PARSE_SECONDS, agent="code"):
+                            agent_response = self._parse_llm_response(response)
+                    except Exception:
+                        PARSE_FAILURES.labels(agent="code").inc()
+                        raise
+                    # Add assistant's response to history
+                    self.add_message(session, "assistant", f"Thought: {agent_response.thought}\nCode: {agent_response.code}")
+                    session.emit("thought", agent_response.thought)
+                    session.emit("code", agent_response.code)
+                    # logger.info(format_chat_history(self.messages))
+                    # logger.debug(self.messages)
+
+                    # Send code to code executor and add result as "Observation"
+                    with timed(EXECUTE_CODE_SECONDS, backend="grpc"):
+                        output, error, exit_code = await self.code_executor(
+                            agent_response.code, session_id=session.executor_session_id
+                        )
+                    final_answer = self._parse_final_answer_str(output)
+
+                    if error:
+                        agent_response.observation = f"Error: {error}. Exit code: {exit_code}"
+                        if output.strip():
+                            # What the code printed before it failed or was stopped
+                            agent_response.observation = f"{output.rstrip()}\n{agent_response.observation}"
+                        # self.add_message("system", f"Observation: {agent_response.observation}")
+                        self.add_message(session, "system", f"{agent_response.observation}")
+                        session.emit("observation", agent_response.observation)
+                    elif final_answer:
+                        agent_response.final_answer = final_answer
+                        self.add_message(session, "system", f"Final Answer: {agent_response.final_answer}")
+                        session.emit("final_answer", agent_response.final_answer)
+                    else:
+                        agent_response.observation = output
+                        # self.add_message("system", f"Observation: {agent_response.observation}")
+                        self.add_message(session, "system", f"{agent_response.observation}")
+                        session.emit("observation", agent_response.observation)
+
+                    if final_answer:
+                        ITERATIONS.labels(agent="code").observe(iteration)
+                        return self.return_complete_solution(session)
                 
             except Exception as e:
                 error_msg = f"Error processing message: {str(e)}"
@@ -184,17 +186,18 @@ class CodeAgent:
                 raise ValueError(error_msg)
         
         # exceed max iter
-        logger.warning(f'Failed to give final answer within {self.max_iter} steps.\nLast response: {self.messages[-2:]}')
+        ITERATIONS.labels(agent="code").observe(self.max_iter)
+        logger.warning(f'Failed to give final answer within {self.max_iter} steps.\nLast response: {session.messages[-2:]}')
         return agent_response
 
-    def return_complete_solution(self) -> List[Dict[str, str]]:
+    def return_complete_solution(self, session: AgentSession) -> List[Dict[str, str]]:
         """Return only the solution part from code agent, expcet the first two items in messages(question and system prompt)"""
-        return self.messages[2:]
+        return session.messages[2:]
     
     async def close(self):
-        """Close the LLM client and code executor."""
+        """Close the LLM client (a no-op for the shared one) and code executor."""
         await self.llm.close()
-        self.code_executor.close()
+        await self.code_executor.close()
     
     def _parse_final_answer_str(self, output: str) -> Optional[str]:
         match = re.search(FINAL_ANSWER_REGEX, output)
@@ -215,7 +218,7 @@ class CodeAgent:
                 raise LLMCodeParseError("Response must contain 'Thought:' and 'Code:' sections")
             
             thought = response[thought_start + 8:code_start].strip()
-            code = response[code_start + 5:].strip()
+            code = code_section(response, code_start)
             
             agent_response = CodeAgentResponse(thought=thought, code=code)
             agent_response.code = self._validate_llm_code(agent_response.code)
@@ -25,7 +25,7 @@ _sym_db = _symbol_database.Default()
 from google.protobuf import empty_pb2 as google_dot_protobuf_dot_empty__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13\x63ode_executor.proto\x12\rcode_executor\x1a\x1bgoogle/protobuf/empty.proto\"$\n\x14\x43odeExecutionRequest\x12\x0c\n\x04\x63ode\x18\x01 \x01(\t\"I\n\x15\x43odeExecutionResponse\x12\x0e\n\x06output\x18\x01 \x01(\t\x12\r\n\x05\x65rror\x18\x02 \x01(\t\x12\x11\n\texit_code\x18\x03 \x01(\x05\"9\n\x13GetToolListResponse\x12\"\n\x05tools\x18\x01 \x03(\x0b\x32\x13.code_executor.Tool\"\xb8\x01\n\x04Tool\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x13\n\x0boutput_type\x18\x03 \x01(\t\x12/\n\x06inputs\x18\x04 \x03(\x0b\x32\x1f.code_executor.Tool.InputsEntry\x1aG\n\x0bInputsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\'\n\x05value\x18\x02 \x01(\x0b\x32\x18.code_executor.ToolInput:\x02\x38\x01\".\n\tToolInput\x12\x0c\n\x04type\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t2\xb3\x01\n\x0c\x43odeExecutor\x12X\n\x0b\x45xecuteCode\x12#.code_executor.CodeExecutionRequest\x1a$.code_executor.CodeExecutionResponse\x12I\n\x0bGetToolList\x12\x16.google.protobuf.Empty\x1a\".code_executor.GetToolListResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13\x63ode_executor.proto\x12\rcode_executor\x1a\x1bgoogle/protobuf/empty.proto\"h\n\x14\x43odeExecutionRequest\x12\x0c\n\x04\x63ode\x18\x01 \x01(\t\x12\x12\n\nsession_id\x18\x02 \x01(\t\x12.\n\x06limits\x18\x03 \x01(\x0b\x32\x1e.code_executor.ExecutionLimits\"\x8d\x01\n\x0f\x45xecutionLimits\x12\x19\n\x11wall_time_seconds\x18\x01 \x01(\x01\x12\x13\n\x0b\x63pu_seconds\x18\x02 \x01(\x05\x12\x14\n\x0cmemory_bytes\x18\x03 \x01(\x03\x12\x18\n\x10max_output_bytes\x18\x04 \x01(\x03\x12\x1a\n\x12max_captured_bytes\x18\x05 \x01(\x03\"\xb7\x01\n\x15\x43odeExecutionResponse\x12\x0e\n\x06output\x18\x01 \x01(\t\x12\r\n\x05\x65rror\x18\x02 \x01(\t\x12\x11\n\texit_code\x18\x03 \x01(\x05\x12\x35\n\x0estdout_capture\x18\x04 \x01(\x0b\x32\x1d.code_executor.CapturedOutput\x12\x35\n\x0estderr_capture\x18\x05 \x01(\x0b\x32\x1d.code_executor.CapturedOutput\"Q\n\x0e\x43\x61pturedOutput\x12\x13\n\x0btotal_bytes\x18\x01 \x01(\x03\x12\x15\n\romitted_bytes\x18\x02 \x01(\x03\x12\x13\n\x0b\x61rtifact_id\x18\x03 \x01(\t\"y\n\x12\x43odeExecutionChunk\x12\x10\n\x06stdout\x18\x01 \x01(\tH\x00\x12\x10\n\x06stderr\x18\x02 \x01(\tH\x00\x12\x34\n\x06status\x18\x03 \x01(\x0b\x32\".code_executor.CodeExecutionStatusH\x00\x42\t\n\x07payload\"\xa5\x01\n\x13\x43odeExecutionStatus\x12\x11\n\texit_code\x18\x01 \x01(\x05\x12\r\n\x05\x65rror\x18\x02 \x01(\t\x12\x35\n\x0estdout_capture\x18\x03 \x01(\x0b\x32\x1d.code_executor.CapturedOutput\x12\x35\n\x0estderr_capture\x18\x04 \x01(\x0b\x32\x1d.code_executor.CapturedOutput\"+\n\x15\x43reateSessionResponse\x12\x12\n\nsession_id\x18\x01 \x01(\t\"$\n\x0eSessionRequest\x12\x12\n\nsession_id\x18\x01 \x01(\t\"&\n\x0f\x41rtifactRequest\x12\x13\n\x0b\x61rtifact_id\x18\x01 \x01(\t\"\x1d\n\rArtifactChunk\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\"J\n\x13GetToolListResponse\x12\"\n\x05tools\x18\x01 \x03(\x0b\x32\x13.code_executor.Tool\x12\x0f\n\x07version\x18\x02 \x01(\t\"\xb8\x01\n\x04Tool\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x13\n\x0boutput_type\x18\x03 \x01(\t\x12/\n\x06inputs\x18\x04 \x03(\x0b\x32\x1f.code_executor.Tool.InputsEntry\x1aG\n\x0bInputsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\'\n\x05value\x18\x02 \x01(\x0b\x32\x18.code_executor.ToolInput:\x02\x38\x01\".\n\tToolInput\x12\x0c\n\x04type\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t2\xd8\x04\n\x0c\x43odeExecutor\x12X\n\x0b\x45xecuteCode\x12#.code_executor.CodeExecutionRequest\x1a$.code_executor.CodeExecutionResponse\x12I\n\x0bGetToolList\x12\x16.google.protobuf.Empty\x1a\".code_executor.GetToolListResponse\x12]\n\x11\x45xecuteCodeStream\x12#.code_executor.CodeExecutionRequest\x1a!.code_executor.CodeExecutionChunk0\x01\x12M\n\rCreateSession\x12\x16.google.protobuf.Empty\x1a$.code_executor.CreateSessionResponse\x12]\n\x10\x45xecuteInSession\x12#.code_executor.CodeExecutionRequest\x1a$.code_executor.CodeExecutionResponse\x12\x45\n\x0c\x43loseSession\x12\x1d.code_executor.SessionRequest\x1a\x16.google.protobuf.Empty\x12O\n\rFetchArtifact\x12\x1e.code_executor.ArtifactRequest\x1a\x1c.code_executor.ArtifactChunk0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -35,17 +35,33 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_TOOL_INPUTSENTRY']._loaded_options = None
   _globals['_TOOL_INPUTSENTRY']._serialized_options = b'8\001'
   _globals['_CODEEXECUTIONREQUEST']._serialized_start=67
-  _globals['_CODEEXECUTIONREQUEST']._serialized_end=103
-  _globals['_CODEEXECUTIONRESPONSE']._serialized_start=105
-  _globals['_CODEEXECUTIONRESPONSE']._serialized_end=178
-  _globals['_GETTOOLLISTRESPONSE']._serialized_start=180
-  _globals['_GETTOOLLISTRESPONSE']._serialized_end=237
-  _globals['_TOOL']._serialized_start=240
-  _globals['_TOOL']._serialized_end=424
-  _globals['_TOOL_INPUTSENTRY']._serialized_start=353
-  _globals['_TOOL_INPUTSENTRY']._serialized_end=424
-  _globals['_TOOLINPUT']._serialized_start=426
-  _globals['_TOOLINPUT']._serialized_end=472
-  _globals['_CODEEXECUTOR']._serialized_start=475
-  _globals['_CODEEXECUTOR']._serialized_end=654
+  _globals['_CODEEXECUTIONREQUEST']._serialized_end=171
+  _globals['_EXECUTIONLIMITS']._serialized_start=174
+  _globals['_EXECUTIONLIMITS']._serialized_end=315
+  _globals['_CODEEXECUTIONRESPONSE']._serialized_start=318
+  _globals['_CODEEXECUTIONRESPONSE']._serialized_end=501
+  _globals['_CAPTUREDOUTPUT']._serialized_start=503
+  _globals['_CAPTUREDOUTPUT']._serialized_end=584
+  _globals['_CODEEXECUTIONCHUNK']._serialized_start=586
+  _globals['_CODEEXECUTIONCHUNK']._serialized_end=707
+  _globals['_CODEEXECUTIONSTATUS']._serialized_start=710
+  _globals['_CODEEXECUTIONSTATUS']._serialized_end=875
+  _globals['_CREATESESSIONRESPONSE']._serialized_start=877
+  _globals['_CREATESESSIONRESPONSE']._serialized_end=920
+  _globals['_SESSIONREQUEST']._serialized_start=922
+  _globals['_SESSIONREQUEST']._serialized_end=958
+  _globals['_ARTIFACTREQUEST']._serialized_start=960
+  _globals['_ARTIFACTREQUEST']._serialized_end=998
+  _globals['_ARTIFACTCHUNK']._serialized_start=1000
+  _globals['_ARTIFACTCHUNK']._serialized_end=1029
+  _globals['_GETTOOLLISTRESPONSE']._serialized_start=1031
+  _globals['_GETTOOLLISTRESPONSE']._serialized_end=1105
+  _globals['_TOOL']._serialized_start=1108
+  _globals['_TOOL']._serialized_end=1292
+  _globals['_TOOL_INPUTSENTRY']._serialized_start=1221
+  _globals['_TOOL_INPUTSENTRY']._serialized_end=1292
+  _globals['_TOOLINPUT']._serialized_start=1294
+  _globals['_TOOLINPUT']._serialized_end=1340
+  _globals['_CODEEXECUTOR']._serialized_start=1343
+  _globals['_CODEEXECUTOR']._serialized_end=1943
 # @@protoc_insertion_point(module_scope)
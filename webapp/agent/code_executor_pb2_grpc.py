@@ -45,6 +45,31 @@ class CodeExecutorStub(object):
                 request_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
                 response_deserializer=code__executor__pb2.GetToolListResponse.FromString,
                 _registered_method=True)
+        self.ExecuteCodeStream = channel.unary_stream(
+                '/code_executor.CodeExecutor/ExecuteCodeStream',
+                request_serializer=code__executor__pb2.CodeExecutionRequest.SerializeToString,
+                response_deserializer=code__executor__pb2.CodeExecutionChunk.FromString,
+                _registered_method=True)
+        self.CreateSession = channel.unary_unary(
+                '/code_executor.CodeExecutor/CreateSession',
+                request_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
+                response_deserializer=code__executor__pb2.CreateSessionResponse.FromString,
+                _registered_method=True)
+        self.ExecuteInSession = channel.unary_unary(
+                '/code_executor.CodeExecutor/ExecuteInSession',
+                request_serializer=code__executor__pb2.CodeExecutionRequest.SerializeToString,
+                response_deserializer=code__executor__pb2.CodeExecutionResponse.FromString,
+                _registered_method=True)
+        self.CloseSession = channel.unary_unary(
+                '/code_executor.CodeExecutor/CloseSession',
+                request_serializer=code__executor__pb2.SessionRequest.SerializeToString,
+                response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+                _registered_method=True)
+        self.FetchArtifact = channel.unary_stream(
+                '/code_executor.CodeExecutor/FetchArtifact',
+                request_serializer=code__executor__pb2.ArtifactRequest.SerializeToString,
+                response_deserializer=code__executor__pb2.ArtifactChunk.FromString,
+                _registered_method=True)
 
 
 class CodeExecutorServicer(object):
@@ -62,6 +87,42 @@ class CodeExecutorServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ExecuteCodeStream(self, request, context):
+        """Streams stdout/stderr while the code runs. Runs in the session named by
+        session_id when it is set, in a fresh namespace otherwise.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CreateSession(self, request, context):
+        """Stateful sessions: variables defined by one execution stay available to
+        the next one in the same session until it is closed or idles out.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ExecuteInSession(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CloseSession(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def FetchArtifact(self, request, context):
+        """Streams the full output of an execution whose output was truncated.
+        Artifacts expire, NOT_FOUND once they did.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_CodeExecutorServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -75,6 +136,31 @@ def add_CodeExecutorServicer_to_server(servicer, server):
                     request_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
                     response_serializer=code__executor__pb2.GetToolListResponse.SerializeToString,
             ),
+            'ExecuteCodeStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.ExecuteCodeStream,
+                    request_deserializer=code__executor__pb2.CodeExecutionRequest.FromString,
+                    response_serializer=code__executor__pb2.CodeExecutionChunk.SerializeToString,
+            ),
+            'CreateSession': grpc.unary_unary_rpc_method_handler(
+                    servicer.CreateSession,
+                    request_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+                    response_serializer=code__executor__pb2.CreateSessionResponse.SerializeToString,
+            ),
+            'ExecuteInSession': grpc.unary_unary_rpc_method_handler(
+                    servicer.ExecuteInSession,
+                    request_deserializer=code__executor__pb2.CodeExecutionRequest.FromString,
+                    response_serializer=code__executor__pb2.CodeExecutionResponse.SerializeToString,
+            ),
+            'CloseSession': grpc.unary_unary_rpc_method_handler(
+                    servicer.CloseSession,
+                    request_deserializer=code__executor__pb2.SessionRequest.FromString,
+                    response_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
+            ),
+            'FetchArtifact': grpc.unary_stream_rpc_method_handler(
+                    servicer.FetchArtifact,
+                    request_deserializer=code__executor__pb2.ArtifactRequest.FromString,
+                    response_serializer=code__executor__pb2.ArtifactChunk.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'code_executor.CodeExecutor', rpc_method_handlers)
@@ -139,3 +225,138 @@ class CodeExecutor(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def ExecuteCodeStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/code_executor.CodeExecutor/ExecuteCodeStream',
+            code__executor__pb2.CodeExecutionRequest.SerializeToString,
+            code__executor__pb2.CodeExecutionChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CreateSession(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/code_executor.CodeExecutor/CreateSession',
+            google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
+            code__executor__pb2.CreateSessionResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ExecuteInSession(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/code_executor.CodeExecutor/ExecuteInSession',
+            code__executor__pb2.CodeExecutionRequest.SerializeToString,
+            code__executor__pb2.CodeExecutionResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CloseSession(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/code_executor.CodeExecutor/CloseSession',
+            code__executor__pb2.SessionRequest.SerializeToString,
+            google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def FetchArtifact(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/code_executor.CodeExecutor/FetchArtifact',
+            code__executor__pb2.ArtifactRequest.SerializeToString,
+            code__executor__pb2.ArtifactChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
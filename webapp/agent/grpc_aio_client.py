@@ -0,0 +1,203 @@
+import os
+from typing import Dict, Optional, Tuple
+
+import grpc
+from . import code_executor_pb2
+from . import code_executor_pb2_grpc
+from .grpc_client import EXIT_CANCELLED, OutputCallback, collect_result
+from .tool_catalog import catalog_version
+from utils.logging import setup_logger
+from utils.tracing import current_traceparent, span
+from google.protobuf.empty_pb2 import Empty
+
+logger = setup_logger(__name__)
+
+# Keep the HTTP/2 connection warm between agent steps and detect dead peers quickly
+KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30_000),
+    ("grpc.keepalive_timeout_ms", 10_000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+
+def trace_metadata() -> Optional[Tuple[Tuple[str, str], ...]]:
+    """gRPC metadata continuing the current trace on the executor, None outside of a trace."""
+    traceparent = current_traceparent()
+    return (("traceparent", traceparent),) if traceparent else None
+
+
+class AsyncCodeExecutorClient:
+    """asyncio-native client for the code executor service.
+
+    The channel is created once and reused for every call; grpc.aio reconnects
+    it transparently, so there is no need to poll connectivity state. Cancelling
+    the awaiting task (e.g. when the HTTP client goes away) cancels the RPC.
+    """
+
+    def __init__(
+        self,
+        host: str = 'localhost',
+        port: int = 50051,
+        timeout: Optional[float] = None,
+    ):
+        """Initialize the async code executor client.
+
+        Args:
+            host: The host where the code executor service is running
+            port: The port where the code executor service is running
+            timeout: Default per-call deadline in seconds
+        """
+        self.address = f'{host}:{port}'
+        self.timeout = timeout if timeout is not None else float(os.getenv("CODE_EXECUTOR_TIMEOUT", "120"))
+        # Opened on first use, inside the event loop that will drive it
+        self.channel: Optional[grpc.aio.Channel] = None
+        self._stub: Optional[code_executor_pb2_grpc.CodeExecutorStub] = None
+        logger.info(f"Initialized async gRPC client for {self.address}.")
+
+    @property
+    def stub(self) -> code_executor_pb2_grpc.CodeExecutorStub:
+        if self._stub is None:
+            self.channel = grpc.aio.insecure_channel(self.address, options=KEEPALIVE_OPTIONS)
+            self._stub = code_executor_pb2_grpc.CodeExecutorStub(self.channel)
+        return self._stub
+
+    async def __call__(
+        self,
+        code: str,
+        session_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        on_output: Optional[OutputCallback] = None,
+        limits: Optional[code_executor_pb2.ExecutionLimits] = None,
+    ) -> tuple[str, str, int]:
+        """Execute Python code remotely, consuming its output as it streams in.
+
+        Args:
+            code: The Python code to execute
+            session_id: Optional session to run the code in, see create_session()
+            timeout: Deadline in seconds for this call, defaults to ``self.timeout``
+            on_output: Optional callback receiving ("stdout"|"stderr", text) chunks as
+                they arrive. Returning False stops the execution early.
+            limits: Optional resource limits, they can only tighten the server defaults
+
+        Returns:
+            tuple: (output, error, exit_code)
+        """
+        request = code_executor_pb2.CodeExecutionRequest(
+            code=code,
+            session_id=session_id or "",
+            limits=limits
+        )
+        with span("executor.ExecuteCodeStream", kind="CLIENT", session_id=session_id or "") as rpc_span:
+            call = self.stub.ExecuteCodeStream(
+                request, timeout=timeout or self.timeout, metadata=trace_metadata()
+            )
+            try:
+                output, errors = [], []
+                async for chunk in call:
+                    kind = chunk.WhichOneof("payload")
+                    if kind == "status":
+                        rpc_span.set_tag("exit_code", chunk.status.exit_code)
+                        return collect_result(output, errors, chunk.status.exit_code, chunk.status.error)
+                    (output if kind == "stdout" else errors).append(getattr(chunk, kind))
+                    if on_output and on_output(kind, getattr(chunk, kind)) is False:
+                        call.cancel()
+                        rpc_span.set_tag("exit_code", EXIT_CANCELLED)
+                        return collect_result(output, errors, EXIT_CANCELLED, "Execution stopped by client")
+                raise Exception("Stream ended without an execution status")
+
+            except grpc.aio.AioRpcError as e:
+                error_msg = f"Code execution RPC failed: {e.details()}"
+                logger.error(error_msg)
+                raise Exception(error_msg)
+            finally:
+                # Also stops the server-side execution when the awaiting task is cancelled
+                call.cancel()
+
+    async def list_tools(self, timeout: Optional[float] = None):
+        tools = await self.list_tools_response(timeout)
+        logger.info(tools.tools)
+        return tools.tools
+
+    async def get_tool_catalog(self, timeout: Optional[float] = None) -> Tuple[str, Dict[str, Dict]]:
+        """Version and tools of the executor, the tools in tool_registry.get_tools() format."""
+        response = await self.list_tools_response(timeout)
+        tools = {
+            tool.name: {
+                "name": tool.name,
+                "description": tool.description,
+                "output_type": tool.output_type,
+                "inputs": {
+                    name: {"type": info.type, **({"description": info.description} if info.description else {})}
+                    for name, info in tool.inputs.items()
+                },
+            }
+            for tool in response.tools
+        }
+        # The executor's own version; those predating catalog versions leave it empty
+        return response.version or catalog_version(tools), tools
+
+    async def list_tools_response(self, timeout: Optional[float] = None) -> code_executor_pb2.GetToolListResponse:
+        try:
+            return await self.stub.GetToolList(Empty(), timeout=timeout or self.timeout, metadata=trace_metadata())
+
+        except grpc.aio.AioRpcError as e:
+            error_msg = f"Get tool list RPC failed: {e.details()}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    async def create_session(self, timeout: Optional[float] = None) -> str:
+        """Open an executor session whose variables persist between calls."""
+        try:
+            response = await self.stub.CreateSession(Empty(), timeout=timeout or self.timeout, metadata=trace_metadata())
+            return response.session_id
+
+        except grpc.aio.AioRpcError as e:
+            error_msg = f"Create session RPC failed: {e.details()}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    async def close_session(self, session_id: str, timeout: Optional[float] = None):
+        """Close an executor session."""
+        try:
+            await self.stub.CloseSession(
+                code_executor_pb2.SessionRequest(session_id=session_id),
+                timeout=timeout or self.timeout,
+                metadata=trace_metadata()
+            )
+
+        except grpc.aio.AioRpcError as e:
+            error_msg = f"Close session RPC failed: {e.details()}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    async def fetch_artifact(self, artifact_id: str, timeout: Optional[float] = None) -> bytes:
+        """Full output of an execution whose output was truncated, by the artifact_id of its CapturedOutput."""
+        try:
+            call = self.stub.FetchArtifact(
+                code_executor_pb2.ArtifactRequest(artifact_id=artifact_id),
+                timeout=timeout or self.timeout,
+                metadata=trace_metadata()
+            )
+            return b"".join([chunk.data async for chunk in call])
+
+        except grpc.aio.AioRpcError as e:
+            error_msg = f"Fetch artifact RPC failed: {e.details()}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    async def wait_ready(self):
+        """Wait until the channel is connected to the executor, use with a timeout."""
+        self.stub
+        await self.channel.channel_ready()
+
+    async def close(self):
+        """Close the gRPC channel."""
+        if self.channel is None:
+            return
+        try:
+            await self.channel.close()
+            self.channel, self._stub = None, None
+            logger.info("Closed async gRPC channel")
+        except Exception as e:
+            logger.error(f"Error closing async gRPC channel: {str(e)}")
@@ -1,3 +1,5 @@
+from typing import Callable, List, Optional
+
 import grpc
 from . import code_executor_pb2
 from . import code_executor_pb2_grpc
@@ -6,6 +8,22 @@ from google.protobuf.empty_pb2 import Empty
 
 logger = setup_logger(__name__)
 
+# Exit code reported when the client stops a streaming execution itself
+EXIT_CANCELLED = 130
+
+# Receives ("stdout"|"stderr", text) chunks, returning False stops the execution
+OutputCallback = Callable[[str, str], Optional[bool]]
+
+def collect_result(output: List[str], errors: List[str], exit_code: int, error: str) -> tuple[str, str, int]:
+    """Fold streamed chunks into the (output, error, exit_code) tuple of a unary ExecuteCode.
+
+    A failed execution keeps the output it printed before it stopped, e.g. up
+    to a timeout, next to the error.
+    """
+    if exit_code != 0:
+        return "".join(output), error, exit_code
+    return "".join(output), "".join(errors), exit_code
+
 class CodeExecutorClient:
     def __init__(self, host: str = 'localhost', port: int = 50051):
         """Initialize the code executor client.
@@ -23,11 +41,21 @@ class CodeExecutorClient:
             self.stub = code_executor_pb2_grpc.CodeExecutorStub(self.channel)
             logger.info(f"Initialized gRPC client for {self.address}.")
     
-    def __call__(self, code: str) -> tuple[str, str, int]:
-        """Execute Python code remotely.
+    def __call__(
+        self,
+        code: str,
+        session_id: Optional[str] = None,
+        on_output: Optional[OutputCallback] = None,
+        limits: Optional[code_executor_pb2.ExecutionLimits] = None,
+    ) -> tuple[str, str, int]:
+        """Execute Python code remotely, consuming its output as it streams in.
         
         Args:
             code: The Python code to execute
+            session_id: Optional session to run the code in, see create_session()
+            on_output: Optional callback receiving ("stdout"|"stderr", text) chunks as
+                they arrive. Returning False stops the execution early.
+            limits: Optional resource limits, they can only tighten the server defaults
             
         Returns:
             tuple: (output, error, exit_code)
@@ -35,10 +63,21 @@ class CodeExecutorClient:
         self._get_channel() # make sure the connection is active
         try:
             request = code_executor_pb2.CodeExecutionRequest(
-                code=code
+                code=code,
+                session_id=session_id or "",
+                limits=limits
             )
-            response = self.stub.ExecuteCode(request)
-            return response.output, response.error, response.exit_code
+            call = self.stub.ExecuteCodeStream(request)
+            output, errors = [], []
+            for chunk in call:
+                kind = chunk.WhichOneof("payload")
+                if kind == "status":
+                    return collect_result(output, errors, chunk.status.exit_code, chunk.status.error)
+                (output if kind == "stdout" else errors).append(getattr(chunk, kind))
+                if on_output and on_output(kind, getattr(chunk, kind)) is False:
+                    call.cancel()
+                    return collect_result(output, errors, EXIT_CANCELLED, "Execution stopped by client")
+            raise Exception("Stream ended without an execution status")
             
         except grpc.RpcError as e:
             error_msg = f"Code execution RPC failed: {e.details()}"
@@ -65,8 +104,37 @@ class CodeExecutorClient:
             logger.error(error_msg)
             raise Exception(error_msg)
 
+    def create_session(self) -> str:
+        """Open an executor session whose variables persist between calls."""
+        self._get_channel() # make sure the connection is active
+        try:
+            return self.stub.CreateSession(Empty()).session_id
+        except grpc.RpcError as e:
+            error_msg = f"Create session RPC failed: {e.details()}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    def close_session(self, session_id: str):
+        """Close an executor session."""
+        self._get_channel() # make sure the connection is active
+        try:
+            self.stub.CloseSession(code_executor_pb2.SessionRequest(session_id=session_id))
+        except grpc.RpcError as e:
+            error_msg = f"Close session RPC failed: {e.details()}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    def fetch_artifact(self, artifact_id: str) -> bytes:
+        """Full output of an execution whose output was truncated, by the artifact_id of its CapturedOutput."""
+        self._get_channel() # make sure the connection is active
+        try:
+            call = self.stub.FetchArtifact(code_executor_pb2.ArtifactRequest(artifact_id=artifact_id))
+            return b"".join(chunk.data for chunk in call)
+        except grpc.RpcError as e:
+            error_msg = f"Fetch artifact RPC failed: {e.details()}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
 
-    
     def close(self):
         """Close the gRPC channel."""
         try:
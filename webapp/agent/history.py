@@ -0,0 +1,141 @@
+import os
+from typing import Callable, Dict, List, Optional
+
+from utils.logging import setup_logger
+from utils.tokens import count_tokens
+
+logger = setup_logger(__name__)
+
+# Rough size of the role and separators every chat message adds
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def truncate_middle(text: str, max_tokens: int, note: str = "",
+                    counter: Callable[[str], int] = count_tokens) -> str:
+    """Shorten ``text`` to about ``max_tokens`` by keeping its head and tail.
+
+    ``note`` is appended to the marker left in place of the cut.
+    """
+    tokens = counter(text)
+    if tokens <= max_tokens:
+        return text
+    # Characters per token of this very text, so the cut lands close to the budget
+    keep_chars = max_tokens * len(text) // tokens // 2
+    omitted = len(text) - 2 * keep_chars
+    # Slice the tail from the start, text[-0:] would be the whole text
+    return f"{text[:keep_chars]}\n[... {omitted} characters omitted{note} ...]\n{text[len(text) - keep_chars:]}"
+
+
+class HistoryCompactor:
+    """Builds the message list sent to the LLM from a session's full history.
+
+    The session keeps every message; only the view sent to the model is
+    compacted, so the prompt stays within ``max_tokens`` however many steps a
+    task takes:
+
+    - the system prompt and the question are always kept verbatim
+    - observations longer than ``max_observation_tokens`` keep their head and
+      tail, with a note of what was cut in between
+    - while the prompt is over budget, the oldest steps (all but the last
+      ``keep_recent_steps``) are collapsed into one-line digests, and if that
+      is not enough the oldest digests are dropped
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 12000,
+        max_observation_tokens: int = 1000,
+        keep_recent_steps: int = 2,
+        digest_chars: int = 200,
+        counter: Callable[[str], int] = count_tokens,
+    ):
+        self.max_tokens = max_tokens
+        self.max_observation_tokens = max_observation_tokens
+        self.keep_recent_steps = keep_recent_steps
+        self.digest_chars = digest_chars
+        self.count = counter
+
+    @classmethod
+    def from_env(cls) -> "HistoryCompactor":
+        return cls(
+            max_tokens=int(os.getenv("AGENT_HISTORY_MAX_TOKENS", "12000")),
+            max_observation_tokens=int(os.getenv("AGENT_OBSERVATION_MAX_TOKENS", "1000")),
+            keep_recent_steps=int(os.getenv("AGENT_HISTORY_KEEP_STEPS", "2")),
+        )
+
+    def compact(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """The messages to send, ``messages`` itself is not modified."""
+        head, steps = messages[:2], self._split_steps(messages[2:])
+        steps = [
+            [step[0]] + [self._truncate_observation(message, i + 1) for message in step[1:]]
+            for i, step in enumerate(steps)
+        ]
+
+        budget = self.max_tokens - self._tokens(head)
+        recent_from = max(0, len(steps) - self.keep_recent_steps)
+        digests: List[str] = []
+        collapsed = 0
+        while True:
+            compacted = self._with_digests(digests, collapsed - len(digests)) + [
+                message for step in steps[collapsed:] for message in step
+            ]
+            if self._tokens(compacted) <= budget:
+                break
+            if collapsed < recent_from:
+                digests.append(self._digest(steps[collapsed], collapsed + 1))
+                collapsed += 1
+            elif digests:
+                digests.pop(0)
+            else:
+                # Only the recent steps are left, nothing more to shrink
+                break
+
+        if collapsed:
+            logger.info(f"Compacted {collapsed} earlier steps, prompt is ~{self._tokens(head + compacted)} tokens")
+        return head + compacted
+
+    def _tokens(self, messages: List[Dict[str, str]]) -> int:
+        return sum(self.count(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+    @staticmethod
+    def _split_steps(messages: List[Dict[str, str]]) -> List[List[Dict[str, str]]]:
+        """Group messages into steps: an assistant message followed by its observations."""
+        steps: List[List[Dict[str, str]]] = []
+        for message in messages:
+            if message["role"] == "assistant" or not steps:
+                steps.append([message])
+            else:
+                steps[-1].append(message)
+        return steps
+
+    def _truncate_observation(self, message: Dict[str, str], step_number: int) -> Dict[str, str]:
+        if message["role"] == "assistant":
+            return message
+        content = truncate_middle(
+            message["content"],
+            self.max_observation_tokens,
+            # Points the model at where the full output still lives
+            note=f" from the output of step {step_number}; the variables holding it still exist, print a slice of them if you need more",
+            counter=self.count,
+        )
+        return message if content is message["content"] else {"role": message["role"], "content": content}
+
+    def _digest(self, step: List[Dict[str, str]], step_number: int) -> str:
+        thought = step[0]["content"]
+        if thought.startswith("Thought:"):
+            thought = thought[len("Thought:"):].split("\nCode:", 1)[0]
+        outcome = " ".join(message["content"] for message in step[1:]).strip()
+        return f"Step {step_number}: {self._shorten(thought)} -> {self._shorten(outcome) or '(no output)'}"
+
+    def _shorten(self, text: str) -> str:
+        text = " ".join(text.split())
+        return text if len(text) <= self.digest_chars else text[:self.digest_chars] + "..."
+
+    @staticmethod
+    def _with_digests(digests: List[str], dropped: int) -> List[Dict[str, str]]:
+        if not digests and not dropped:
+            return []
+        lines = ["Summary of earlier steps:"]
+        if dropped:
+            lines.append(f"({dropped} earliest steps omitted)")
+        return [{"role": "system", "content": "\n".join(lines + digests)}]
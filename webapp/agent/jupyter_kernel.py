@@ -1,123 +1,254 @@
-from typing import Dict, Optional
-import websocket
+from typing import Dict, List, Optional
+import websockets
 import json
 import httpx
 from utils.logging import setup_logger
-import time
+from utils.tracing import current_traceparent, span
+import asyncio
+import uuid
 
 logger = setup_logger(__name__)
 
-class JupyterKernelManager:
-    def __init__(self, kernel_gateway_host: str = "localhost:8888"):
+# Put on every waiting queue when the WebSocket drops
+_DISCONNECTED = object()
+# Seconds an interrupted cell gets to reply before its kernel is deemed stuck
+INTERRUPT_GRACE = 5
+
+def _build_execute_request(session_id: str, code: str) -> Dict:
+    """Build an execute_request message with a unique msg_id.
+
+    Inside a trace, the header carries its ``traceparent``; the kernel sees it
+    as the parent header of the execution.
+    """
+    header = {
+        "msg_id": uuid.uuid4().hex,
+        "msg_type": "execute_request",
+        "session": session_id,
+        "username": "",
+        "version": "5.3",
+    }
+    traceparent = current_traceparent()
+    if traceparent:
+        header["traceparent"] = traceparent
+    return {
+        "header": header,
+        "parent_header": {},
+        "metadata": {},
+        "channel": "shell",
+        "content": {
+            "code": code,
+            "silent": False,
+            "store_history": True,
+            "user_expressions": {},
+            "allow_stdin": False
+        }
+    }
+
+class _ReplyCollector:
+    """Accumulates the messages answering one execute_request.
+
+    Done once the shell reply arrived and iopub reports the kernel idle, which
+    guarantees every output of the request was received.
+    """
+
+    def __init__(self):
+        self.output: List[str] = []
+        # application/json payloads of display_data and execute_result messages
+        self.data: List = []
+        self.error: Optional[str] = None
+        self.replied = False
+        self.idle = False
+
+    @property
+    def done(self) -> bool:
+        return self.replied and self.idle
+
+    def feed(self, msg_data: Dict):
+        msg_type = msg_data["header"]["msg_type"]
+        content = msg_data.get("content", {})
+        if msg_type == "stream":
+            self.output.append(content["text"])
+        elif msg_type in ("execute_result", "display_data"):
+            data = content.get("data", {})
+            if "application/json" in data:
+                self.data.append(data["application/json"])
+            if "text/plain" in data:
+                self.output.append(data["text/plain"] + "\n")
+            else:
+                self.output.append(f"[{msg_type}: {', '.join(data)}]\n")
+        elif msg_type == "error":
+            self.error = f"{content['ename']}: {content['evalue']}"
+        elif msg_type == "execute_reply":
+            self.replied = True
+            if content.get("status") == "aborted":
+                # Queued behind a cell that failed or was interrupted
+                self.error = self.error or "Execution aborted by the kernel"
+        elif msg_type == "status" and content.get("execution_state") == "idle":
+            self.idle = True
+
+    def result(self) -> Dict:
+        logger.info(f'Code execution completed. Output: {len(self.output)} chunks, Error: {self.error}')
+        return {
+            "output": "".join(self.output),
+            "data": self.data,
+            "error": self.error,
+            "exit_code": 1 if self.error else 0
+        }
+
+class AsyncJupyterKernelManager:
+    """Runs code in one kernel of a Jupyter kernel gateway.
+
+    Uses httpx.AsyncClient for the gateway REST API and one long-lived
+    ``websockets`` connection per kernel, read by a task that routes replies to
+    the waiting execution by parent_header.msg_id. An execution that times out
+    or is cancelled interrupts the kernel; if the interrupt fails, ``healthy``
+    turns False and the kernel should not be reused.
+    """
+
+    def __init__(
+        self,
+        kernel_gateway_host: str = "localhost:8888",
+        execute_timeout: float = 120,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
         self.kernel_gateway_host = kernel_gateway_host
+        self.execute_timeout = execute_timeout
         self.kernel_id: Optional[str] = None
         self.ws_url: Optional[str] = None
 
-    def create_kernel(self):
+        self._owns_http_client = http_client is None
+        self._http = http_client or httpx.AsyncClient()
+        self.session_id = uuid.uuid4().hex
+        self._ws = None
+        self._reader: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, asyncio.Queue] = {}
+        self._connect_lock = asyncio.Lock()
+        self._interrupts: set = set()
+        self.healthy = True
+
+    async def create_kernel(self):
         """Create a new kernel and get its WebSocket URL."""
         url = f"http://{self.kernel_gateway_host}/api/kernels"
-        with httpx.Client() as client:
-            response = client.post(url)
-            response.raise_for_status()
-            kernel_info = response.json()
-            self.kernel_id = kernel_info["id"]
-            self.ws_url = f"ws://{self.kernel_gateway_host}/api/kernels/{self.kernel_id}/channels"
-            logger.info(f"Created new kernel with ID: {self.kernel_id}")
-            
-            return self.kernel_id
-
-    def execute_code(self, code: str) -> Dict:
+        response = await self._http.post(url)
+        response.raise_for_status()
+        kernel_info = response.json()
+        self.kernel_id = kernel_info["id"]
+        self.ws_url = f"ws://{self.kernel_gateway_host}/api/kernels/{self.kernel_id}/channels"
+        logger.info(f"Created new kernel with ID: {self.kernel_id}")
+
+        return self.kernel_id
+
+    async def _connect(self):
+        """Return the kernel's WebSocket, opening it and its reader task if needed."""
+        async with self._connect_lock:
+            if self._ws is None:
+                logger.info(f'Connecting to WebSocket: {self.ws_url}')
+                # Kernel outputs can be large, do not cap message size
+                self._ws = await websockets.connect(self.ws_url, max_size=None, open_timeout=30)
+                self._reader = asyncio.create_task(self._read_loop(self._ws))
+                logger.info('WebSocket connection established')
+            return self._ws
+
+    async def _read_loop(self, ws):
+        """Route every incoming message to the execution it answers."""
+        try:
+            async for msg in ws:
+                msg_data = json.loads(msg)
+                parent_id = msg_data.get("parent_header", {}).get("msg_id")
+                waiter = self._waiters.get(parent_id)
+                if waiter is not None:
+                    waiter.put_nowait(msg_data)
+        except Exception as e:
+            logger.info(f'WebSocket reader stopped: {str(e)}')
+        finally:
+            if self._ws is ws:
+                self._ws = None
+            for waiter in self._waiters.values():
+                waiter.put_nowait(_DISCONNECTED)
+
+    async def execute_code(self, code: str, timeout: Optional[float] = None) -> Dict:
         """Execute code in the kernel and return the result."""
         if not self.ws_url:
             raise RuntimeError("No active kernel. Call create_kernel() first.")
-        
+
         logger.info(f'Jupyter kernel executing code: {code}')
-        logger.info(f'Connecting to WebSocket: {self.ws_url}')
-        
+        with span("jupyter.execute", kind="CLIENT", kernel_id=self.kernel_id) as execute_span:
+            message = _build_execute_request(self.session_id, code)
+            msg_id = message["header"]["msg_id"]
+            self._waiters[msg_id] = asyncio.Queue()
+
+            collect = None
+            try:
+                ws = await self._connect()
+                await ws.send(json.dumps(message))
+                collect = asyncio.ensure_future(self._collect_reply(self._waiters[msg_id]))
+                result = await asyncio.wait_for(asyncio.shield(collect), timeout=timeout or self.execute_timeout)
+                execute_span.set_tag("exit_code", result["exit_code"])
+                return result
+            except asyncio.TimeoutError:
+                logger.error(f"Execution timed out in kernel {self.kernel_id}, interrupting it")
+                await self.interrupt()
+                try:
+                    # The kernel is free once the interrupted cell has replied
+                    await asyncio.wait_for(collect, timeout=INTERRUPT_GRACE)
+                except Exception:
+                    logger.error(f"Kernel {self.kernel_id} did not stop after the interrupt")
+                    self.healthy = False
+                raise
+            except asyncio.CancelledError:
+                # The cell keeps running in the kernel unless it is interrupted
+                task = asyncio.create_task(self.interrupt())
+                self._interrupts.add(task)
+                task.add_done_callback(self._interrupts.discard)
+                raise
+            except Exception as e:
+                logger.error(f"Error executing code: {str(e)}")
+                raise
+            finally:
+                if collect is not None:
+                    collect.cancel()
+                self._waiters.pop(msg_id, None)
+
+    async def interrupt(self):
+        """Interrupt the running cell through the gateway REST API, marking the kernel unhealthy on failure."""
+        url = f"http://{self.kernel_gateway_host}/api/kernels/{self.kernel_id}/interrupt"
         try:
-            # Create WebSocket connection
-            ws = websocket.create_connection(self.ws_url, timeout=30)
-            logger.info('WebSocket connection established')
-            
-            # Send code execution request
-            message = {
-                "header": {
-                    "msg_type": "execute_request",
-                    "msg_id": "1"
-                },
-                "parent_header": {},
-                "metadata": {},
-                "content": {
-                    "code": code,
-                    "silent": False,
-                    "store_history": True,
-                    "user_expressions": {},
-                    "allow_stdin": False
-                }
-            }
-            logger.info(f'Sending message: {json.dumps(message)}')
-            ws.send(json.dumps(message))
-            logger.info('Message sent successfully')
-
-            # Collect all messages until execution is complete
-            output = []
-            error = None
-            message_count = 0
-            while True:
-                logger.info(f'Waiting for message {message_count + 1}...')
-                msg = ws.recv()
-                message_count += 1
-                logger.info(f'Received message {message_count}: {msg[:100]}...')
-                
-                msg_data = json.loads(msg)
-                msg_type = msg_data["header"]["msg_type"]
-                logger.info(f'Message type: {msg_type}')
-
-                if msg_type == "stream":
-                    output.append(msg_data["content"]["text"])
-                elif msg_type == "error":
-                    error = f"{msg_data['content']['ename']}: {msg_data['content']['evalue']}"
-                elif msg_type == "execute_reply":
-                    logger.info('Received execute_reply, breaking')
-                    break
-
-            logger.info(f'Code execution completed. Output: {len(output)} lines, Error: {error}')
-            return {
-                "output": "\n".join(output) if output else "",
-                "error": error,
-                "exit_code": 1 if error else 0
-            }
+            response = await self._http.post(url)
+            response.raise_for_status()
+            logger.info(f"Interrupted kernel {self.kernel_id}")
         except Exception as e:
-            logger.error(f"Error executing code: {str(e)}")
-            raise
-        finally:
-            try:
-                ws.close()
-                logger.info('WebSocket connection closed')
-            except:
-                pass
+            logger.error(f"Error interrupting kernel {self.kernel_id}: {str(e)}")
+            self.healthy = False
+
+    async def _collect_reply(self, waiter: asyncio.Queue) -> Dict:
+        collector = _ReplyCollector()
+        while not collector.done:
+            msg_data = await waiter.get()
+            if msg_data is _DISCONNECTED:
+                raise ConnectionError("WebSocket to the kernel was closed during execution")
+            collector.feed(msg_data)
+        return collector.result()
 
-    def shutdown_kernel(self):
+    async def shutdown_kernel(self):
         """Shutdown the current kernel."""
-        if not self.kernel_id:
-            return
+        if self._ws is not None:
+            ws, self._ws = self._ws, None
+            await ws.close()
+            logger.info('WebSocket connection closed')
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
 
-        try:
-            url = f"http://{self.kernel_gateway_host}/api/kernels/{self.kernel_id}"
-            with httpx.Client() as client:
-                client.delete(url)
-            logger.info(f"Shutdown kernel with ID: {self.kernel_id}")
-            self.kernel_id = None
-            self.ws_url = None
-        except Exception as e:
-            logger.error(f"Error shutting down kernel: {str(e)}")
-            raise
-
-def get_kernel():
-    """Synchronous dependency for FastAPI to manage kernel lifecycle."""
-    kernel_manager = JupyterKernelManager()
-    kernel_manager.create_kernel()
-    try:
-        yield kernel_manager
-    finally:
-        kernel_manager.shutdown_kernel()
+        if self.kernel_id:
+            try:
+                url = f"http://{self.kernel_gateway_host}/api/kernels/{self.kernel_id}"
+                await self._http.delete(url)
+                logger.info(f"Shutdown kernel with ID: {self.kernel_id}")
+                self.kernel_id = None
+                self.ws_url = None
+            except Exception as e:
+                logger.error(f"Error shutting down kernel: {str(e)}")
+                raise
+
+        if self._owns_http_client:
+            await self._http.aclose()
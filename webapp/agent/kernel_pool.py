@@ -0,0 +1,281 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+import httpx
+
+from utils.logging import setup_logger
+from .jupyter_kernel import AsyncJupyterKernelManager
+
+logger = setup_logger(__name__)
+
+# Loads the tools into the kernel's namespace, see service/jupyter_kernel/kernel_init.py
+WARMUP_CODE = """
+import sys
+sys.path.append('/home/jupyter')
+from kernel_init import *
+"""
+
+# Clears everything a request defined and loads the tools again
+RESET_CODE = """%reset -f
+from kernel_init import *
+"""
+
+# Sent back as an application/json display, structured data instead of printed text.
+# Leaves no names behind, so an idle kernel stays clean without a reset
+TOOLS_CODE = """
+from IPython.display import display
+from tools import tool_registry
+display({"application/json": tool_registry.get_catalog()}, raw=True)
+del display, tool_registry
+"""
+
+
+class _PooledKernel:
+    def __init__(self, manager: AsyncJupyterKernelManager):
+        self.manager = manager
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+
+class KernelPool:
+    """Keeps Jupyter kernels warm, with the tools loaded, and leases them to requests.
+
+    Kernels are reset after every lease and replaced after ``max_uses`` leases.
+    A background task keeps at least ``min_size`` kernels ready and shuts down
+    idle kernels above that once they have been unused for ``idle_timeout``
+    seconds. At most ``max_size`` kernels exist at any time.
+    """
+
+    def __init__(
+        self,
+        kernel_gateway_host: str = "localhost:8888",
+        min_size: int = 2,
+        max_size: int = 8,
+        max_uses: int = 20,
+        idle_timeout: float = 300,
+        maintenance_interval: float = 10,
+    ):
+        assert 0 <= min_size <= max_size and max_size > 0, "Invalid kernel pool size"
+        self.kernel_gateway_host = kernel_gateway_host
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.maintenance_interval = maintenance_interval
+
+        self._idle: Deque[_PooledKernel] = deque()
+        # Kernels that exist or are being started, leased ones included
+        self._size = 0
+        self._cond = asyncio.Condition()
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._background: set = set()
+        self._closed = False
+        # Shared by every kernel's REST calls to the gateway
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def start(self):
+        """Start warming kernels in the background. Safe to call more than once."""
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintain())
+
+    def _http_client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient()
+        return self._http
+
+    async def ping(self):
+        """Raise unless the kernel gateway answers."""
+        response = await self._http_client().get(f"http://{self.kernel_gateway_host}/api")
+        response.raise_for_status()
+
+    async def _start_kernel(self) -> _PooledKernel:
+        manager = AsyncJupyterKernelManager(self.kernel_gateway_host, http_client=self._http_client())
+        await manager.create_kernel()
+        try:
+            result = await manager.execute_code(WARMUP_CODE)
+            if result["error"]:
+                raise RuntimeError(f"Failed to load tools in kernel: {result['error']}")
+        except BaseException:
+            await manager.shutdown_kernel()
+            raise
+        return _PooledKernel(manager)
+
+    async def _shutdown_kernel(self, kernel: _PooledKernel):
+        try:
+            await kernel.manager.shutdown_kernel()
+        except Exception as e:
+            logger.error(f"Error shutting down pooled kernel: {str(e)}")
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[AsyncJupyterKernelManager]:
+        """Borrow a warm kernel for the duration of the ``async with`` block."""
+        self.start()
+        async with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                await self._cond.wait()
+            if self._idle:
+                kernel = self._idle.pop()
+            else:
+                kernel = None
+                self._size += 1
+
+        if kernel is None:
+            # Pool is cold or exhausted, pay kernel boot time this once
+            try:
+                kernel = await self._start_kernel()
+            except BaseException:
+                async with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        try:
+            yield kernel.manager
+        finally:
+            # Reset off the request path
+            self._spawn(self._give_back(kernel))
+
+    @asynccontextmanager
+    async def _borrow_idle(self, timeout: float) -> AsyncIterator[AsyncJupyterKernelManager]:
+        """Borrow an idle kernel for a read-only probe, waiting up to ``timeout`` seconds for one.
+
+        Unlike lease(), this never starts a kernel, and the kernel is neither
+        reset nor counted toward ``max_uses``. It keeps its place and idle time,
+        so probes do not wear out the pool.
+        """
+        self.start()
+        async with self._cond:
+            try:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self._idle or self._closed), timeout)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"No idle kernel within {timeout} seconds") from None
+            if self._closed:
+                raise RuntimeError("Kernel pool is closed")
+            # The least recently used kernel, the one leases reach last
+            kernel = self._idle.popleft()
+        try:
+            yield kernel.manager
+        finally:
+            if self._closed or not kernel.manager.healthy:
+                await self._shutdown_kernel(kernel)
+                async with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+            else:
+                async with self._cond:
+                    self._idle.appendleft(kernel)
+                    self._cond.notify()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _give_back(self, kernel: _PooledKernel):
+        kernel.uses += 1
+        if not self._closed and kernel.uses < self.max_uses and kernel.manager.healthy:
+            try:
+                result = await kernel.manager.execute_code(RESET_CODE)
+                reusable = not result["error"]
+            except Exception as e:
+                logger.error(f"Error resetting pooled kernel: {str(e)}")
+                reusable = False
+        else:
+            reusable = False
+
+        if reusable:
+            kernel.last_used = time.monotonic()
+            async with self._cond:
+                self._idle.append(kernel)
+                self._cond.notify()
+            return
+
+        await self._shutdown_kernel(kernel)
+        async with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    async def _maintain(self):
+        while not self._closed:
+            try:
+                await self._cull_idle()
+                await self._replenish()
+            except Exception as e:
+                logger.error(f"Kernel pool maintenance failed: {str(e)}")
+            await asyncio.sleep(self.maintenance_interval)
+
+    async def _cull_idle(self):
+        now = time.monotonic()
+        culled = []
+        async with self._cond:
+            # Least recently used kernels sit at the left end
+            while (
+                self._size > self.min_size
+                and self._idle
+                and now - self._idle[0].last_used > self.idle_timeout
+            ):
+                culled.append(self._idle.popleft())
+                self._size -= 1
+        for kernel in culled:
+            await self._shutdown_kernel(kernel)
+        if culled:
+            logger.info(f"Culled {len(culled)} idle kernels")
+
+    async def _replenish(self):
+        while True:
+            async with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                kernel = await self._start_kernel()
+            except Exception:
+                async with self._cond:
+                    self._size -= 1
+                raise
+            async with self._cond:
+                self._idle.append(kernel)
+                self._cond.notify()
+            logger.info(f"Warmed kernel {kernel.manager.kernel_id}, pool size {self._size}")
+
+    async def get_tool_catalog(
+        self, kernel_manager: Optional[AsyncJupyterKernelManager] = None, timeout: float = 30
+    ) -> Tuple[str, Dict[str, Dict]]:
+        """Version and tools of the kernels, see ToolCatalog.
+
+        Pass the kernel a caller already holds to avoid leasing a second one.
+        Otherwise the tools are read from an idle kernel without leasing it,
+        waiting up to ``timeout`` seconds for one while the pool warms up.
+        """
+        if kernel_manager is None:
+            async with self._borrow_idle(timeout) as kernel_manager:
+                result = await kernel_manager.execute_code(TOOLS_CODE)
+        else:
+            result = await kernel_manager.execute_code(TOOLS_CODE)
+        if result["error"]:
+            raise Exception(f"Failed to get tools: {result['error']}")
+        if not result["data"]:
+            raise Exception("Kernel did not return a tool catalog")
+        catalog = result["data"][-1]
+        return catalog["version"], catalog["tools"]
+
+    async def close(self):
+        """Stop maintenance and shut down every idle kernel; leased ones go when returned."""
+        self._closed = True
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+        async with self._cond:
+            kernels = list(self._idle)
+            self._idle.clear()
+            self._size -= len(kernels)
+        for kernel in kernels:
+            await self._shutdown_kernel(kernel)
+        # Leased kernels still being returned need the client for their DELETE
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -1,7 +1,10 @@
 import os
 
-from typing import List, Dict, Optional
-from llm.openrouter import OpenRouter
+from typing import AsyncIterator, List, Dict, Optional
+from llm.registry import llm_registry
+from agent.history import count_tokens, truncate_middle
+from utils.metrics import SUMMARY_SECONDS, timed
+from utils.tracing import span
 
 """
 TODO
@@ -16,27 +19,99 @@ user question -> manager to make a execution plan for code agent -> code agent e
 """
 
 class ManagerAgent:
-    def __init__(self, system_prompt_yaml='utils/manager_prompt.txt'):
+    """Summarizes a code agent's solution for the user.
+
+    Every call is independent: the agent keeps no history between requests, so
+    pooled instances can be reused indefinitely.
+    """
+
+    def __init__(
+        self,
+        system_prompt_yaml='utils/manager_prompt.txt',
+        max_trace_tokens: Optional[int] = None,
+        max_observation_tokens: Optional[int] = None
+    ):
         self.system_prompt_yaml = system_prompt_yaml
         assert os.path.isfile(self.system_prompt_yaml), f'Manager agent system prompt file {self.system_prompt_yaml} does not exist'
         with open(self.system_prompt_yaml) as f:
             self.system_prompt = f.read()
+        self.max_trace_tokens = max_trace_tokens or int(os.getenv("MANAGER_TRACE_MAX_TOKENS", "4000"))
+        self.max_observation_tokens = max_observation_tokens or int(os.getenv("MANAGER_OBSERVATION_MAX_TOKENS", "500"))
         
-        self.llm = OpenRouter(api_key=os.getenv("API_KEY"))
+        # Shared with every other agent, closed on app shutdown
+        self.llm = llm_registry.get(api_key=os.getenv("API_KEY"))
+
+    def _build_trace(self, context: List[Dict[str, str]]) -> str:
+        """Compact trace of a code agent's messages: the question, the thoughts and
+        successful observations of each step, and the final answer.
+
+        Code and failed steps are left out, the summary prompt ignores them anyway.
+        Long observations are truncated and, if the trace is still over budget,
+        the earliest steps are dropped.
+        """
+        question = next((m["content"] for m in context if m["role"] == "user"), "")
+        final_answer = None
+        steps: List[str] = []
+        thought: Optional[str] = None
+        for message in context:
+            content = message["content"]
+            if message["role"] == "assistant":
+                thought = content.split("\nCode:", 1)[0].replace("Thought:", "", 1).strip()
+                continue
+            if message["role"] != "system" or thought is None:
+                # The code agent's system prompt and the question
+                continue
+            if content.startswith("Final Answer:"):
+                final_answer = content[len("Final Answer:"):].strip()
+                steps.append(f"Thought: {thought}")
+                continue
+            observation = content.replace("Observation:", "", 1).strip()
+            if not observation or observation.startswith("Error:"):
+                continue
+            observation = truncate_middle(observation, self.max_observation_tokens)
+            steps.append(f"Thought: {thought}\nObservation: {observation}")
 
-        self.messages = []
-        self.messages.append(
-            {'role': 'system', 'content': self.system_prompt}
-        )            
+        head = f"Question: {question}"
+        tail = f"Final answer: {final_answer}" if final_answer is not None else "Final answer: none was given"
+        budget = self.max_trace_tokens - count_tokens(head) - count_tokens(tail)
+        dropped = 0
+        while steps and sum(count_tokens(step) for step in steps) > budget:
+            steps.pop(0)
+            dropped += 1
+        if dropped:
+            steps.insert(0, f"({dropped} earlier steps omitted)")
+        return "\n\n".join([head, *steps, tail])
+
+    def _build_messages(self, context: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        return [
+            {'role': 'system', 'content': self.system_prompt},
+            {'role': 'assistant', 'content': self._build_trace(context)},
+        ]
 
     async def summary(self, context: List[Dict[str, str]]) -> str:
-        self.messages.append(
-            {'role': 'assistant', 'content': str(context)}
-        )
-        response = await self.llm.chat_completion(
-            messages=self.messages,
-            model="deepseek/deepseek-r1-0528-qwen3-8b:free",
-            temperature=0.7,
-            top_p=0.95,
-        )
+        with span("manager.summary", stream=False), timed(SUMMARY_SECONDS, stream="false"):
+            response = await self.llm.chat_completion(
+                messages=self._build_messages(context),
+                model="deepseek/deepseek-r1-0528-qwen3-8b:free",
+                temperature=0.7,
+                top_p=0.95,
+            )
         return response
+
+    async def summary_stream(self, context: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Same as summary(), yielding the summary token by token as it is generated."""
+        # Not activated, the generator's context is its consumer's
+        with span("manager.summary", activate=False, stream=True), timed(SUMMARY_SECONDS, stream="true"):
+            tokens = await self.llm.chat_completion(
+                messages=self._build_messages(context),
+                model="deepseek/deepseek-r1-0528-qwen3-8b:free",
+                temperature=0.7,
+                top_p=0.95,
+                stream=True,
+            )
+            async for token in tokens:
+                yield token
+
+    async def close(self):
+        """Release the LLM client, a no-op for the shared one."""
+        await self.llm.close()
@@ -0,0 +1,101 @@
+import asyncio
+import inspect
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# Receives (event, data) for every step an agent takes, e.g. ("thought", "...")
+EventCallback = Callable[[str, str], None]
+
+
+class AgentSession:
+    """Conversation state for a single question.
+
+    Agents are shared and reused across requests, so anything that belongs to
+    one request (the message history above all) lives here instead of on the
+    agent instance.
+    """
+
+    def __init__(self, session_id: Optional[str] = None, on_event: Optional[EventCallback] = None):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.messages: List[Dict[str, str]] = []
+        # Code executor session holding the variables defined by earlier steps
+        self.executor_session_id: Optional[str] = None
+        # Optional listener for progress events, used to stream steps to the client
+        self.on_event = on_event
+
+    def add_message(self, role: str, content: str):
+        """Append a message to this session's history."""
+        self.messages.append({"role": role, "content": content})
+
+    def emit(self, event: str, data: str):
+        """Report a step to the session's listener, if any."""
+        if self.on_event is not None:
+            self.on_event(event, data)
+
+
+class AgentPool:
+    """A bounded pool of reusable agent objects.
+
+    Agents are created lazily by ``factory`` (sync or async) up to ``size``
+    instances and handed out exclusively through ``lease()``. Once all agents
+    are leased, further callers wait until one is returned.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = 8):
+        assert size > 0, "Agent pool needs at least 1 slot!"
+        self.factory = factory
+        self.size = size
+        self._idle: List[Any] = []
+        self._agents: List[Any] = []
+        self._semaphore = asyncio.Semaphore(size)
+        self._lock = asyncio.Lock()
+
+    async def _create(self) -> Any:
+        agent = self.factory()
+        if inspect.isawaitable(agent):
+            agent = await agent
+        self._agents.append(agent)
+        logger.info(f"Created {type(agent).__name__} {len(self._agents)}/{self.size} in pool")
+        return agent
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[Any]:
+        """Borrow an agent for the duration of the ``async with`` block."""
+        await self._semaphore.acquire()
+        try:
+            async with self._lock:
+                agent = self._idle.pop() if self._idle else await self._create()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        try:
+            yield agent
+        finally:
+            self._idle.append(agent)
+            self._semaphore.release()
+
+    @property
+    def in_use(self) -> int:
+        """Number of agents currently leased out."""
+        return len(self._agents) - len(self._idle)
+
+    async def close(self):
+        """Close every agent created by the pool."""
+        for agent in self._agents:
+            close = getattr(agent, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Error closing pooled agent: {str(e)}")
+        self._agents = []
+        self._idle = []
@@ -0,0 +1,137 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from llm.openrouter import OpenRouter
+from utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# The model has finished its step once it starts writing the result of its own code.
+# JSON strings cannot hold a raw newline, so this never cuts inside the JSON object.
+STOP_SEQUENCES = ["\nObservation:"]
+
+CLOSED_FENCE_REGEX = re.compile(r"Code:\s*```(?:py|python)?\s*\n.*?\n```", re.DOTALL)
+
+
+def code_section(response: str, code_start: int) -> str:
+    """The ``Code:`` section of a text step starting at ``code_start``, without the ``Code:`` label.
+
+    Cut at the end of its closed code fence, so whatever the model wrote after
+    it (an invented Observation, further steps) is dropped while the code
+    itself is kept whole. Without a closed fence, the rest of the response is
+    the code; the stop sequences already ended the generation there.
+    """
+    match = CLOSED_FENCE_REGEX.match(response, code_start)
+    end = match.end() if match else len(response)
+    return response[code_start + len("Code:"):end].strip()
+
+
+class StepParser:
+    """Incrementally detects when a streamed completion holds one complete agent step.
+
+    A step is complete once either a JSON object with "thought" and "code" keys or a
+    ``Code:`` section with a closed code fence has arrived. Anything the model writes
+    after that (an invented Observation, further steps) is not needed and would
+    only cost tokens, so the caller can stop the stream as soon as ``feed()``
+    returns True.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        # JSON scanner state, kept across feed() calls
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.step: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.step is not None
+
+    @property
+    def text(self) -> str:
+        """The complete step if one was found, otherwise everything received so far."""
+        return self.step if self.step is not None else self._buffer
+
+    def feed(self, delta: str) -> bool:
+        """Add a chunk of the completion, returning True once a complete step arrived."""
+        if self.complete:
+            return True
+        self._buffer += delta
+        self._scan_json()
+        if not self.complete:
+            self._scan_fence()
+        return self.complete
+
+    def _scan_json(self):
+        text = self._buffer
+        while self._pos < len(text):
+            char = text[self._pos]
+            self._pos += 1
+            if self._start is None:
+                if char == "{":
+                    self._start, self._depth = self._pos - 1, 1
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = text[self._start:self._pos]
+                    self._start = None
+                    if self._is_step(candidate):
+                        self.step = candidate
+                        return
+
+    @staticmethod
+    def _is_step(candidate: str) -> bool:
+        try:
+            obj: Any = json.loads(candidate)
+        except json.JSONDecodeError:
+            return False
+        return isinstance(obj, dict) and "thought" in obj and "code" in obj
+
+    def _scan_fence(self):
+        if "Thought:" not in self._buffer:
+            return
+        match = CLOSED_FENCE_REGEX.search(self._buffer)
+        if match:
+            self.step = self._buffer[:match.end()]
+
+
+async def generate_step(llm: OpenRouter, messages: List[Dict[str, str]], **kwargs) -> str:
+    """Stream one agent step from the LLM and stop generating as soon as it is complete.
+
+    Extra keyword arguments are passed to ``llm.chat_completion``.
+    """
+    tokens = await llm.chat_completion(
+        messages=messages,
+        stop=STOP_SEQUENCES,
+        stream=True,
+        **kwargs
+    )
+    parser = StepParser()
+    try:
+        async for delta in tokens:
+            if parser.feed(delta):
+                break
+    finally:
+        # Closing the stream drops the HTTP response, which ends the generation upstream
+        await tokens.aclose()
+    if parser.complete:
+        logger.info(f"Step complete after {len(parser.text)} characters, stopped the generation")
+        # The stream was cut, so it was not cached on its own
+        llm.cache_completion(parser.text, messages=messages, stop=STOP_SEQUENCES, **kwargs)
+    return parser.text
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import json
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# Tool name -> {"name", "description", "output_type", "inputs": {param: {"type", ...}}},
+# the format of tool_registry.get_tools() on the executor and in the kernels
+Tools = Dict[str, Dict]
+# Returns the version of the tools and the tools
+CatalogFetcher = Callable[[], Awaitable[Tuple[str, Tools]]]
+
+
+def catalog_version(tools: Tools) -> str:
+    """Local version of tools that came without one, from executors that do not report it.
+
+    Only tells apart catalogs this webapp fetched: the tools were rebuilt from
+    the protobuf response, so the hash need not match the executor's
+    tool_registry.catalog_version().
+    """
+    blob = json.dumps(tools, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def render_tools(tools: Tools) -> str:
+    """Render the tools as Python signatures with docstrings, as the system prompt lists them."""
+    tools_str = []
+    for tool_name, tool_info in tools.items():
+        # Function signature
+        params = [f"{name}: {info['type']}" for name, info in tool_info['inputs'].items()]
+        signature = f"def {tool_name}({', '.join(params)}) -> {tool_info['output_type']}"
+
+        # Docstring
+        docstring = [
+            f'    """\n{tool_info["description"]}',
+            '    """'
+        ]
+
+        tools_str.append(f"{signature}:\n" + "\n".join(docstring))
+
+    return "\n\n".join(tools_str)
+
+
+class ToolCatalog:
+    """The tools of one execution backend and the system prompt rendered from them.
+
+    The prompt is rendered once per catalog version and shared by every agent
+    using the backend. ``start()`` polls the backend every ``refresh_interval``
+    seconds in the background and re-renders the prompt only when the version
+    changed, so tools deployed to the executor or kernels reach new requests
+    without a restart and requests never wait on the tool list once it is loaded.
+    """
+
+    def __init__(
+        self,
+        fetch: CatalogFetcher,
+        system_prompt_yaml: str = 'utils/prompt.txt',
+        refresh_interval: float = 60,
+        name: str = "tools",
+    ):
+        self.fetch = fetch
+        self.system_prompt_yaml = system_prompt_yaml
+        self.refresh_interval = refresh_interval
+        self.name = name
+
+        self.version: Optional[str] = None
+        self.tools: Tools = {}
+        self.system_prompt: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _render(self, tools: Tools) -> str:
+        try:
+            # Read the prompt template
+            with open(self.system_prompt_yaml, 'r') as f:
+                prompt_template = f.read()
+
+            # Format the prompt
+            return prompt_template.format(
+                tools=render_tools(tools),
+                authorized_imports='any import is allowed'  # or your list of authorized imports
+            )
+
+        except Exception as e:
+            raise Exception(f"Error loading code agent system prompt: {str(e)}")
+
+    async def refresh(self, fetch: Optional[CatalogFetcher] = None) -> bool:
+        """Fetch the tools and re-render the prompt if their version changed.
+
+        ``fetch`` replaces the catalog's own fetcher for this call, e.g. to read
+        the tools from a kernel the caller already holds. Returns whether the
+        prompt changed.
+        """
+        async with self._lock:
+            version, tools = await (fetch or self.fetch)()
+            if version == self.version:
+                return False
+            self.system_prompt = self._render(tools)
+            self.tools = tools
+            previous, self.version = self.version, version
+        if previous is None:
+            logger.info(f"Loaded {self.name} catalog version {version} with {len(tools)} tools")
+        else:
+            logger.info(f"{self.name} catalog changed from version {previous} to {version}, prompt re-rendered")
+        return True
+
+    async def get_system_prompt(self) -> str:
+        """The rendered prompt, fetched on first use and cached afterwards."""
+        if self.system_prompt is None:
+            await self.refresh()
+        return self.system_prompt
+
+    def start(self):
+        """Start refreshing in the background. Safe to call more than once."""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the last version, the backend may just be restarting
+                logger.warning(f"Failed to refresh {self.name} catalog: {str(e)}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
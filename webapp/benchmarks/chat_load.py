@@ -0,0 +1,351 @@
+"""Offline load test of /chat: the webapp against a mock LLM and a local code executor.
+
+Starts the three as subprocesses, drives ``--endpoint`` with ``--concurrency``
+closed-loop clients, and reports end-to-end latency percentiles, throughput,
+and a per-stage breakdown from the /metrics of the webapp and the executor.
+
+    cd webapp
+    python -m benchmarks.chat_load --requests 200 --concurrency 16 --llm-latency 0.3 --token-rate 100
+
+Each stage is reported as its count per request and the mean, p50 and p95 over
+the run. Percentiles are estimated from the histogram buckets, like
+Prometheus' histogram_quantile(), so they are only as precise as the buckets.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+WEBAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (label in the report, metric, process), metrics of both processes are histograms
+STAGES = [
+    ("http request", "http_request_seconds", "webapp"),
+    ("llm completion", "llm_chat_completion_seconds", "webapp"),
+    ("parse response", "agent_parse_llm_response_seconds", "webapp"),
+    ("execute code (agent)", "agent_execute_code_seconds", "webapp"),
+    ("execute code (executor)", "executor_rpc_seconds", "executor"),
+    ("manager summary", "manager_summary_seconds", "webapp"),
+]
+COUNTERS = [
+    ("prompt tokens", "llm_prompt_tokens_total", "webapp"),
+    ("completion tokens", "llm_completion_tokens_total", "webapp"),
+    ("parse failures", "agent_parse_failures_total", "webapp"),
+]
+
+# {metric name: {(labels, le): value}}, le is None for everything but buckets
+Samples = Dict[str, Dict[Tuple[Tuple[Tuple[str, str], ...], Optional[str]], float]]
+
+
+def parse_metrics(text: str) -> Samples:
+    """Samples of a Prometheus text exposition."""
+    samples: Samples = defaultdict(dict)
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name_and_labels, value = line.rsplit(" ", 1)
+        name, _, labels = name_and_labels.partition("{")
+        pairs = []
+        for pair in filter(None, labels.rstrip("}").split(",")):
+            key, _, label_value = pair.partition("=")
+            pairs.append((key, label_value.strip('"')))
+        le = dict(pairs).pop("le", None)
+        pairs = tuple(sorted((key, label_value) for key, label_value in pairs if key != "le"))
+        samples[name][(pairs, le)] = float(value)
+    return samples
+
+
+def delta(before: Samples, after: Samples, name: str) -> Dict[Optional[str], float]:
+    """Increase of ``name`` during the run, summed over labels and keyed by ``le``."""
+    total: Dict[Optional[str], float] = defaultdict(float)
+    for key, value in after.get(name, {}).items():
+        total[key[1]] += value - before.get(name, {}).get(key, 0.0)
+    return total
+
+
+def bucket_quantile(q: float, buckets: Dict[Optional[str], float]) -> Optional[float]:
+    """Quantile ``q`` from cumulative buckets, interpolating linearly inside a bucket."""
+    bounds = sorted((float(le), count) for le, count in buckets.items() if le is not None)
+    if not bounds or bounds[-1][1] <= 0:
+        return None
+    rank = q * bounds[-1][1]
+    lower, lower_count = 0.0, 0.0
+    for upper, count in bounds:
+        if count >= rank:
+            if math.isinf(upper):
+                # Above the largest finite bucket, the best estimate is its bound
+                return lower
+            if count == lower_count:
+                return upper
+            return lower + (upper - lower) * (rank - lower_count) / (count - lower_count)
+        lower, lower_count = upper, count
+    return lower
+
+
+def stage_report(before: Dict[str, Samples], after: Dict[str, Samples], requests: int) -> List[Dict]:
+    report = []
+    for label, name, process in STAGES:
+        count = delta(before[process], after[process], f"{name}_count")[None]
+        if count <= 0:
+            continue
+        total = delta(before[process], after[process], f"{name}_sum")[None]
+        buckets = delta(before[process], after[process], f"{name}_bucket")
+        report.append({
+            "stage": label,
+            "metric": name,
+            "per_request": count / requests,
+            "mean": total / count,
+            "p50": bucket_quantile(0.50, buckets),
+            "p95": bucket_quantile(0.95, buckets),
+            "total_seconds": total,
+        })
+    return report
+
+
+def counter_report(before: Dict[str, Samples], after: Dict[str, Samples], requests: int) -> Dict[str, float]:
+    return {
+        label: delta(before[process], after[process], name)[None] / requests
+        for label, name, process in COUNTERS
+    }
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "mean": sum(values) / len(values) if values else None,
+        "max": max(values) if values else None,
+    }
+
+
+async def one_request(client: httpx.AsyncClient, endpoint: str, message: str) -> Tuple[float, Optional[float]]:
+    """(latency, time to first byte) of one request, raises on an error response."""
+    start = time.perf_counter()
+    if endpoint != "/chat/stream":
+        response = await client.post(endpoint, json={"message": message})
+        response.raise_for_status()
+        return time.perf_counter() - start, None
+    first_byte = None
+    async with client.stream("POST", endpoint, json={"message": message}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            if line.startswith("event: error"):
+                raise RuntimeError("error event in the stream")
+    return time.perf_counter() - start, first_byte
+
+
+async def run_load(base_url: str, endpoint: str, requests: int, concurrency: int, warmup: int, timeout: float) -> Dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        for i in range(warmup):
+            await one_request(client, endpoint, f"warmup {i}: what is the sum of squares?")
+
+        latencies: List[float] = []
+        first_bytes: List[float] = []
+        errors: Dict[str, int] = defaultdict(int)
+        next_index = 0
+
+        async def worker():
+            nonlocal next_index
+            while next_index < requests:
+                index = next_index
+                next_index += 1
+                # A distinct message per request, so no layer can serve it from a cache
+                try:
+                    latency, first_byte = await one_request(client, endpoint, f"request {index}: what is the sum of squares?")
+                except Exception as e:
+                    errors[type(e).__name__] += 1
+                    continue
+                latencies.append(latency)
+                if first_byte is not None:
+                    first_bytes.append(first_byte)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "elapsed_seconds": elapsed,
+        "completed": len(latencies),
+        "errors": dict(errors),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": summarize(latencies),
+        "time_to_first_byte": summarize(first_bytes) if first_bytes else None,
+    }
+
+
+class Stack:
+    """The mock LLM, the code executor and the webapp, as subprocesses logging to ``log_dir``."""
+
+    def __init__(self, args, log_dir: str):
+        self.args = args
+        self.log_dir = log_dir
+        self.processes: List[subprocess.Popen] = []
+        self.webapp_url = f"http://127.0.0.1:{args.webapp_port}"
+        self.executor_metrics_url = f"http://127.0.0.1:{args.executor_metrics_port}/metrics"
+
+    def _spawn(self, name: str, command: List[str], env: Dict[str, str]):
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "wb")
+        process = subprocess.Popen(
+            command, cwd=WEBAPP_DIR, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT
+        )
+        self.processes.append(process)
+
+    def start(self):
+        args = self.args
+        self._spawn("mock_llm", [
+            sys.executable, "-m", "benchmarks.mock_llm",
+            "--port", str(args.llm_port),
+            "--latency", str(args.llm_latency),
+            "--token-rate", str(args.token_rate),
+            "--steps", str(args.steps),
+            "--work", str(args.work),
+        ], {})
+        self._spawn("executor", [sys.executable, "-m", "benchmarks.local_executor"], {
+            "EXECUTOR_PORT": str(args.executor_port),
+            "EXECUTOR_METRICS_PORT": str(args.executor_metrics_port),
+            "TOOL_SEARCH_BACKEND": os.getenv("TOOL_SEARCH_BACKEND", "local"),
+        })
+        pool_size = str(max(32, args.concurrency))
+        self._spawn("webapp", [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(args.webapp_port), "--log-level", "warning",
+        ], {
+            "LLM_BASE_URL": f"http://127.0.0.1:{args.llm_port}",
+            "API_KEY": "bench",
+            "CODE_EXECUTOR_HOST": "127.0.0.1",
+            "CODE_EXECUTOR_PORT": str(args.executor_port),
+            "CODE_AGENT_POOL_SIZE": pool_size,
+            "MANAGER_AGENT_POOL_SIZE": pool_size,
+            "LLM_MAX_CONNECTIONS": pool_size,
+            "LLM_MAX_KEEPALIVE_CONNECTIONS": pool_size,
+            "LLM_CACHE_SIZE": os.getenv("LLM_CACHE_SIZE", "0"),
+            "JUPYTER_KERNEL_POOL_MIN": "0",
+            "HEALTH_CHECK_INTERVAL": "1",
+        })
+
+    def wait_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for process in self.processes:
+                if process.poll() is not None:
+                    raise RuntimeError(f"{process.args} exited with {process.returncode}, see the logs in {self.log_dir}")
+            try:
+                if httpx.get(f"{self.webapp_url}/readyz", timeout=2).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        raise TimeoutError(f"The webapp was not ready after {timeout}s, see the logs in {self.log_dir}")
+
+    def scrape(self) -> Dict[str, Samples]:
+        return {
+            "webapp": parse_metrics(httpx.get(f"{self.webapp_url}/metrics", timeout=10).text),
+            "executor": parse_metrics(httpx.get(self.executor_metrics_url, timeout=10).text),
+        }
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in reversed(self.processes):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def format_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}ms"
+
+
+def print_report(result: Dict):
+    load = result["load"]
+    print(f"\n{result['config']['endpoint']}: {load['completed']} requests in {load['elapsed_seconds']:.2f}s "
+          f"at concurrency {result['config']['concurrency']}, {load['rps']:.2f} req/s, errors: {load['errors'] or 0}")
+    rows = [("latency", load["latency"])]
+    if load["time_to_first_byte"]:
+        rows.append(("first byte", load["time_to_first_byte"]))
+    print(f"\n{'':24}{'p50':>11}{'p95':>11}{'p99':>11}{'mean':>11}{'max':>11}")
+    for label, stats in rows:
+        print(f"{label:24}" + "".join(f"{format_seconds(stats[key]):>11}" for key in ("p50", "p95", "p99", "mean", "max")))
+
+    print(f"\n{'stage':24}{'per req':>9}{'mean':>11}{'p50':>11}{'p95':>11}{'total':>11}")
+    for stage in result["stages"]:
+        print(f"{stage['stage']:24}{stage['per_request']:>9.2f}{format_seconds(stage['mean']):>11}"
+              f"{format_seconds(stage['p50']):>11}{format_seconds(stage['p95']):>11}{stage['total_seconds']:>10.2f}s")
+    print()
+    for label, value in result["counters"].items():
+        print(f"{label + ' per request':32}{value:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", default="/chat", choices=["/chat", "/chat/stream"])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2, help="sequential requests before the measured run")
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per request, seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="mock LLM seconds to the first token")
+    parser.add_argument("--token-rate", type=float, default=100, help="mock LLM tokens per second")
+    parser.add_argument("--steps", type=int, default=2, help="agent steps per task")
+    parser.add_argument("--work", type=int, default=10000, help="size of the loop each step runs in the executor")
+    parser.add_argument("--webapp-port", type=int, default=8765)
+    parser.add_argument("--llm-port", type=int, default=8766)
+    parser.add_argument("--executor-port", type=int, default=50061)
+    parser.add_argument("--executor-metrics-port", type=int, default=9101)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--log-dir", help="where the processes log, a temporary directory by default")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    log_dir = args.log_dir or tempfile.mkdtemp(prefix="chat_load_")
+    os.makedirs(log_dir, exist_ok=True)
+    stack = Stack(args, log_dir)
+    stack.start()
+    try:
+        stack.wait_ready(args.startup_timeout)
+        # Warm up before the first scrape, so its requests are not in the breakdown
+        asyncio.run(run_load(stack.webapp_url, args.endpoint, 0, 1, args.warmup, args.timeout))
+        before = stack.scrape()
+        load = asyncio.run(run_load(stack.webapp_url, args.endpoint, args.requests, args.concurrency, 0, args.timeout))
+        after = stack.scrape()
+    finally:
+        stack.stop()
+
+    measured = max(load["completed"], 1)
+    result = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("json", "log_dir")},
+        "load": load,
+        "stages": stage_report(before, after, measured),
+        "counters": counter_report(before, after, measured),
+        "log_dir": log_dir,
+    }
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Run the code executor of service/code_executor for benchmarks.
+
+The service generates its gRPC modules at image build time; this uses the
+webapp's copies of them instead, so the executor runs straight from the source
+tree:
+
+    EXECUTOR_PORT=50061 python -m benchmarks.local_executor
+"""
+import os
+import sys
+
+WEBAPP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_DIR = os.path.join(os.path.dirname(WEBAPP_DIR), "service", "code_executor")
+
+
+def main():
+    sys.path.insert(0, WEBAPP_DIR)
+    from agent import code_executor_pb2, code_executor_pb2_grpc
+    sys.modules["code_executor_pb2"] = code_executor_pb2
+    sys.modules["code_executor_pb2_grpc"] = code_executor_pb2_grpc
+
+    sys.path.insert(0, SERVICE_DIR)
+    import server
+    server.serve()
+
+
+if __name__ == "__main__":
+    main()
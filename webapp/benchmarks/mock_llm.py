@@ -0,0 +1,124 @@
+"""OpenAI-compatible stand-in for the LLM, for benchmarks without network access.
+
+Answers the code agent with scripted Thought/Code steps and the manager with a
+short summary. Every response waits ``latency`` seconds for its first token and
+then produces ``token_rate`` tokens per second, streamed or not.
+
+    python -m benchmarks.mock_llm --port 8766 --latency 0.3 --token-rate 100
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Roughly 4 characters per token, the same estimate utils.tokens falls back to
+CHARS_PER_TOKEN = 4
+
+
+def agent_step(step: int, steps: int, work: int) -> str:
+    """The scripted reply for step ``step`` (1-based) of a task taking ``steps`` steps."""
+    if step < steps:
+        thought = f"Step {step}: compute a partial result before answering."
+        code = f"partial_{step} = sum(i * i for i in range({work}))\nprint(partial_{step})"
+    else:
+        thought = "I have everything I need, returning the final answer."
+        code = f"result = sum(i * i for i in range({work}))\nfinal_answer(result)"
+    # Models tend to keep going with an invented observation, the stop sequence cuts it
+    return f"Thought: {thought}\nCode:\n```py\n{code}\n```\nObservation: {'made up output ' * 20}"
+
+
+def summary_reply() -> str:
+    return "The agent computed the sum of squares and returned it as the final answer. " * 3
+
+
+def truncate_at_stop(text: str, stop: Optional[List[str]]) -> str:
+    cut = len(text)
+    for sequence in stop or []:
+        index = text.find(sequence)
+        if index != -1:
+            cut = min(cut, index)
+    return text[:cut]
+
+
+def tokenize(text: str) -> List[str]:
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+def create_app(latency: float = 0.3, token_rate: float = 100, steps: int = 2, work: int = 10000) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    app.state.requests = 0
+
+    def reply_for(body: Dict) -> str:
+        messages = body["messages"]
+        if any(message["role"] == "user" for message in messages):
+            # The code agent: one step per assistant message so far
+            done = sum(message["role"] == "assistant" for message in messages)
+            return truncate_at_stop(agent_step(min(done + 1, steps), steps, work), body.get("stop"))
+        return summary_reply()
+
+    async def deltas(tokens: List[str]) -> AsyncIterator[str]:
+        await asyncio.sleep(latency)
+        start = time.perf_counter()
+        for i, token in enumerate(tokens):
+            # Paced against the start, so sleep overhead does not lower the rate
+            delay = start + i / token_rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield token
+
+    @app.get("/models")
+    async def models():
+        return {"data": [{"id": "mock"}]}
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        tokens = tokenize(reply_for(body))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        usage = {
+            "prompt_tokens": sum(len(message["content"]) for message in body["messages"]) // CHARS_PER_TOKEN,
+            "completion_tokens": len(tokens),
+        }
+
+        if not body.get("stream"):
+            content = "".join([token async for token in deltas(tokens)])
+            return JSONResponse({
+                "id": completion_id,
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        async def events() -> AsyncIterator[str]:
+            async for token in deltas(tokens):
+                chunk = {"id": completion_id, "model": body["model"], "choices": [{"index": 0, "delta": {"content": token}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds to the first token")
+    parser.add_argument("--token-rate", type=float, default=100, help="tokens per second after the first")
+    parser.add_argument("--steps", type=int, default=2, help="agent steps per task, the last one answers")
+    parser.add_argument("--work", type=int, default=10000, help="size of the loop each scripted step runs")
+    args = parser.parse_args()
+    app = create_app(latency=args.latency, token_rate=args.token_rate, steps=args.steps, work=args.work)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# Request fields that change the completion, everything else (e.g. stream) is ignored
+KEY_FIELDS = ("model", "temperature", "top_p", "max_tokens", "stop")
+
+
+def completion_key(params: Dict) -> str:
+    """Content address of a completion request.
+
+    Hashes the model, the sampling parameters and the messages in a canonical
+    JSON form, so equal requests map to the same key whatever their dict order.
+    """
+    canonical = {field: params.get(field) for field in KEY_FIELDS}
+    canonical["messages"] = [
+        {"role": message["role"], "content": message["content"]}
+        for message in params["messages"]
+    ]
+    blob = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """Cache of LLM completions keyed by completion_key().
+
+    The in-memory tier is an LRU bounded to ``max_entries``; the optional disk
+    tier under ``directory`` survives restarts. Entries expire ``ttl`` seconds
+    after they were stored in both tiers. Sampled completions (non-zero
+    temperature) are not reproducible, so they bypass the cache unless
+    ``allow_sampled`` is set.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600,
+        directory: Optional[str] = None,
+        allow_sampled: bool = False,
+    ):
+        assert max_entries > 0, "Completion cache needs at least 1 entry"
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.allow_sampled = allow_sampled
+        # key -> (expires_at as wall-clock time, completion)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["CompletionCache"]:
+        """Build the cache from LLM_CACHE_* variables, None when LLM_CACHE_SIZE is 0."""
+        max_entries = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+        if max_entries <= 0:
+            return None
+        return cls(
+            max_entries=max_entries,
+            ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+            directory=os.getenv("LLM_CACHE_DIR") or None,
+            allow_sampled=os.getenv("LLM_CACHE_ALLOW_SAMPLED", "false").lower() in ("1", "true", "yes"),
+        )
+
+    def cacheable(self, params: Dict) -> bool:
+        """Whether a request may be served from and stored in the cache."""
+        return self.allow_sampled or params.get("temperature") == 0
+
+    def get(self, params: Dict) -> Optional[str]:
+        """Cached completion for the request, None on a miss or bypass."""
+        if not self.cacheable(params):
+            self.bypasses += 1
+            return None
+        key = completion_key(params)
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        entry = self._read_disk(key, now)
+        if entry is not None:
+            self._remember(key, entry)
+            self.hits += 1
+            self.disk_hits += 1
+            return entry[1]
+
+        self.misses += 1
+        return None
+
+    def put(self, params: Dict, completion: str):
+        """Store a completion, ignored for requests that bypass the cache."""
+        if not self.cacheable(params):
+            return
+        key = completion_key(params)
+        current = self._entries.get(key)
+        if current is not None and current[1] == completion and current[0] > time.time():
+            # Replayed from the cache, keep the original expiry
+            return
+        entry = (time.time() + self.ttl, completion)
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def _remember(self, key: str, entry: Tuple[float, str]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable completion cache entry {path}: {str(e)}")
+            return None
+        if data["expires_at"] <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return data["expires_at"], data["completion"]
+
+    def _write_disk(self, key: str, entry: Tuple[float, str]):
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": entry[0], "completion": entry[1]}, f)
+            # Readers never see a half written entry
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write completion cache entry {path}: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring."""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "entries": len(self._entries),
+        }
+
+
+_default_cache: Optional[CompletionCache] = None
+_default_cache_loaded = False
+
+
+def get_default_cache() -> Optional[CompletionCache]:
+    """The process-wide cache shared by every OpenRouter client, see CompletionCache.from_env()."""
+    global _default_cache, _default_cache_loaded
+    if not _default_cache_loaded:
+        _default_cache = CompletionCache.from_env()
+        _default_cache_loaded = True
+    return _default_cache
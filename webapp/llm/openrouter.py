@@ -1,7 +1,22 @@
-from typing import Dict, List, Optional, Union
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar, Union
+import asyncio
+import json
+import os
+import time
 import httpx
 from pydantic import BaseModel
 
+from utils.logging import setup_logger
+from utils.metrics import LLM_COMPLETION_SECONDS, LLM_COMPLETION_TOKENS, LLM_PROMPT_TOKENS
+from utils.tokens import count_tokens
+from utils.tracing import span
+from .cache import CompletionCache, get_default_cache
+from .resilience import RETRYABLE_STATUS, Hedger, RetryPolicy, parse_retry_after
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
 class CompletionRequest(BaseModel):
     """Request model for chat completion."""
     model: str
@@ -9,36 +24,104 @@ class CompletionRequest(BaseModel):
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = None
     top_p: Optional[float] = 1.0
+    stop: Optional[List[str]] = None
     stream: Optional[bool] = False
 
 class OpenRouterError(Exception):
     """Base exception for OpenRouter API errors."""
-    def __init__(self, message: str, status_code: Optional[int] = None, response: Optional[Dict] = None):
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        response: Optional[Dict] = None,
+        retryable: bool = False,
+        retry_after: Optional[float] = None
+    ):
         self.message = message
         self.status_code = status_code
         self.response = response
+        # Whether the same request may succeed when sent again
+        self.retryable = retryable
+        self.retry_after = retry_after
         super().__init__(self.message)
 
+async def iter_sse_data(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Yield the data payload of every Server-Sent Event read from ``lines``.
+
+    Multi-line ``data:`` fields are joined with newlines as the SSE spec requires;
+    comments (OpenRouter sends ``: OPENROUTER PROCESSING`` keep-alives) and other
+    fields are ignored.
+    """
+    data: List[str] = []
+    async for line in lines:
+        if not line:
+            # A blank line dispatches the event
+            if data:
+                yield "\n".join(data)
+                data = []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if field == "data":
+            data.append(value[1:] if value.startswith(" ") else value)
+    if data:
+        yield "\n".join(data)
+
 class OpenRouter:
-    """OpenRouter API client for chat completions."""
+    """OpenRouter API client for chat completions.
+
+    Failed calls are retried with backoff (see RetryPolicy), slow calls can be
+    hedged (see Hedger), and once a model keeps failing the next model of
+    ``fallback_models`` is tried.
+    """
     
     BASE_URL = "https://openrouter.ai/api/v1"
     
-    def __init__(self, api_key: str, base_url: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        cache: Optional[CompletionCache] = None,
+        retry: Optional[RetryPolicy] = None,
+        hedge: bool = True,
+        fallback_models: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+        client: Optional[httpx.AsyncClient] = None
+    ):
         """Initialize the OpenRouter client.
         
         Args:
             api_key: Your OpenRouter API key
             base_url: Optional custom base URL for the API
+            cache: Completion cache, defaults to the process-wide one configured by LLM_CACHE_* variables
+            retry: Retry policy, defaults to the one configured by LLM_RETRY_* variables
+            hedge: Whether to hedge slow calls, when enabled by LLM_HEDGE_* variables
+            fallback_models: Models to try in order once the requested one fails,
+                defaults to the comma separated LLM_FALLBACK_MODELS
+            timeout: Seconds to wait for a response or the next streamed chunk, defaults to LLM_TIMEOUT
+            client: Shared HTTP client for ``base_url`` (see LLMClientRegistry), it is not
+                closed by close(). By default the client opens its own.
         """
         self.api_key = api_key
         self.base_url = base_url or self.BASE_URL
-        self.client = httpx.AsyncClient(
-            base_url=self.base_url,
-            headers={
-                "Authorization": f"Bearer {api_key}",
-            }
-        )
+        self.cache = cache if cache is not None else get_default_cache()
+        self.retry = retry or RetryPolicy.from_env()
+        # Unary completions and time to first streamed token have separate latency profiles
+        self._hedgers = {False: Hedger.from_env(), True: Hedger.from_env()} if hedge else {}
+        if fallback_models is None:
+            fallback_models = [m.strip() for m in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+        self.fallback_models = fallback_models
+        # Sent per request, so one pooled client can serve several API keys
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self._owns_client = client is None
+        if client is None:
+            timeout = timeout if timeout is not None else float(os.getenv("LLM_TIMEOUT", "120"))
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(timeout, connect=10.0)
+            )
+        self.client = client
     
     async def chat_completion(
         self,
@@ -47,8 +130,9 @@ class OpenRouter:
         temperature: Optional[float] = 0.7,
         max_tokens: Optional[int] = None,
         top_p: Optional[float] = 1.0,
+        stop: Optional[List[str]] = None,
         stream: bool = False
-    ) -> str:
+    ) -> Union[str, AsyncIterator[str]]:
         """Create a chat completion.
         
         Args:
@@ -57,54 +141,262 @@ class OpenRouter:
             temperature: Sampling temperature (0-2)
             max_tokens: Maximum number of tokens to generate
             top_p: Nucleus sampling parameter
+            stop: Sequences where the model stops generating, not included in the output
             stream: Whether to stream the response
             
         Returns:
-            The LLM's response text
+            The LLM's response text, or with ``stream=True`` an async iterator
+            over the text deltas as they are generated
             
         Raises:
-            OpenRouterError: If the API request fails
+            OpenRouterError: If the API request fails with every model and retry
         """
+        request = CompletionRequest(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            stop=stop,
+            stream=stream
+        )
+        start = time.perf_counter()
+        cache_params = request.model_dump(exclude={"stream"})
+        cached = self.cache.get(cache_params) if self.cache else None
+        if cached is not None:
+            self._observe_latency(request, start, cached=True)
+            return self._replay(cached) if stream else cached
+        if stream:
+            return self._stream_completion(request, cache_params, start)
+
+        with span("llm.chat_completion", kind="CLIENT", model=model, stream=False) as llm_span:
+            try:
+                content, served_by = await self._with_fallback(request, self._complete_once)
+            finally:
+                self._observe_latency(request, start)
+            llm_span.set_tag("served_by", served_by)
+        # A fallback model's answer is not the answer to the requested model
+        if self.cache and served_by == request.model:
+            self.cache.put(cache_params, content)
+        return content
+
+    async def _with_fallback(
+        self,
+        request: CompletionRequest,
+        send: Callable[[CompletionRequest], Awaitable[T]]
+    ) -> Tuple[T, str]:
+        """Send ``request`` to its model, then to each fallback model in order.
+
+        Returns the result and the model that produced it.
+        """
+        models = [request.model] + [m for m in self.fallback_models if m != request.model]
+        for i, model in enumerate(models):
+            model_request = request.model_copy(update={"model": model})
+            try:
+                return await self._with_retries(model_request, send), model
+            except OpenRouterError as e:
+                # Authentication problems are the same for every model
+                if i == len(models) - 1 or e.status_code in (401, 403):
+                    raise
+                logger.warning(f"Model {model} failed ({e.message}), falling back to {models[i + 1]}")
+
+    async def _with_retries(
+        self,
+        request: CompletionRequest,
+        send: Callable[[CompletionRequest], Awaitable[T]]
+    ) -> T:
+        hedger = self._hedgers.get(bool(request.stream))
+        discard = self._discard_stream if request.stream else None
+        attempt = 0
+        while True:
+            try:
+                if hedger is not None:
+                    return await hedger.run(lambda: send(request), discard)
+                return await send(request)
+            except OpenRouterError as e:
+                delay = self.retry.next_delay(attempt, e.retry_after) if e.retryable else None
+                if delay is None:
+                    raise
+                attempt += 1
+                logger.warning(f"{request.model} call failed ({e.message}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _complete_once(self, request: CompletionRequest) -> str:
         try:
-            request = CompletionRequest(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                top_p=top_p,
-                stream=stream
-            )
-            
             response = await self.client.post(
                 "/chat/completions",
-                json=request.model_dump(exclude_none=True)
+                json=request.model_dump(exclude_none=True),
+                headers=self.headers
             )
             response.raise_for_status()
-            
-            if stream:
-                return response.aiter_lines()
-            
-            return response.json()["choices"][0]["message"]["content"]
+            data = response.json()
+            if "error" in data:
+                raise self._event_error(data)
+            content = data["choices"][0]["message"]["content"]
+            self._record_tokens(request, content, data.get("usage"))
+            return content
             
         except httpx.HTTPError as e:
-            error_msg = f"HTTP error occurred: {str(e)}"
-            if hasattr(e, 'response'):
+            raise self._http_error(e)
+        except OpenRouterError:
+            raise
+        except Exception as e:
+            raise OpenRouterError(f"Unexpected error: {str(e)}")
+
+    @staticmethod
+    async def _replay(completion: str) -> AsyncIterator[str]:
+        yield completion
+
+    async def _stream_completion(self, request: CompletionRequest, cache_params: Dict, start: float) -> AsyncIterator[str]:
+        """Yield the content deltas of a streamed completion.
+
+        Retries, hedging and fallback apply until the first delta arrived; an
+        error after that ends the stream. The completion is cached only if the
+        stream is consumed to the end.
+        """
+        parts: List[str] = []
+        # Not activated, the generator's context is its consumer's
+        with span("llm.chat_completion", kind="CLIENT", activate=False, model=request.model, stream=True) as llm_span:
+            try:
+                (deltas, first), served_by = await self._with_fallback(request, self._open_stream)
+                llm_span.set_tag("served_by", served_by)
+                llm_span.set_tag("time_to_first_token", f"{time.perf_counter() - start:.3f}")
                 try:
-                    error_data = e.response.json()
-                    error_msg = f"API error: {error_data.get('error', {}).get('message', str(e))}"
-                except:
-                    pass
-            raise OpenRouterError(
-                message=error_msg,
-                status_code=getattr(e, 'response', None) and e.response.status_code,
-                response=getattr(e, 'response', None) and e.response.json()
-            )
+                    if first is not None:
+                        parts.append(first)
+                        yield first
+                        async for delta in deltas:
+                            parts.append(delta)
+                            yield delta
+                finally:
+                    await deltas.aclose()
+            finally:
+                self._observe_latency(request, start)
+
+        if self.cache and served_by == request.model:
+            self.cache.put(cache_params, "".join(parts))
+
+    async def _open_stream(self, request: CompletionRequest) -> Tuple[AsyncIterator[str], Optional[str]]:
+        """Start a stream and wait for its first delta, None if the completion is empty."""
+        deltas = self._stream_deltas(request)
+        try:
+            return deltas, await deltas.__anext__()
+        except StopAsyncIteration:
+            return deltas, None
+        except BaseException:
+            await deltas.aclose()
+            raise
+
+    @staticmethod
+    async def _discard_stream(opened: Tuple[AsyncIterator[str], Optional[str]]):
+        await opened[0].aclose()
+
+    async def _stream_deltas(self, request: CompletionRequest) -> AsyncIterator[str]:
+        parts: List[str] = []
+        try:
+            async with self.client.stream(
+                "POST",
+                "/chat/completions",
+                json=request.model_dump(exclude_none=True),
+                headers=self.headers
+            ) as response:
+                if response.is_error:
+                    # The error body has not been read yet on a streamed response
+                    await response.aread()
+                response.raise_for_status()
+
+                async for data in iter_sse_data(response.aiter_lines()):
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if "error" in chunk:
+                        # Errors after the stream started arrive as a regular event
+                        raise self._event_error(chunk)
+                    for choice in chunk.get("choices", []):
+                        content = choice.get("delta", {}).get("content")
+                        if content:
+                            parts.append(content)
+                            yield content
+
+        except httpx.HTTPError as e:
+            raise self._http_error(e)
+        except OpenRouterError:
+            raise
         except Exception as e:
             raise OpenRouterError(f"Unexpected error: {str(e)}")
+        finally:
+            # Also counts streams stopped early, their tokens were generated up to here
+            if parts:
+                self._record_tokens(request, "".join(parts))
+
+    @staticmethod
+    def _observe_latency(request: CompletionRequest, start: float, cached: bool = False):
+        LLM_COMPLETION_SECONDS.labels(
+            model=request.model,
+            stream=str(bool(request.stream)).lower(),
+            cached=str(cached).lower(),
+        ).observe(time.perf_counter() - start)
+
+    @staticmethod
+    def _record_tokens(request: CompletionRequest, completion: str, usage: Optional[Dict] = None):
+        """Count the tokens of one API call, estimated when the API does not report them."""
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        if prompt_tokens is None:
+            prompt_tokens = sum(count_tokens(message["content"]) for message in request.messages)
+        completion_tokens = usage.get("completion_tokens")
+        if completion_tokens is None:
+            completion_tokens = count_tokens(completion)
+        LLM_PROMPT_TOKENS.labels(model=request.model).inc(prompt_tokens)
+        LLM_COMPLETION_TOKENS.labels(model=request.model).inc(completion_tokens)
+
+    def cache_completion(self, completion: str, messages: List[Dict[str, str]], **params):
+        """Cache a completion whose stream the caller ended early at a point it knows is final.
+
+        ``params`` are the sampling arguments the completion was requested with.
+        """
+        if self.cache:
+            request = CompletionRequest(messages=messages, **params)
+            self.cache.put(request.model_dump(exclude={"stream"}), completion)
+
+    @staticmethod
+    def _event_error(data: Dict) -> OpenRouterError:
+        """Error reported in a response body or stream event instead of the HTTP status."""
+        error = data["error"]
+        code = error.get("code") if isinstance(error, dict) else None
+        status_code = code if isinstance(code, int) else None
+        return OpenRouterError(
+            message=f"API error: {error.get('message', error) if isinstance(error, dict) else error}",
+            status_code=status_code,
+            response=data,
+            retryable=status_code in RETRYABLE_STATUS
+        )
+
+    @staticmethod
+    def _http_error(e: httpx.HTTPError) -> OpenRouterError:
+        error_msg = f"HTTP error occurred: {str(e)}"
+        response = getattr(e, 'response', None) if isinstance(e, httpx.HTTPStatusError) else None
+        error_data = None
+        if response is not None:
+            try:
+                error_data = response.json()
+                error_msg = f"API error: {error_data.get('error', {}).get('message', str(e))}"
+            except:
+                pass
+        status_code = response.status_code if response is not None else None
+        return OpenRouterError(
+            message=error_msg,
+            status_code=status_code,
+            response=error_data,
+            # Timeouts and dropped connections are transient too
+            retryable=isinstance(e, httpx.TransportError) or status_code in RETRYABLE_STATUS,
+            retry_after=parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        )
     
     async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
+        """Close the HTTP client, unless it is shared."""
+        if self._owns_client:
+            await self.client.aclose()
     
     async def __aenter__(self):
         return self
@@ -0,0 +1,100 @@
+import os
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from utils.logging import setup_logger
+from .openrouter import OpenRouter
+
+logger = setup_logger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LLMClientRegistry:
+    """Process-wide LLM clients shared by every agent.
+
+    There is one pooled ``httpx.AsyncClient`` per base URL, so all agents and
+    roles reuse the same keep-alive (and with HTTP/2, multiplexed) connections
+    instead of each opening their own. ``get()`` returns one OpenRouter client
+    per API key and base URL, which also shares their hedging latency statistics.
+    """
+
+    def __init__(
+        self,
+        http2: bool = True,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60,
+    ):
+        if http2 and not _http2_available():
+            logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._http_clients: Dict[str, httpx.AsyncClient] = {}
+        self._llms: Dict[Tuple[str, str], OpenRouter] = {}
+
+    @classmethod
+    def from_env(cls) -> "LLMClientRegistry":
+        return cls(
+            http2=os.getenv("LLM_HTTP2", "true").lower() in ("1", "true", "yes"),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+        )
+
+    def _http_client(self, base_url: str) -> httpx.AsyncClient:
+        client = self._http_clients.get(base_url)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=base_url,
+                http2=self.http2,
+                limits=self.limits,
+                timeout=httpx.Timeout(float(os.getenv("LLM_TIMEOUT", "120")), connect=10.0),
+            )
+            self._http_clients[base_url] = client
+            logger.info(f"Opened {'HTTP/2' if self.http2 else 'HTTP/1.1'} connection pool to {base_url}")
+        return client
+
+    @staticmethod
+    def default_base_url() -> str:
+        """LLM_BASE_URL, e.g. a local OpenAI-compatible server, or OpenRouter."""
+        return os.getenv("LLM_BASE_URL") or OpenRouter.BASE_URL
+
+    def get(self, api_key: Optional[str] = None, base_url: Optional[str] = None) -> OpenRouter:
+        """The shared OpenRouter client for ``api_key`` (default: API_KEY) and ``base_url`` (default: LLM_BASE_URL)."""
+        api_key = api_key if api_key is not None else os.getenv("API_KEY")
+        base_url = base_url or self.default_base_url()
+        llm = self._llms.get((api_key, base_url))
+        if llm is None or llm.client.is_closed:
+            llm = OpenRouter(api_key=api_key, base_url=base_url, client=self._http_client(base_url))
+            self._llms[(api_key, base_url)] = llm
+        return llm
+
+    def start(self):
+        """Create the connection pool of the default endpoint ahead of the first request."""
+        self._http_client(self.default_base_url())
+
+    async def close(self):
+        """Close every pooled connection."""
+        for base_url, client in self._http_clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing LLM connection pool to {base_url}: {str(e)}")
+        self._http_clients = {}
+        self._llms = {}
+
+
+llm_registry = LLMClientRegistry.from_env()
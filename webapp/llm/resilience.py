@@ -0,0 +1,157 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+# Throttling, timeouts and upstream failures, worth another try
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given as seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    """How often and how long to wait before retrying a failed LLM call.
+
+    Delays grow exponentially from ``base_delay`` and are fully jittered so
+    throttled clients do not retry in lockstep. A Retry-After from the server
+    replaces the computed delay; if it asks for more than ``max_delay`` the
+    call is given up, so the caller can fall back to another model instead.
+    """
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=int(os.getenv("LLM_RETRY_ATTEMPTS", "4")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "30")),
+        )
+
+    def next_delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait before retry number ``attempt + 1``, None to give up."""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class Hedger:
+    """Sends a second, identical request when the first one is slow, and keeps whichever answers first.
+
+    A request is slow once it has taken longer than the ``percentile`` of the
+    latencies observed so far. Hedging only starts after ``min_samples``
+    latencies were recorded, it never sends more than one extra request.
+    """
+
+    def __init__(self, percentile: float = 0.95, min_samples: int = 20, window: int = 200):
+        assert 0 < percentile < 1, "Hedging percentile must be between 0 and 1"
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["Hedger"]:
+        """Build a hedger from LLM_HEDGE_* variables, None unless LLM_HEDGE_PERCENTILE is set."""
+        percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+        if percentile <= 0:
+            return None
+        return cls(
+            percentile=percentile,
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+        )
+
+    def delay(self) -> Optional[float]:
+        """Latency after which a request gets hedged, None while there are too few samples."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def observe(self, seconds: float):
+        self._latencies.append(seconds)
+
+    async def run(
+        self,
+        send: Callable[[], Awaitable[T]],
+        discard: Optional[Callable[[T], Awaitable[None]]] = None,
+    ) -> T:
+        """Await ``send()``, racing a second call against it if it is slow.
+
+        ``discard`` releases the result of a call that finished but lost the race,
+        e.g. closes an open stream.
+        """
+        delay = self.delay()
+        if delay is None:
+            start = time.monotonic()
+            result = await send()
+            self.observe(time.monotonic() - start)
+            return result
+
+        starts: Dict[asyncio.Task, float] = {}
+
+        def launch():
+            task = asyncio.create_task(send())
+            starts[task] = time.monotonic()
+            return task
+
+        winner: Optional[asyncio.Task] = None
+        tasks = [launch()]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                logger.info(f"No LLM answer after {delay:.2f}s, sending a hedged request")
+                self.hedged += 1
+                tasks.append(launch())
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and winner is None:
+                        winner = task
+                    elif task.exception() is not None:
+                        error = task.exception()
+                if winner is not None:
+                    self.observe(time.monotonic() - starts[winner])
+                    if winner is not tasks[0]:
+                        self.hedge_wins += 1
+                    return winner.result()
+            raise error
+        finally:
+            losers = [task for task in tasks if task is not winner]
+            for task in losers:
+                task.cancel()
+            results = await asyncio.gather(*losers, return_exceptions=True)
+            if discard is not None:
+                for result in results:
+                    if not isinstance(result, BaseException):
+                        await discard(result)
@@ -1,23 +1,135 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
-from typing import List, Dict
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Optional
 
 from agent.agent import CodeAgent, CodeAgentResponse
+from agent.grpc_aio_client import AsyncCodeExecutorClient
 from agent.manager import ManagerAgent
 from agent.jupyter_agent import JupyterCodeAgent
-from agent.jupyter_kernel import get_kernel, JupyterKernelManager
+from agent.jupyter_kernel import AsyncJupyterKernelManager
+from agent.kernel_pool import KernelPool
+from agent.session import AgentPool, AgentSession
+from agent.tool_catalog import ToolCatalog
+from llm.cache import get_default_cache
+from llm.registry import llm_registry
+from utils.health import Dependency, HealthMonitor
+from utils.metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, render_metrics
+from utils import tracing
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here waits on a backend, the app serves /healthz and /readyz right
+    # away and connects to the executor and kernels in the background
+    global jupyter_agent
+    tracing.configure("webapp")
+    llm_registry.start()
+    jupyter_agent = JupyterCodeAgent(catalog=jupyter_tool_catalog)
+    kernel_pool.start()
+    code_tool_catalog.start()
+    jupyter_tool_catalog.start()
+    health_monitor.start()
+    yield
+    await health_monitor.close()
+    await code_tool_catalog.close()
+    await jupyter_tool_catalog.close()
+    await catalog_executor.close()
+    await code_agent_pool.close()
+    await manager_agent_pool.close()
+    await kernel_pool.close()
+    # Last, the agents above share its connections
+    await llm_registry.close()
+    tracing.shutdown()
 
 app = FastAPI(
     title="Code Agent API",
     description="An AI-powered coding assistant API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
+)
+CHAT_PATHS = ["/chat", "/chat/stream", "/chat-jupyter"]
+app.add_middleware(MetricsMiddleware, paths=CHAT_PATHS)
+# Added last, so it runs first and every span of a request belongs to its trace
+app.add_middleware(tracing.TracingMiddleware, paths=CHAT_PATHS)
+
+# Warm Jupyter kernels with the tools loaded, started with the app
+kernel_pool = KernelPool(
+    kernel_gateway_host=os.getenv("JUPYTER_GATEWAY_HOST", "localhost:8888"),
+    min_size=int(os.getenv("JUPYTER_KERNEL_POOL_MIN", "2")),
+    max_size=int(os.getenv("JUPYTER_KERNEL_POOL_MAX", "8")),
+    max_uses=int(os.getenv("JUPYTER_KERNEL_MAX_USES", "20")),
+    idle_timeout=float(os.getenv("JUPYTER_KERNEL_IDLE_TIMEOUT", "300")),
+)
+
+# Tool catalogs of both backends, each system prompt is rendered once per catalog
+# version and refreshed in the background when the tools change
+TOOL_CATALOG_REFRESH_INTERVAL = float(os.getenv("TOOL_CATALOG_REFRESH_INTERVAL", "60"))
+catalog_executor = AsyncCodeExecutorClient(
+    host=os.getenv("CODE_EXECUTOR_HOST", "localhost"),
+    port=int(os.getenv("CODE_EXECUTOR_PORT", "50051"))
+)
+code_tool_catalog = ToolCatalog(
+    catalog_executor.get_tool_catalog,
+    refresh_interval=TOOL_CATALOG_REFRESH_INTERVAL,
+    name="code executor",
+)
+jupyter_tool_catalog = ToolCatalog(
+    kernel_pool.get_tool_catalog,
+    refresh_interval=TOOL_CATALOG_REFRESH_INTERVAL,
+    name="jupyter",
+)
+
+# Pools of reusable agents, each request leases its own agent and session
+code_agent_pool = AgentPool(
+    lambda: CodeAgent.create(catalog=code_tool_catalog),
+    size=int(os.getenv("CODE_AGENT_POOL_SIZE", "32"))
+)
+manager_agent_pool = AgentPool(ManagerAgent, size=int(os.getenv("MANAGER_AGENT_POOL_SIZE", "32")))
+# Holds no per-request state, one instance serves every /chat-jupyter request.
+# Created in lifespan()
+jupyter_agent: Optional[JupyterCodeAgent] = None
+
+# Readiness needs the code executor; the Jupyter backend only counts if required
+JUPYTER_REQUIRED = os.getenv("READY_REQUIRES_JUPYTER", "false").lower() in ("1", "true", "yes")
+health_monitor = HealthMonitor(
+    [
+        Dependency("code_executor", catalog_executor.wait_ready),
+        Dependency("code_executor_tools", code_tool_catalog.get_system_prompt),
+        Dependency("jupyter_gateway", kernel_pool.ping, required=JUPYTER_REQUIRED),
+        # Loading the kernels' tools the first time may wait for a kernel to boot
+        Dependency("jupyter_tools", jupyter_tool_catalog.get_system_prompt, required=JUPYTER_REQUIRED, timeout=60),
+    ],
+    interval=float(os.getenv("HEALTH_CHECK_INTERVAL", "15")),
 )
 
-# Initialize the code agents
-code_agent = CodeAgent()
-manager_agent = ManagerAgent()
-# jupyter_agent = JupyterCodeAgent()
+async def lease_kernel():
+    """Dependency leasing a warm kernel from the pool for one request."""
+    async with kernel_pool.lease() as kernel_manager:
+        yield kernel_manager
+
+DISCONNECT_POLL_INTERVAL = 0.5
+
+async def cancel_on_disconnect(http_request: Request, coro):
+    """Run ``coro`` and cancel it (and any in-flight RPCs) if the HTTP client disconnects."""
+    task = asyncio.ensure_future(coro)
+
+    async def watch_disconnect():
+        while not task.done():
+            if await http_request.is_disconnected():
+                task.cancel()
+                return
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        return await task
+    finally:
+        watcher.cancel()
 
 class ChatRequest(BaseModel):
     message: str
@@ -29,37 +141,117 @@ class ChatResponse(BaseModel):
 async def root():
     return {"message": "Code Agent API is running"}
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving, whatever the state of its backends."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once every required backend is reachable, 503 before, with the state of each."""
+    return JSONResponse(health_monitor.snapshot(), status_code=200 if health_monitor.ready else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latencies, token counts, parse failures and in-flight requests."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit and miss counters of the LLM completion cache."""
+    cache = get_default_cache()
+    return {"enabled": cache is not None, **(cache.stats() if cache else {})}
+
+async def _answer(message: str) -> str:
+    async with code_agent_pool.lease() as code_agent:
+        code_response = await code_agent.answer_question(
+            question=message
+        )
+    async with manager_agent_pool.lease() as manager_agent:
+        return await manager_agent.summary(
+            code_response
+        )
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     try:
         # TODO - return summarized message, not derive progress from code agent
-        code_response = await code_agent.answer_question(
-            question=request.message
+        mgr_resp = await cancel_on_disconnect(http_request, _answer(request.message))
+        return ChatResponse(
+            response=mgr_resp,
         )
-        mgr_resp = await manager_agent.summary(
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event, JSON keeps multi-line content on a single data line."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream_answer(message: str) -> AsyncIterator[str]:
+    events: asyncio.Queue = asyncio.Queue()
+    session = AgentSession(on_event=lambda event, data: events.put_nowait((event, data)))
+    # Sent right away so the client sees the first byte before the LLM answers
+    yield sse_event("start", {"session_id": session.session_id})
+
+    async def run_code_agent():
+        async with code_agent_pool.lease() as code_agent:
+            return await code_agent.answer_question(question=message, session=session)
+
+    agent_task = asyncio.create_task(run_code_agent())
+    # None marks the end of the steps
+    agent_task.add_done_callback(lambda _: events.put_nowait(None))
+    try:
+        while (item := await events.get()) is not None:
+            event, data = item
+            yield sse_event(event, {"content": data})
+        code_response = agent_task.result()
+
+        async with manager_agent_pool.lease() as manager_agent:
+            async for token in manager_agent.summary_stream(code_response):
+                yield sse_event("summary", {"content": token})
+        yield sse_event("done", {})
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
+    finally:
+        # The response is cancelled when the client disconnects, stop the agent with it
+        agent_task.cancel()
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    return StreamingResponse(
+        _stream_answer(request.message),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _answer_jupyter(message: str, kernel_manager: AsyncJupyterKernelManager) -> str:
+    if jupyter_tool_catalog.system_prompt is None:
+        # Read the tools from the kernel this request already holds
+        await jupyter_tool_catalog.refresh(lambda: kernel_pool.get_tool_catalog(kernel_manager))
+    code_response = await jupyter_agent.answer_question(
+        message=message,
+        kernel_manager=kernel_manager
+    )
+    async with manager_agent_pool.lease() as manager_agent:
+        return await manager_agent.summary(
             code_response
         )
+
+@app.post("/chat-jupyter", response_model=ChatResponse)
+async def chat_jupyter(
+    request: ChatRequest,
+    http_request: Request,
+    kernel_manager: AsyncJupyterKernelManager = Depends(lease_kernel)
+):
+    try:
+        mgr_resp = await cancel_on_disconnect(
+            http_request, _answer_jupyter(request.message, kernel_manager)
+        )
         return ChatResponse(
             response=mgr_resp,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# @app.post("/chat-jupyter", response_model=ChatResponse)
-# async def chat_jupyter(
-#     request: ChatRequest,
-#     kernel_manager: JupyterKernelManager = Depends(get_kernel)
-# ):
-#     try:
-#         response = jupyter_agent.answer_question(
-#             message=request.message,
-#             kernel_manager=kernel_manager
-#         )
-#         return ChatResponse(
-#             response=response,
-#         )
-#     except Exception as e:
-#         raise HTTPException(status_code=500, detail=str(e))
-
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
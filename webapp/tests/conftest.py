@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The webapp runs from its own directory, with agent/, llm/ and utils/ as top-level packages
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
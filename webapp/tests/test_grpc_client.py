@@ -0,0 +1,14 @@
+from agent.grpc_client import collect_result
+
+
+def test_successful_execution_returns_output_and_stderr():
+    assert collect_result(["a", "b\n"], ["warning\n"], 0, "") == ("ab\n", "warning\n", 0)
+
+
+def test_failed_execution_keeps_the_output_printed_before_it_stopped():
+    output, error, exit_code = collect_result(
+        ["step 1\n", "step 2\n"], [], 124, "TimeoutError: execution exceeded the wall time limit of 1s"
+    )
+    assert output == "step 1\nstep 2\n"
+    assert error.startswith("TimeoutError")
+    assert exit_code == 124
@@ -0,0 +1,26 @@
+from agent.history import truncate_middle
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def test_text_within_budget_is_unchanged():
+    assert truncate_middle("a b c", 3, counter=count_words) == "a b c"
+
+
+def test_head_and_tail_are_kept():
+    text = " ".join(f"w{i}" for i in range(100))
+    truncated = truncate_middle(text, 10, counter=count_words)
+    assert truncated.startswith("w0 w1")
+    assert truncated.endswith("w98 w99")
+    assert "characters omitted" in truncated
+    assert len(truncated) < len(text)
+
+
+def test_budget_of_one_token_leaves_only_the_marker():
+    # Under two characters per token, half the budget rounds down to no characters at all
+    text = " ".join("a" * 100)
+    truncated = truncate_middle(text, 1, note=", see the log", counter=count_words)
+    assert truncated == f"\n[... {len(text)} characters omitted, see the log ...]\n"
+    assert len(truncated) < len(text)
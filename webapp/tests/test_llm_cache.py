@@ -0,0 +1,97 @@
+import os
+import types
+
+import pytest
+
+import llm.cache
+from llm.cache import CompletionCache, completion_key
+
+
+def request(content: str = "What is 2 + 2?", **params) -> dict:
+    return {"model": "test/model", "temperature": 0, "messages": [{"role": "user", "content": content}], **params}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm.cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_key_ignores_field_order_and_fields_that_do_not_change_the_completion():
+    params = request(max_tokens=100)
+    reordered = {key: params[key] for key in reversed(list(params))}
+    streamed = {**params, "stream": True, "messages": [{**params["messages"][0], "name": "ignored"}]}
+    assert completion_key(params) == completion_key(reordered) == completion_key(streamed)
+
+
+@pytest.mark.parametrize("change", [
+    {"model": "test/other"},
+    {"temperature": 0.5},
+    {"max_tokens": 10},
+    {"stop": ["\nObservation:"]},
+    {"messages": [{"role": "user", "content": "What is 2 + 3?"}]},
+])
+def test_key_changes_with_the_model_sampling_parameters_and_messages(change):
+    assert completion_key(request()) != completion_key({**request(), **change})
+
+
+def test_miss_then_hit():
+    cache = CompletionCache()
+    assert cache.get(request()) is None
+    cache.put(request(), "4")
+    assert cache.get(request()) == "4"
+    assert cache.stats() == {"hits": 1, "disk_hits": 0, "misses": 1, "bypasses": 0, "entries": 1}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = CompletionCache(max_entries=2)
+    cache.put(request("a"), "A")
+    cache.put(request("b"), "B")
+    cache.get(request("a"))
+    cache.put(request("c"), "C")
+    assert cache.get(request("b")) is None
+    assert cache.get(request("a")) == "A"
+    assert cache.get(request("c")) == "C"
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = CompletionCache(ttl=60)
+    cache.put(request(), "4")
+    clock[0] += 59
+    assert cache.get(request()) == "4"
+    clock[0] += 2
+    assert cache.get(request()) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_disk_tier_survives_a_new_cache_and_expires(tmp_path, clock):
+    CompletionCache(ttl=60, directory=str(tmp_path)).put(request(), "4")
+    restarted = CompletionCache(ttl=60, directory=str(tmp_path))
+    assert restarted.get(request()) == "4"
+    assert restarted.disk_hits == 1
+
+    clock[0] += 61
+    path = tmp_path / f"{completion_key(request())}.json"
+    assert CompletionCache(ttl=60, directory=str(tmp_path)).get(request()) is None
+    assert not os.path.exists(path)
+
+
+def test_unreadable_disk_entry_is_a_miss(tmp_path):
+    (tmp_path / f"{completion_key(request())}.json").write_text("{not json")
+    cache = CompletionCache(directory=str(tmp_path))
+    assert cache.get(request()) is None
+    assert cache.misses == 1
+
+
+def test_sampled_requests_bypass_the_cache_unless_allowed():
+    cache = CompletionCache()
+    sampled = request(temperature=0.7)
+    cache.put(sampled, "4")
+    assert cache.get(sampled) is None
+    assert cache.stats()["bypasses"] == 1
+    assert cache.stats()["entries"] == 0
+
+    cache = CompletionCache(allow_sampled=True)
+    cache.put(sampled, "4")
+    assert cache.get(sampled) == "4"
@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import llm.resilience
+from llm.resilience import Hedger, RetryPolicy, parse_retry_after
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    # Every delay at the top of its jitter range
+    monkeypatch.setattr(llm.resilience.random, "uniform", lambda low, high: high)
+
+
+def test_backoff_doubles_up_to_the_max_delay(no_jitter):
+    policy = RetryPolicy(max_attempts=10, base_delay=0.5, max_delay=3)
+    assert [policy.next_delay(attempt) for attempt in range(5)] == [0.5, 1, 2, 3, 3]
+
+
+def test_backoff_is_jittered_between_zero_and_the_exponential_delay():
+    policy = RetryPolicy(max_attempts=10, base_delay=0.5, max_delay=30)
+    delays = [policy.next_delay(3) for _ in range(100)]
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_gives_up_after_the_last_attempt(no_jitter):
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.next_delay(1) is not None
+    assert policy.next_delay(2) is None
+    assert policy.next_delay(2, retry_after=1) is None
+
+
+def test_retry_after_replaces_the_backoff(no_jitter):
+    policy = RetryPolicy(max_attempts=4, base_delay=0.5, max_delay=30)
+    assert policy.next_delay(0, retry_after=7) == 7
+    assert policy.next_delay(0, retry_after=0) == 0
+
+
+def test_retry_after_above_the_max_delay_gives_up():
+    assert RetryPolicy(max_delay=30).next_delay(0, retry_after=31) is None
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12
+    assert parse_retry_after("-3") == 0
+    in_a_minute = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 55 < parse_retry_after(in_a_minute) <= 60
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+
+def fake_calls(*calls):
+    """send() returning one coroutine per call, in order, and the record of cancelled calls."""
+    remaining = list(calls)
+    cancelled = []
+
+    async def call(name, seconds, result, ignore_cancel):
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            if not ignore_cancel:
+                raise
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def send():
+        name, seconds, result, *ignore_cancel = remaining.pop(0)
+        return call(name, seconds, result, bool(ignore_cancel))
+
+    return send, cancelled
+
+
+def warm_hedger(latency: float = 0.01) -> Hedger:
+    hedger = Hedger(percentile=0.5, min_samples=1)
+    hedger.observe(latency)
+    return hedger
+
+
+def test_no_hedge_before_enough_samples():
+    hedger = Hedger(min_samples=2)
+    send, cancelled = fake_calls(("first", 0.05, "a"))
+    assert asyncio.run(hedger.run(send)) == "a"
+    assert (hedger.hedged, cancelled) == (0, [])
+    assert hedger.delay() is None
+
+
+def test_fast_first_call_is_not_hedged():
+    hedger = warm_hedger(latency=1)
+    send, cancelled = fake_calls(("first", 0.01, "a"))
+    assert asyncio.run(hedger.run(send)) == "a"
+    assert hedger.hedged == 0
+
+
+def test_hedge_wins_and_the_slow_call_is_cancelled():
+    hedger = warm_hedger()
+    send, cancelled = fake_calls(("first", 1, "slow"), ("hedge", 0.01, "fast"))
+    assert asyncio.run(hedger.run(send)) == "fast"
+    assert (hedger.hedged, hedger.hedge_wins) == (1, 1)
+    assert cancelled == ["first"]
+
+
+def test_first_call_wins_and_the_hedge_is_cancelled():
+    hedger = warm_hedger()
+    send, cancelled = fake_calls(("first", 0.05, "first"), ("hedge", 1, "hedge"))
+    assert asyncio.run(hedger.run(send)) == "first"
+    assert (hedger.hedged, hedger.hedge_wins) == (1, 0)
+    assert cancelled == ["hedge"]
+
+
+def test_loser_that_finishes_anyway_is_discarded():
+    hedger = warm_hedger()
+    discarded = []
+
+    async def discard(result):
+        discarded.append(result)
+
+    # The slow call ignores its cancellation and still returns a result to release
+    send, cancelled = fake_calls(("first", 1, "slow", True), ("hedge", 0.01, "fast"))
+    assert asyncio.run(hedger.run(send, discard=discard)) == "fast"
+    assert discarded == ["slow"]
+
+
+def test_failed_call_does_not_win_the_race():
+    hedger = warm_hedger()
+    send, cancelled = fake_calls(("first", 0.05, ValueError("boom")), ("hedge", 0.1, "hedge"))
+    assert asyncio.run(hedger.run(send)) == "hedge"
+
+
+def test_error_is_raised_once_every_call_failed():
+    hedger = warm_hedger()
+    send, cancelled = fake_calls(("first", 0.05, ValueError("first")), ("hedge", 0.1, ValueError("hedge")))
+    with pytest.raises(ValueError):
+        asyncio.run(hedger.run(send))
@@ -0,0 +1,42 @@
+from agent.agent import CodeAgent
+from agent.jupyter_agent import JupyterCodeAgent
+from agent.step_parser import StepParser, code_section
+
+CODE_WITH_OBSERVATION = 'print("Observation: the value is", 42)\nfinal_answer(42)'
+RESPONSE = (
+    "Thought: print the value and answer.\n"
+    f"Code:\n```py\n{CODE_WITH_OBSERVATION}\n```\n"
+    "Observation: 42, invented by the model"
+)
+
+
+def test_code_section_keeps_observation_inside_a_string_literal():
+    assert code_section(RESPONSE, RESPONSE.find("Code:")) == f"```py\n{CODE_WITH_OBSERVATION}\n```"
+
+
+def test_code_section_without_a_closed_fence_keeps_the_rest():
+    response = "Thought: answer.\nCode: final_answer(1)"
+    assert code_section(response, response.find("Code:")) == "final_answer(1)"
+
+
+def test_code_agent_parses_code_containing_observation():
+    agent = CodeAgent.__new__(CodeAgent)
+    parsed = agent._parse_llm_response(RESPONSE)
+    assert parsed.thought == "print the value and answer."
+    assert parsed.code == CODE_WITH_OBSERVATION
+
+
+def test_jupyter_agent_parses_code_containing_observation():
+    agent = JupyterCodeAgent.__new__(JupyterCodeAgent)
+    parsed = agent._parse_llm_response(RESPONSE)
+    assert CODE_WITH_OBSERVATION in parsed.code
+    assert "invented" not in parsed.code
+
+
+def test_step_parser_completes_at_the_closed_fence():
+    parser = StepParser()
+    for i in range(0, len(RESPONSE), 7):
+        if parser.feed(RESPONSE[i:i + 7]):
+            break
+    assert parser.complete
+    assert parser.text.endswith("final_answer(42)\n```")
@@ -0,0 +1,111 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+Probe = Callable[[], Awaitable[object]]
+
+
+class Dependency:
+    """A backend the app needs, checked by awaiting ``probe``.
+
+    The probe succeeds when it returns and fails when it raises or takes longer
+    than ``timeout``. Only ``required`` dependencies decide readiness.
+    """
+
+    def __init__(self, name: str, probe: Probe, required: bool = True, timeout: float = 5):
+        self.name = name
+        self.probe = probe
+        self.required = required
+        self.timeout = timeout
+
+        self.status = "starting"
+        self.error: Optional[str] = None
+        self.failures = 0
+        self.checked_at: Optional[float] = None
+        self.since = time.time()
+
+    @property
+    def up(self) -> bool:
+        return self.status == "up"
+
+    async def check(self) -> bool:
+        """Run the probe once and record the outcome."""
+        try:
+            await asyncio.wait_for(self.probe(), self.timeout)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if self.status != "down":
+                logger.warning(f"Dependency {self.name} is down: {error}")
+                self.status, self.since = "down", time.time()
+            self.error = error
+            self.failures += 1
+        else:
+            if self.status != "up":
+                logger.info(f"Dependency {self.name} is up")
+                self.status, self.since = "up", time.time()
+            self.error = None
+            self.failures = 0
+        self.checked_at = time.time()
+        return self.up
+
+    def snapshot(self) -> Dict:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "error": self.error,
+            "since": self.since,
+            "checked_at": self.checked_at,
+        }
+
+
+class HealthMonitor:
+    """Checks dependencies in the background, so startup never waits on them.
+
+    A dependency that is up is checked every ``interval`` seconds. One that is
+    down or still starting is retried sooner, after a jittered backoff that
+    grows from ``retry_delay`` to ``interval``, so the app becomes ready soon
+    after a backend comes up.
+    """
+
+    def __init__(self, dependencies: List[Dependency], interval: float = 15, retry_delay: float = 0.5):
+        self.dependencies = dependencies
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def ready(self) -> bool:
+        """Whether every required dependency is up."""
+        return all(dependency.up for dependency in self.dependencies if dependency.required)
+
+    def start(self):
+        """Start checking in the background. Safe to call more than once."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._watch(dependency)) for dependency in self.dependencies]
+
+    def _next_delay(self, dependency: Dependency) -> float:
+        if dependency.up:
+            return self.interval
+        return random.uniform(0.5, 1) * min(self.interval, self.retry_delay * 2 ** (dependency.failures - 1))
+
+    async def _watch(self, dependency: Dependency):
+        while True:
+            await dependency.check()
+            await asyncio.sleep(self._next_delay(dependency))
+
+    def snapshot(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "dependencies": {dependency.name: dependency.snapshot() for dependency in self.dependencies},
+        }
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -1,6 +1,9 @@
 import logging
 import sys
 
+from utils.tracing import TraceLogFilter
+
+
 def setup_logger(name: str) -> logging.Logger:
     """Set up a logger with console output.
     
@@ -19,10 +22,11 @@ def setup_logger(name: str) -> logging.Logger:
     
     # Create formatter
     formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        '%(asctime)s - %(name)s - %(levelname)s%(trace)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     console_handler.setFormatter(formatter)
+    console_handler.addFilter(TraceLogFilter())
     
     # Add handler to logger
     logger.addHandler(console_handler)
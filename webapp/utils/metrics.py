@@ -0,0 +1,107 @@
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Latency buckets in seconds, from a cached completion to a long tool run
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+LLM_COMPLETION_SECONDS = Histogram(
+    "llm_chat_completion_seconds",
+    "Duration of chat_completion calls, until the last delta for streams",
+    ["model", "stream", "cached"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_PROMPT_TOKENS = Counter(
+    "llm_prompt_tokens_total",
+    "Prompt tokens sent to the LLM, reported by the API or estimated",
+    ["model"],
+)
+LLM_COMPLETION_TOKENS = Counter(
+    "llm_completion_tokens_total",
+    "Completion tokens received from the LLM, reported by the API or estimated",
+    ["model"],
+)
+EXECUTE_CODE_SECONDS = Histogram(
+    "agent_execute_code_seconds",
+    "Duration of one code execution as seen by the agent",
+    ["backend"],
+    buckets=LATENCY_BUCKETS,
+)
+PARSE_SECONDS = Histogram(
+    "agent_parse_llm_response_seconds",
+    "Duration of _parse_llm_response",
+    ["agent"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+PARSE_FAILURES = Counter(
+    "agent_parse_failures_total",
+    "LLM responses that could not be parsed into a thought and code",
+    ["agent"],
+)
+ITERATIONS = Histogram(
+    "agent_iterations",
+    "Agent steps taken per task",
+    ["agent"],
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20),
+)
+SUMMARY_SECONDS = Histogram(
+    "manager_summary_seconds",
+    "Duration of the manager summary, until the last token for streams",
+    ["stream"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests being handled, streamed responses until their last byte",
+    ["path"],
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_seconds",
+    "Duration of HTTP requests, streamed responses until their last byte",
+    ["path"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels) -> Iterator[None]:
+    """Observe the duration of the ``with`` block, also when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> bytes:
+    """Every metric of the process in the Prometheus text format."""
+    return generate_latest()
+
+
+class MetricsMiddleware:
+    """ASGI middleware tracking in-flight requests and their duration for ``paths``.
+
+    Unlike an ``@app.middleware("http")`` function, it sees the end of
+    streamed responses. Other paths are passed through untracked, so the
+    metric labels stay bounded.
+    """
+
+    def __init__(self, app, paths: Iterable[str]):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        in_flight = REQUESTS_IN_FLIGHT.labels(path=path)
+        in_flight.inc()
+        try:
+            with timed(REQUEST_SECONDS, path=path):
+                await self.app(scope, receive, send)
+        finally:
+            in_flight.dec()
+
@@ -0,0 +1,10 @@
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text, disallowed_special=()))
+except ImportError:
+    def count_tokens(text: str) -> int:
+        """Approximate token count, about 4 characters per token for English text and code."""
+        return (len(text) + 3) // 4
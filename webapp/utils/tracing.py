@@ -0,0 +1,272 @@
+"""Spans of W3C trace contexts, exported in Zipkin v2 JSON.
+
+service/code_executor/tracing.py is a copy of this module without
+TracingMiddleware, since the executor is built from its own directory and
+cannot import the webapp. Keep the two in sync.
+"""
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Not utils.logging, whose formatter reads the current trace from this module
+logger = logging.getLogger(__name__)
+
+# W3C trace context, https://www.w3.org/TR/trace-context/
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace_id, parent span_id) of a traceparent header, None if it is missing or malformed."""
+    match = TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2)
+
+
+class Span:
+    """One timed operation of a trace, see span()."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: Optional[str], tags: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.tags = {key: str(value) for key, value in tags.items()}
+        self.start = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    @property
+    def traceparent(self) -> str:
+        """Header value that makes the receiver's spans children of this one."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_tag(self, key: str, value: Any):
+        self.tags[key] = str(value)
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start_perf
+
+    def to_zipkin(self, service_name: str) -> Dict[str, Any]:
+        """The span in Zipkin v2 JSON, accepted by Zipkin, Jaeger and the OpenTelemetry collector."""
+        record = {
+            "traceId": self.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": int(self.start * 1_000_000),
+            "duration": max(1, int((self.duration or 0) * 1_000_000)),
+            "localEndpoint": {"serviceName": service_name},
+            "tags": self.tags,
+        }
+        if self.parent_id:
+            record["parentId"] = self.parent_id
+        if self.kind:
+            record["kind"] = self.kind
+        return record
+
+
+class SpanExporter:
+    """Writes finished spans to a JSON lines file and/or POSTs them to a Zipkin-compatible collector.
+
+    Spans are buffered and flushed every ``flush_interval`` seconds by a
+    background thread, so recording a span never waits on I/O. Once
+    ``max_queue`` spans are waiting, new ones are dropped.
+    """
+
+    def __init__(
+        self,
+        service_name: str,
+        path: Optional[str] = None,
+        collector_url: Optional[str] = None,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+    ):
+        self.service_name = service_name
+        self.path = path
+        self.collector_url = collector_url
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, service_name: str) -> Optional["SpanExporter"]:
+        """Exporter configured by TRACE_FILE and TRACE_COLLECTOR_URL, None when neither is set."""
+        path = os.getenv("TRACE_FILE") or None
+        collector_url = os.getenv("TRACE_COLLECTOR_URL") or None
+        if not path and not collector_url:
+            return None
+        return cls(service_name, path=path, collector_url=collector_url)
+
+    def export(self, span: Span):
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(span.to_zipkin(self.service_name))
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            records: List[Dict[str, Any]] = list(self._queue)
+            self._queue.clear()
+        if not records:
+            return
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(record) + "\n" for record in records)
+            except OSError as e:
+                logger.warning(f"Failed to write {len(records)} spans to {self.path}: {str(e)}")
+        if self.collector_url:
+            request = urllib.request.Request(
+                self.collector_url,
+                data=json.dumps(records).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            try:
+                urllib.request.urlopen(request, timeout=5).close()
+            except Exception as e:
+                logger.warning(f"Failed to send {len(records)} spans to {self.collector_url}: {str(e)}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_exporter: Optional[SpanExporter] = None
+
+
+def configure(service_name: str) -> Optional[SpanExporter]:
+    """Set up span export for this process from the environment, see SpanExporter.from_env()."""
+    global _exporter
+    if _exporter is None:
+        _exporter = SpanExporter.from_env(service_name)
+    return _exporter
+
+
+def shutdown():
+    """Flush the spans still buffered."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent header for outgoing calls, None outside of a trace."""
+    span = _current_span.get()
+    return span.traceparent if span else None
+
+
+@contextmanager
+def span(
+    name: str,
+    traceparent: Optional[str] = None,
+    kind: Optional[str] = None,
+    activate: bool = True,
+    **tags,
+) -> Iterator[Span]:
+    """Record the ``with`` block as a span.
+
+    The span is a child of the current span. Without one it continues the
+    trace of ``traceparent``, or starts a new trace. Spans of code called from
+    the block become its children, unless ``activate`` is False, which async
+    generators need since they cannot keep a context variable set across
+    their yields. An exception escaping the block is recorded as the span's
+    error.
+    """
+    parent = _current_span.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = parse_traceparent(traceparent) or (secrets.token_hex(16), None)
+    current = Span(name, trace_id, parent_id, kind, tags)
+    token = _current_span.set(current) if activate else None
+    try:
+        yield current
+    except GeneratorExit:
+        # A stream closed by its consumer, not a failure
+        raise
+    except BaseException as e:
+        current.set_tag("error", str(e) or type(e).__name__)
+        raise
+    finally:
+        if token is not None:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Finished from another context, e.g. a generator closed by the garbage collector
+                pass
+        current.finish()
+        if _exporter is not None:
+            _exporter.export(current)
+
+
+class TraceLogFilter(logging.Filter):
+    """Adds the current trace ID as ``%(trace)s``, so log lines of one request can be found together."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace_id = current_trace_id()
+        record.trace = f" - trace={trace_id}" if trace_id else ""
+        return True
+
+
+class TracingMiddleware:
+    """ASGI middleware starting a trace for each request to ``paths``.
+
+    An incoming ``traceparent`` header is continued, so the webapp's spans join
+    a caller's trace. The response carries the trace ID as ``X-Trace-Id``.
+    """
+
+    def __init__(self, app, paths: Iterable[str]):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1")
+        with span(f"{scope['method']} {scope['path']}", traceparent=traceparent, kind="SERVER") as request_span:
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    request_span.set_tag("http.status_code", message["status"])
+                    message = {
+                        **message,
+                        "headers": [*message.get("headers", []), (b"x-trace-id", request_span.trace_id.encode())],
+                    }
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)